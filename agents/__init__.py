@@ -2,17 +2,30 @@
 Multi-Agent System for Insurance Copilot
 """
 
-from .copilot import create_copilot_system, InsuranceCopilotSystem
+from .copilot import create_copilot_system, InsuranceCopilotSystem, plain_result
 from .planner import PlannerAgent
 from .researcher import ResearchAgent
 from .writer import WriterAgent
 from .verifier import VerifierAgent
+from .scheduler import CopilotScheduler, SchedulerFull
+from .semantic_cache import SemanticDeliverableCache
+from .conversation import ConversationState, ConversationNotFound
+from .routing import ModelRouter, ModelTier, RoutingDecision
 
 __all__ = [
     'create_copilot_system',
     'InsuranceCopilotSystem',
+    'plain_result',
     'PlannerAgent',
     'ResearchAgent',
     'WriterAgent',
-    'VerifierAgent'
+    'VerifierAgent',
+    'CopilotScheduler',
+    'SchedulerFull',
+    'SemanticDeliverableCache',
+    'ConversationState',
+    'ConversationNotFound',
+    'ModelRouter',
+    'ModelTier',
+    'RoutingDecision'
 ]
\ No newline at end of file
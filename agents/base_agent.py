@@ -2,33 +2,124 @@
 Base agent class with common functionality
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Optional
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
 import os
+import time
+
+from observability.profiling import profile_block
+from .stub_llm import stub_llm_enabled, create_stub_from_env
+from .prompt_context import build_messages
+from .routing import ModelRouter
+
+DEFAULT_MODEL = "gpt-4o-mini"
 
 
 class BaseAgent:
-    """Base class for all agents"""
+    """Base class for all agents
+    
+    Without a router every call uses DEFAULT_MODEL (self.llm). With a
+    ModelRouter each call's model is chosen per request, and one client per
+    model is created on first use.
+    """
     
-    def __init__(self, name: str, system_prompt: str, api_key: str = None):
+    def __init__(self, name: str, system_prompt: str, api_key: str = None,
+                 router: Optional[ModelRouter] = None):
         self.name = name
         self.system_prompt = system_prompt
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=api_key or os.getenv("OPENAI_API_KEY"),
-            temperature=0
-        )
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.router = router
+        self.llm = self.create_llm(DEFAULT_MODEL)
+        self._llms: Dict[str, Any] = {}
+    
+    def create_llm(self, model: str):
+        """Chat model client for a model name"""
+        if stub_llm_enabled():
+            # Offline mode for load tests: COPILOT_STUB_LLM=1
+            return create_stub_from_env(model)
+        return ChatOpenAI(model=model, api_key=self.api_key, temperature=0)
+    
+    def llm_for(self, model: str):
+        """Client for a model: self.llm for its own model, otherwise cached per model"""
+        if model == self.llm.model_name:
+            return self.llm
+        llm = self._llms.get(model)
+        if llm is None:
+            llm = self._llms.setdefault(model, self.create_llm(model))
+        return llm
+    
+    def register_llm(self, llm):
+        """Use llm for every call routed to its model (e.g. a stub in offline evals)"""
+        self._llms[llm.model_name] = llm
     
-    def invoke(self, user_message: str) -> str:
+    def invoke(self, user_message: str, research_notes: List = None) -> str:
         """Invoke the LLM with system and user messages"""
-        messages = [
-            SystemMessage(content=self.system_prompt),
-            HumanMessage(content=user_message)
-        ]
-        response = self.llm.invoke(messages)
-        return response.content
-    
-    def log(self, message: str) -> str:
-        """Create a log entry for this agent"""
-        return f"\n=== {self.name.upper()} AGENT ===\n{message}"
\ No newline at end of file
+        return self.invoke_with_usage(user_message, research_notes)[0]
+    
+    def invoke_with_usage(self, user_message: str, research_notes: List = None) -> Tuple[str, Dict[str, int]]:
+        """Invoke the LLM and also return its token usage and latency
+        
+        Research notes go into the shared, cacheable prompt prefix. With a
+        router, usage also names the model and tier the call was routed to.
+        """
+        messages = build_messages(self.system_prompt, user_message, research_notes)
+        llm, decision = self.llm, None
+        try:
+            # A routed call counts as in flight until it is recorded, even if it fails here
+            if self.router is not None:
+                decision = self.router.route(self.name.lower(), sum(len(m.content) for m in messages) // 4)
+                llm = self.llm_for(decision.model)
+            start = time.perf_counter()
+            with profile_block(f"llm.{self.name.lower()}"):
+                response = llm.invoke(messages)
+        except Exception as e:
+            if decision is not None:
+                self.router.record(decision, error=e)
+            raise
+        usage = extract_usage(response)
+        usage['latency_s'] = round(time.perf_counter() - start, 4)
+        if decision is not None:
+            usage.update(self.router.record(decision, usage))
+        return response.content, usage
+    
+    def log(self, event: str, message: str = None, **data) -> Dict[str, Any]:
+        """Create a structured trace record for this agent"""
+        record = {'agent': self.name.lower(), 'event': event}
+        if message:
+            record['message'] = message
+        record.update(data)
+        return record
+
+
+def extract_usage(response) -> Dict[str, int]:
+    """Prompt, completion and cached prompt tokens from an LLM response"""
+    usage = getattr(response, 'usage_metadata', None) or {}
+    if usage:
+        details = usage.get('input_token_details') or {}
+        return {
+            'prompt_tokens': usage.get('input_tokens', 0),
+            'completion_tokens': usage.get('output_tokens', 0),
+            'cached_tokens': details.get('cache_read', 0) or 0
+        }
+    token_usage = (getattr(response, 'response_metadata', None) or {}).get('token_usage') or {}
+    details = token_usage.get('prompt_tokens_details') or {}
+    return {
+        'prompt_tokens': token_usage.get('prompt_tokens', 0),
+        'completion_tokens': token_usage.get('completion_tokens', 0),
+        'cached_tokens': details.get('cached_tokens', 0) or 0
+    }
+
+
+def format_trace_entry(entry) -> str:
+    """Render a trace record as a human-readable line"""
+    if isinstance(entry, str):
+        return entry
+    if entry.get('event') == 'started':
+        header = f"=== {entry['agent'].upper()} AGENT ===" if entry['agent'] != 'workflow' \
+            else "=== MULTI-AGENT WORKFLOW STARTED ==="
+        return f"{header}\n{entry['message']}" if entry.get('message') else header
+    details = ", ".join(
+        f"{key}={value}" for key, value in entry.items() if key not in ('agent', 'event', 'message')
+    )
+    text = entry.get('message') or entry['event'].replace('_', ' ').capitalize()
+    return f"{text}: {details}" if details else text
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Conversation state for follow-up requests
+A follow-up reuses the previous turn's plan, research notes and draft: edits
+are a single writer call, and questions that need new evidence retrieve only
+the chunks the conversation does not already have
+"""
+
+import re
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set, Tuple
+
+
+EDIT = "edit"
+RESEARCH = "research"
+
+# Words that describe how to change the deliverable rather than what it should cover
+EDIT_VOCABULARY = {
+    'make', 'made', 'more', 'less', 'much', 'shorter', 'longer', 'short', 'long', 'brief', 'briefer',
+    'concise', 'detailed', 'detail', 'details', 'rephrase', 'reword', 'rewrite', 'rewritten', 'tone',
+    'formal', 'informal', 'casual', 'friendly', 'friendlier', 'polite', 'warmer', 'professional',
+    'simple', 'simpler', 'simplify', 'plain', 'technical', 'jargon', 'bullet', 'bullets', 'points',
+    'format', 'formatting', 'translate', 'polish', 'proofread', 'typo', 'typos', 'grammar', 'wording',
+    'shorten', 'lengthen', 'trim', 'expand', 'condense', 'tighten', 'remove', 'drop', 'delete', 'keep',
+    'move', 'reorder', 'emphasize', 'highlight', 'bold', 'title', 'subject', 'line', 'paragraph',
+    'paragraphs', 'sentence', 'sentences', 'words', 'word', 'section', 'sections', 'email', 'summary',
+    'executive', 'action', 'list', 'actions', 'deliverable', 'draft', 'version', 'again', 'instead',
+    'please', 'change', 'update', 'adjust', 'add', 'sign', 'signature', 'greeting', 'closing', 'client',
+    'customer', 'audience', 'owner', 'owners', 'date', 'dates', 'confidence', 'citations', 'sources',
+    # Tone and style
+    'empathetic', 'empathy', 'compassionate', 'caring', 'warm', 'kind', 'kinder', 'gentle', 'gentler',
+    'soft', 'softer', 'soften', 'firm', 'firmer', 'direct', 'assertive', 'confident', 'persuasive',
+    'reassuring', 'apologetic', 'positive', 'negative', 'neutral', 'upbeat', 'enthusiastic', 'optimistic',
+    'conversational', 'personal', 'personalize', 'personable', 'human', 'natural', 'engaging', 'compelling',
+    'punchy', 'crisp', 'clear', 'clearer', 'clarify', 'readable', 'succinct', 'wordy', 'verbose', 'robotic',
+    'stiff', 'stuffy', 'voice', 'style', 'sound', 'sounds', 'nicer', 'nice', 'better', 'less',
+    # Edits and layout
+    'edit', 'revise', 'revision', 'redo', 'fix', 'improve', 'refine', 'tweak', 'slightly', 'bit', 'little',
+    'lot', 'too', 'heading', 'headings', 'header', 'intro', 'introduction', 'opening', 'conclusion',
+    'ending', 'numbered', 'table', 'markdown', 'capitalize', 'lowercase', 'uppercase', 'start', 'end',
+    'turn', 'convert', 'reformat', 'restructure', 'split', 'merge', 'combine', 'checklist', 'memo',
+    'letter', 'note', 'script', 'faq', 'outline', 'steps', 'step', 'page', 'half', 'quick', 'quicker',
+    'part', 'parts', 'piece',
+    # Who the deliverable is written for
+    'adjuster', 'adjusters', 'underwriter', 'underwriters', 'broker', 'brokers', 'agent', 'agents',
+    'manager', 'managers', 'supervisor', 'team', 'colleague', 'colleagues', 'policyholder',
+    'policyholders', 'insured', 'claimant', 'beginner', 'beginners', 'expert', 'experts', 'layperson',
+}
+
+STOPWORDS = {
+    'about', 'also', 'and', 'any', 'are', 'can', 'could', 'does', 'doing', 'each', 'every', 'first',
+    'for', 'from', 'have', 'here', 'into', 'just', 'like', 'only', 'other', 'same', 'should', 'some',
+    'than', 'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'those', 'what',
+    'when', 'where', 'which', 'while', 'with', 'would', 'your', 'yours', 'ours', 'will',
+    'how', 'why', 'who', 'its', 'it', 'our', 'you', 'was', 'were', 'been', 'being', 'very', 'all',
+    'now', 'but', 'not', 'okay', 'thanks', 'thank', 'great', 'good', 'looks', 'one', 'two', 'three',
+    'way', 'get', 'put', 'use', 'need', 'want', 'something',
+}
+
+
+def _stem(word: str) -> str:
+    """Crude plural stripping so 'deductibles' matches 'deductible'"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+_EDIT_TERMS = {_stem(word) for word in EDIT_VOCABULARY}
+
+
+def content_terms(text: str) -> Set[str]:
+    """Stemmed topic words of a text"""
+    return {_stem(word) for word in re.findall(r"[a-z][a-z\-]{2,}", text.lower()) if word not in STOPWORDS}
+
+
+class ConversationNotFound(LookupError):
+    """The conversation is unknown or was evicted; start it again with a full run"""
+
+
+@dataclass(frozen=True)
+class ConversationState:
+    """What a conversation has established so far; replaced, not mutated, per turn"""
+    user_query: str
+    user_goal: str
+    plan: str
+    research_notes: List
+    draft_output: Dict
+    verification_result: Dict
+    index_generation: int = 0
+    follow_ups: Tuple[str, ...] = ()
+    # Topic words of the request, follow-ups and deliverable, see classify_follow_up
+    vocabulary: Set[str] = field(default_factory=set, repr=False, compare=False)
+
+    @classmethod
+    def from_result(cls, user_query: str, user_goal: str, result: Dict) -> "ConversationState":
+        """Conversation state after a full workflow run"""
+        return cls(
+            user_query=user_query,
+            user_goal=user_goal,
+            plan=result.get('plan', ''),
+            research_notes=list(result['research_notes']),
+            draft_output={'full_text': result['final_output']['full_deliverable']},
+            verification_result=result['verification_result'],
+            index_generation=result.get('index_generation', 0),
+            vocabulary=content_terms(f"{user_query} {user_goal} {result['final_output']['full_deliverable']}")
+        )
+
+    def after_follow_up(self, message: str, result: Dict) -> "ConversationState":
+        """State for the next turn, once a follow-up has produced result"""
+        return replace(
+            self,
+            research_notes=result['research_notes'],
+            draft_output=result['draft_output'],
+            verification_result=result['verification_result'],
+            index_generation=result['index_generation'],
+            follow_ups=self.follow_ups + (message,),
+            vocabulary=self.vocabulary | content_terms(f"{message} {result['draft_output']['full_text']}")
+        )
+
+    def to_state(self) -> Dict:
+        """Workflow-style state dict for the agents"""
+        return {
+            'user_query': self.user_query,
+            'user_goal': self.user_goal,
+            'plan': self.plan,
+            'research_notes': self.research_notes,
+            'new_research_notes': [],
+            'draft_output': self.draft_output,
+            'verification_result': self.verification_result,
+            'index_generation': self.index_generation,
+        }
+
+
+def classify_follow_up(message: str, conversation: ConversationState) -> Tuple[str, List[str]]:
+    """(EDIT or RESEARCH, topic words the conversation has not mentioned yet)
+
+    A follow-up may need new evidence when it names a topic that is not in the
+    request, earlier follow-ups or the current deliverable ("what about
+    commercial auto?"); the delta retrieval then decides whether the corpus
+    has any. Everything else ("make the email shorter", "turn it into a
+    checklist", "rewrite it for an adjuster") edits the current draft.
+    """
+    novel = sorted(term for term in content_terms(message) - _EDIT_TERMS
+                   if term not in conversation.vocabulary)
+    return (RESEARCH if novel else EDIT), novel
+
+
+def follow_up_queries(message: str, conversation: ConversationState,
+                      novel_terms: Optional[List[str]] = None) -> List[str]:
+    """Retrieval queries for a follow-up: as asked, and in the context of the original request"""
+    queries = [message.strip(), f"{conversation.user_query.strip()} {message.strip()}"]
+    if novel_terms:
+        queries.append(" ".join(novel_terms))
+    return queries
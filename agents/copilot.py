@@ -3,15 +3,26 @@ Multi-Agent System Orchestrator using LangGraph
 Implements: Planner -> Research -> Writer -> Verifier workflow
 """
 
-from typing import TypedDict, List, Dict, Annotated
+from typing import TypedDict, List, Dict, Annotated, Optional, Callable
+from collections import OrderedDict
+from contextlib import nullcontext
 import operator
 from langgraph.graph import StateGraph, END
 import os
+import time
+import threading
+
+from observability.profiling import Profiler, profile_span, new_run_id
+from observability.query_log import QueryLogger
+from retrieval.chunk_store import ChunkRef
 
 from .planner import PlannerAgent
 from .researcher import ResearchAgent
 from .writer import WriterAgent
 from .verifier import VerifierAgent
+from .routing import ModelRouter
+from .conversation import (ConversationState, ConversationNotFound, classify_follow_up, follow_up_queries,
+                           EDIT, RESEARCH)
 
 
 # State definition for the multi-agent system
@@ -24,21 +35,36 @@ class AgentState(TypedDict):
     draft_output: Dict
     verification_result: Dict
     final_output: Dict
-    trace_log: Annotated[List[str], operator.add]
+    index_generation: int  # Retriever index generation that answered (see DocumentRetriever.reload)
+    trace_log: Annotated[List[Dict], operator.add]  # Structured records, see BaseAgent.log
     
 
 class InsuranceCopilotSystem:
     """Multi-agent copilot system for insurance queries"""
     
-    def __init__(self, retriever, api_key: str = None):
+    def __init__(self, retriever, api_key: str = None, semantic_cache=None,
+                 profiler: Optional[Profiler] = None, query_logger: Optional[QueryLogger] = None,
+                 max_conversations: int = 256, router: Optional[ModelRouter] = None):
         self.retriever = retriever
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        # Optional SemanticDeliverableCache consulted before running the graph
+        self.semantic_cache = semantic_cache
+        # Decides which runs are profiled (COPILOT_PROFILE_SAMPLE_RATE)
+        self.profiler = profiler or Profiler.from_env()
+        # Optional JSONL record of every run (COPILOT_QUERY_LOG)
+        self.query_logger = query_logger or QueryLogger.from_env()
+        # Optional per-call model routing (COPILOT_ROUTING / COPILOT_ROUTING_CONFIG)
+        self.router = router or ModelRouter.from_env()
+        # Latest ConversationState per conversation id, least recently used evicted first
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._conversations_lock = threading.Lock()
         
         # Initialize all agents
-        self.planner = PlannerAgent(self.api_key)
+        self.planner = PlannerAgent(self.api_key, self.router)
         self.researcher = ResearchAgent(retriever, self.api_key)
-        self.writer = WriterAgent(self.api_key)
-        self.verifier = VerifierAgent(self.api_key)
+        self.writer = WriterAgent(self.api_key, self.router)
+        self.verifier = VerifierAgent(self.api_key, self.router)
         
         # Build the graph
         self.graph = self._build_graph()
@@ -48,10 +74,10 @@ class InsuranceCopilotSystem:
         workflow = StateGraph(AgentState)
         
         # Add nodes for each agent
-        workflow.add_node("planner", self.planner.execute)
-        workflow.add_node("researcher", self.researcher.execute)
-        workflow.add_node("writer", self.writer.execute)
-        workflow.add_node("verifier", self.verifier.execute)
+        workflow.add_node("planner", profile_span("node.planner")(self.planner.execute))
+        workflow.add_node("researcher", profile_span("node.researcher")(self.researcher.execute))
+        workflow.add_node("writer", profile_span("node.writer")(self.writer.execute))
+        workflow.add_node("verifier", profile_span("node.verifier")(self.verifier.execute))
         
         # Define the workflow edges
         workflow.set_entry_point("planner")
@@ -62,9 +88,179 @@ class InsuranceCopilotSystem:
         
         return workflow.compile()
     
-    def run(self, user_query: str, user_goal: str) -> Dict:
-        """Execute the multi-agent workflow"""
-        initial_state = {
+    def run(self, user_query: str, user_goal: str, profile: Optional[bool] = None,
+            conversation_id: Optional[str] = None) -> Dict:
+        """Execute the multi-agent workflow
+        
+        profile=True forces a profile of this run, False disables it, and
+        None leaves it to the profiler's sample rate. With a conversation_id,
+        the result starts (or restarts) that conversation for follow_up.
+        """
+        result = self._observed(user_query, user_goal, profile, lambda: self._run(user_query, user_goal))
+        if conversation_id is not None:
+            self.start_conversation(conversation_id, user_query, user_goal, result)
+        return result
+    
+    def start_conversation(self, conversation_id: str, user_query: str, user_goal: str, result: Dict):
+        """Make a run's result the starting point for follow-ups in a conversation"""
+        self._remember(conversation_id, ConversationState.from_result(user_query, user_goal, result))
+    
+    def follow_up(self, conversation_id: str, message: str, profile: Optional[bool] = None,
+                  kind: Optional[str] = None) -> Dict:
+        """Answer a follow-up by revising the conversation's last deliverable
+        
+        Edits ("make the email shorter") are one writer call with the previous
+        verification carried over. Follow-ups that name a new topic ("what
+        about commercial auto?") retrieve only chunks the conversation does not
+        have; if any clear the relevance floor the draft is revised and
+        verified, otherwise the follow-up is answered as an edit and marked
+        unverified. kind forces EDIT or RESEARCH.
+        Raises ConversationNotFound if the conversation is unknown or evicted.
+        """
+        conversation = self.conversation(conversation_id)
+        if conversation is None:
+            raise ConversationNotFound(f"Unknown conversation {conversation_id!r}; submit a new request first")
+        
+        result = self._observed(message, conversation.user_goal, profile,
+                                lambda: self._follow_up(conversation, message, kind))
+        self._remember(conversation_id, conversation.after_follow_up(message, result))
+        return result
+    
+    def conversation(self, conversation_id: str) -> Optional[ConversationState]:
+        """Latest state of a conversation, or None if unknown or evicted"""
+        with self._conversations_lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                self._conversations.move_to_end(conversation_id)
+            return conversation
+    
+    def end_conversation(self, conversation_id: str):
+        """Forget a conversation"""
+        with self._conversations_lock:
+            self._conversations.pop(conversation_id, None)
+    
+    def _remember(self, conversation_id: str, conversation: ConversationState):
+        """Store a conversation's latest state, evicting the least recently used"""
+        with self._conversations_lock:
+            self._conversations[conversation_id] = conversation
+            self._conversations.move_to_end(conversation_id)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+    
+    def _observed(self, user_query: str, user_goal: str, profile: Optional[bool],
+                  fn: Callable[[], Dict]) -> Dict:
+        """Run fn under the profiler and router and record it in the query log"""
+        run_id = new_run_id()
+        started_at = time.time()
+        start = time.perf_counter()
+        routing = self.router.request(user_query, user_goal) if self.router is not None else nullcontext()
+        try:
+            with self.profiler.session(run_id, profile) as session, routing:
+                result = fn()
+        except Exception as e:
+            if self.query_logger is not None:
+                self.query_logger.log_run(user_query, user_goal, None, time.perf_counter() - start,
+                                          error=e, run_id=run_id, started_at=started_at)
+            raise
+        
+        result['run_id'] = run_id
+        if session is not None:
+            result['profile_dir'] = session.directory
+        if self.query_logger is not None:
+            self.query_logger.log_run(user_query, user_goal, result, time.perf_counter() - start,
+                                      started_at=started_at)
+        return result
+    
+    def _follow_up(self, conversation: ConversationState, message: str, kind: Optional[str]) -> Dict:
+        """Revise the conversation's deliverable, retrieving new evidence only if needed"""
+        classified, novel_terms = classify_follow_up(message, conversation)
+        forced = kind is not None
+        kind = kind or classified
+        state = conversation.to_state()
+        trace_log = [{'agent': 'workflow', 'event': 'follow_up', 'message': "Follow-up request",
+                      'kind': kind, 'turn': len(conversation.follow_ups) + 1, 'novel_terms': novel_terms}]
+        
+        if kind == RESEARCH:
+            update = profile_span("node.researcher")(self.researcher.retrieve_delta)(
+                follow_up_queries(message, conversation, novel_terms), conversation.research_notes
+            )
+            trace_log += update.pop('trace_log')
+            state.update(update)
+        
+        # Nothing new cleared the relevance floor: answer as an edit, but the
+        # writer may have gone beyond the notes, so the result is unverified
+        unsupported = kind == RESEARCH and not forced and not state['new_research_notes']
+        if unsupported:
+            kind = EDIT
+        
+        update = profile_span("node.writer")(self.writer.revise)(state, message)
+        trace_log += update.pop('trace_log')
+        state.update(update)
+        
+        if kind == RESEARCH:
+            update = profile_span("node.verifier")(self.verifier.execute)(state)
+            trace_log += update.pop('trace_log')
+            state.update(update)
+        else:
+            if unsupported:
+                state['verification_result'] = {
+                    'passed': False, 'unverified': True,
+                    'report': (f"Not verified: no new sources cover {', '.join(novel_terms)}. "
+                               "Submit it as a new request, or as a research follow-up, to verify it.")
+                }
+            else:
+                # No new facts were introduced, so the previous verification still applies
+                state['verification_result'] = {**conversation.verification_result, 'carried_over': True}
+            state['final_output'] = self.verifier.build_final_output(state, state['verification_result'])
+            trace_log.append({'agent': 'verifier', 'event': 'unverified' if unsupported else 'carried_over',
+                              'message': ("No new evidence; follow-up not verified" if unsupported
+                                          else "Verification carried over from previous turn"),
+                              'passed': state['verification_result']['passed']})
+        
+        state['research_notes'] = state['final_output']['sources']
+        state['follow_up'] = {'message': message, 'kind': kind,
+                              'new_chunks': len(state.pop('new_research_notes'))}
+        state['trace_log'] = trace_log
+        return state
+    
+    def _run(self, user_query: str, user_goal: str) -> Dict:
+        """Run the graph, consulting the semantic cache if configured"""
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(user_query, user_goal)
+            if cached is not None:
+                return cached
+        
+        result = self.graph.invoke(self._initial_state(user_query, user_goal))
+        
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(user_query, user_goal, result)
+        return result
+    
+    def run_streaming(self, user_query: str, user_goal: str, on_update: Callable[[str, Dict], None],
+                      profile: Optional[bool] = None) -> Dict:
+        """Execute the workflow like run, calling on_update(node, state update) as each agent finishes
+        
+        Runs under the same profiler, router and query log as run, but does not
+        consult the semantic cache, since a cached result has no agent updates.
+        """
+        return self._observed(user_query, user_goal, profile,
+                              lambda: self._run_streaming(user_query, user_goal, on_update))
+    
+    def _run_streaming(self, user_query: str, user_goal: str, on_update: Callable[[str, Dict], None]) -> Dict:
+        """Stream the graph's updates to on_update and return the final state"""
+        result = None
+        for mode, event in self.graph.stream(self._initial_state(user_query, user_goal),
+                                             stream_mode=["updates", "values"]):
+            if mode == "updates":
+                for node, update in event.items():
+                    on_update(node, update)
+            else:
+                result = event
+        return result
+    
+    def _initial_state(self, user_query: str, user_goal: str) -> Dict:
+        """Initial workflow state for a request"""
+        return {
             "user_query": user_query,
             "user_goal": user_goal,
             "plan": "",
@@ -72,13 +268,29 @@ class InsuranceCopilotSystem:
             "draft_output": {},
             "verification_result": {},
             "final_output": {},
-            "trace_log": ["=== MULTI-AGENT WORKFLOW STARTED ==="]
+            "index_generation": 0,
+            "trace_log": [{'agent': 'workflow', 'event': 'started'}]
         }
-        
-        result = self.graph.invoke(initial_state)
-        return result
 
 
-def create_copilot_system(retriever) -> InsuranceCopilotSystem:
+def plain_result(result: Dict) -> Dict:
+    """Copy of a result with ChunkRef notes replaced by plain note dicts
+    
+    Results hold ChunkRefs, which are compact but keep their chunk store alive
+    and are not JSON-serializable. Use this before serializing a result or
+    keeping it across index reloads.
+    """
+    notes = [note.to_dict() if isinstance(note, ChunkRef) else note for note in result['research_notes']]
+    plain = {**result, 'research_notes': notes}
+    if result.get('final_output'):
+        plain['final_output'] = {**result['final_output'], 'sources': notes}
+    return plain
+
+
+def create_copilot_system(retriever, use_semantic_cache: bool = False) -> InsuranceCopilotSystem:
     """Factory function to create the copilot system"""
-    return InsuranceCopilotSystem(retriever)
\ No newline at end of file
+    semantic_cache = None
+    if use_semantic_cache:
+        from .semantic_cache import SemanticDeliverableCache
+        semantic_cache = SemanticDeliverableCache(retriever)
+    return InsuranceCopilotSystem(retriever, semantic_cache=semantic_cache)
\ No newline at end of file
@@ -4,32 +4,32 @@ Planner Agent - Decomposes tasks and creates execution plans
 
 from typing import Dict
 from .base_agent import BaseAgent
+from .routing import ModelRouter
 from .prompts import PLANNER_PROMPT
 
 
 class PlannerAgent(BaseAgent):
     """Agent that decomposes the task and creates an execution plan"""
     
-    def __init__(self, api_key: str = None):
-        super().__init__("Planner", PLANNER_PROMPT, api_key)
+    def __init__(self, api_key: str = None, router: ModelRouter = None):
+        super().__init__("Planner", PLANNER_PROMPT, api_key, router)
     
     def execute(self, state: Dict) -> Dict:
         """Execute the planner agent"""
-        trace_log = [self.log("Starting task decomposition")]
+        trace_log = [self.log("started", "Starting task decomposition")]
         
         user_message = f"""User Query: {state['user_query']}
 User Goal: {state['user_goal']}
 
 Create an execution plan for this task."""
         
-        plan = self.invoke(user_message)
+        plan, usage = self.invoke_with_usage(user_message)
         
         num_steps = len(plan.split('\n'))
-        trace_log.append(f"Plan created with {num_steps} steps")
-        trace_log.append(f"Plan preview: {plan[:200]}...")
+        trace_log.append(self.log("plan_created", "Plan created", steps=num_steps, **usage))
         
+        # Return only the keys this agent changed
         return {
-            **state,
             "plan": plan,
             "trace_log": trace_log
         }
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Prompt assembly ordered for provider-side prefix caching
+Stable content first: shared system prompt, research notes in canonical order,
+then the agent prompt and the per-request text
+"""
+
+from typing import List
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from .prompts import RESEARCH_CONTEXT_PROMPT
+
+
+def canonical_notes(research_notes: List) -> List:
+    """Research notes in a deterministic order (document, chunk id)"""
+    return sorted(research_notes, key=lambda note: (note['document'], note['chunk_id']))
+
+
+def build_research_context(research_notes: List) -> str:
+    """Research notes formatted identically for every agent"""
+    return "\n\n".join(
+        f"Source: {note['citation']}\nContent: {note['text']}"
+        for note in canonical_notes(research_notes)
+    )
+
+
+def build_additional_notes(new_notes: List) -> str:
+    """Notes retrieved after the prefix was fixed, for the per-request part of a prompt"""
+    if not new_notes:
+        return ""
+    return f"Additional Research Notes:\n{build_research_context(new_notes)}\n\n"
+
+
+def build_messages(system_prompt: str, user_message: str, research_notes: List = None) -> List:
+    """Messages for an LLM call, with the research notes in the cacheable prefix"""
+    if research_notes is None:
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_message)
+        ]
+    return [
+        SystemMessage(content=f"{RESEARCH_CONTEXT_PROMPT}\n\nResearch Notes:\n{build_research_context(research_notes)}"),
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_message)
+    ]
@@ -60,4 +60,12 @@ DETAILS:
 - Identify contradictions
 
 If PASS: The draft is well-supported by sources.
-If FAIL: List specific issues that need correction."""
\ No newline at end of file
+If FAIL: List specific issues that need correction."""
+
+
+# Shared leading system message for every agent that works from research notes.
+# It comes before the notes and the agent-specific prompt so that the writer and
+# verifier send an identical prompt prefix that the provider can cache.
+RESEARCH_CONTEXT_PROMPT = """You are part of a multi-agent insurance copilot. The research notes below were retrieved from the company's insurance document corpus. They are the only allowed sources of facts.
+
+Each note has a citation in [DocumentName, chunk_X] format followed by its content."""
\ No newline at end of file
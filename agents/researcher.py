@@ -2,7 +2,10 @@
 Research Agent - Retrieves grounded information with citations
 """
 
-from typing import Dict, List
+import time
+from typing import Dict, List, Tuple
+from retrieval.chunk_store import ChunkRef
+from retrieval.adaptive_depth import AdaptiveDepthPolicy
 from .base_agent import BaseAgent
 from .prompts import RESEARCH_PROMPT
 
@@ -10,13 +13,15 @@ from .prompts import RESEARCH_PROMPT
 class ResearchAgent(BaseAgent):
     """Agent that retrieves grounded information with citations"""
     
-    def __init__(self, retriever, api_key: str = None):
+    def __init__(self, retriever, api_key: str = None, depth_policy: AdaptiveDepthPolicy = None):
         super().__init__("Researcher", RESEARCH_PROMPT, api_key)
         self.retriever = retriever
+        # Hits kept per query depend on the score distribution, within a global budget
+        self.depth_policy = depth_policy or AdaptiveDepthPolicy.from_env()
     
     def execute(self, state: Dict) -> Dict:
         """Execute the research agent"""
-        trace_log = [self.log("Starting document retrieval")]
+        trace_log = [self.log("started", "Starting document retrieval")]
         
         # Parse plan to extract research queries
         plan_lines = state['plan'].split('\n')
@@ -30,33 +35,57 @@ class ResearchAgent(BaseAgent):
         if not research_queries:
             research_queries = [state['user_query']]
         
-        # Perform retrieval for each query
-        all_research_notes = []
-        seen_chunks = set()
-        
-        trace_log.append(f"Executing {len(research_queries)} research queries")
+        research_queries = research_queries[:5]  # Limit to 5 queries max
+        trace_log.append(self.log("queries_planned", "Executing research queries", queries=len(research_queries)))
         
-        for query in research_queries[:5]:  # Limit to 5 queries max
-            results = self.retriever.search(query, k=3)
-            
-            for result in results:
-                chunk_key = f"{result['document']}_{result['chunk_id']}"
-                if chunk_key not in seen_chunks:
-                    all_research_notes.append({
-                        'text': result['text'],
-                        'citation': result['citation'],
-                        'document': result['document'],
-                        'chunk_id': result['chunk_id'],
-                        'relevance': result['relevance_score'],
-                        'query': query
-                    })
-                    seen_chunks.add(chunk_key)
-        
-        trace_log.append(f"Retrieved {len(all_research_notes)} unique document chunks")
-        trace_log.append(f"Documents used: {', '.join(set(note['document'] for note in all_research_notes))}")
+        all_research_notes, generation, retrieved = self._retrieve(research_queries, set())
+        trace_log.append(self.log("retrieved", "Retrieved unique document chunks", **retrieved))
         
+        # Return only the keys this agent changed
         return {
-            **state,
             "research_notes": all_research_notes,
+            "index_generation": generation,
+            "trace_log": trace_log
+        }
+    
+    def retrieve_delta(self, queries: List[str], known_notes: List) -> Dict:
+        """Retrieve only chunks not already in known_notes (conversational follow-ups)"""
+        trace_log = [self.log("started", "Retrieving new evidence for follow-up")]
+        seen_chunks = set(note['citation'] for note in known_notes)
+        new_notes, generation, retrieved = self._retrieve(queries, seen_chunks)
+        trace_log.append(self.log("retrieved", "Retrieved new document chunks", **retrieved))
+        return {
+            "new_research_notes": new_notes,
+            "index_generation": generation,
             "trace_log": trace_log
-        }
\ No newline at end of file
+        }
+    
+    def _retrieve(self, research_queries: List[str], seen_chunks: set) -> Tuple[List[ChunkRef], int, Dict]:
+        """Run queries within the depth budget; returns (notes, index generation, log data)"""
+        all_research_notes = []
+        budget = self.depth_policy.new_budget()
+        # Pin one index generation so a hot reload cannot swap it mid-research
+        snapshot = self.retriever.snapshot()
+        
+        queries_run = 0
+        start = time.perf_counter()
+        for query in research_queries:
+            if budget.exhausted():
+                break
+            results = self.retriever.search(query, k=self.depth_policy.max_k, snapshot=snapshot)
+            queries_run += 1
+            
+            for result in budget.offer(results, seen_chunks):
+                # Store a reference; the text is resolved from the chunk store on use
+                all_research_notes.append(ChunkRef(
+                    snapshot.chunks, result['row'], result['relevance_score'], query
+                ))
+        
+        retrieved = {
+            'documents': sorted(set(note.document for note in all_research_notes)),
+            'queries_skipped': len(research_queries) - queries_run,
+            'index_generation': snapshot.generation,
+            'retrieval_s': round(time.perf_counter() - start, 4),
+            **budget.summary()
+        }
+        return all_research_notes, snapshot.generation, retrieved
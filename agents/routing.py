@@ -0,0 +1,279 @@
+"""
+Cost/latency-aware model routing per agent and per request
+Each LLM call gets a model tier from the agent's preferred tier, the request's
+complexity, the prompt size, current load and the latency SLO. Decisions and
+their outcomes are recorded for offline tuning (eval/tune_routing.py)
+
+Enable with COPILOT_ROUTING=1 (default tiers) or COPILOT_ROUTING_CONFIG=routing.json;
+COPILOT_ROUTING_LOG=./logs/routing.jsonl records every decision.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from observability.query_log import jsonl_logger
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """A model and what it costs; tiers are ordered cheapest/fastest first"""
+    name: str
+    model: str
+    input_cost_per_1m: float  # USD per million prompt tokens
+    output_cost_per_1m: float  # USD per million completion tokens
+    base_latency_s: float  # Expected latency of a small call, before any are observed
+    latency_per_1k_prompt_s: float = 0.0
+    max_prompt_tokens: int = 128000
+    cached_input_discount: float = 0.5  # Fraction of the input price saved on cached tokens
+
+    def cost(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        """USD cost of one call"""
+        billed_input = prompt_tokens - cached_tokens * self.cached_input_discount
+        return (billed_input * self.input_cost_per_1m + completion_tokens * self.output_cost_per_1m) / 1e6
+
+    def expected_latency(self, prompt_tokens: int) -> float:
+        """Latency estimate from the tier's configured profile"""
+        return self.base_latency_s + self.latency_per_1k_prompt_s * prompt_tokens / 1000
+
+
+DEFAULT_TIERS = [
+    ModelTier("fast", "gpt-4o-mini", 0.15, 0.60, base_latency_s=1.5, latency_per_1k_prompt_s=0.15),
+    ModelTier("quality", "gpt-4o", 2.50, 10.00, base_latency_s=3.5, latency_per_1k_prompt_s=0.35),
+]
+
+
+@dataclass
+class AgentRoute:
+    """Routing policy for one agent
+
+    preferred is the tier used for an ordinary request. Requests at or above
+    upgrade_complexity move up one tier, up to max_tier; load and the SLO can
+    move them down to min_tier.
+    """
+    preferred: str = "fast"
+    min_tier: str = "fast"
+    max_tier: str = "fast"
+    upgrade_complexity: float = 0.6
+    slo_share: float = 0.33  # Share of the request SLO this agent's call may use
+
+
+DEFAULT_ROUTES = {
+    'planner': AgentRoute(preferred="fast", max_tier="quality", upgrade_complexity=0.7, slo_share=0.15),
+    'writer': AgentRoute(preferred="fast", max_tier="quality", upgrade_complexity=0.4, slo_share=0.55),
+    'verifier': AgentRoute(preferred="fast", max_tier="quality", upgrade_complexity=0.6, slo_share=0.30),
+}
+
+# Phrases that make a request multi-part or analytical
+_COMPLEXITY_CUES = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|difference|differences|trade-?offs?|analy[sz]e|evaluate|"
+    r"explain why|implications?|impact|scenario|each|all of|step[- ]by[- ]step|both)\b"
+)
+
+
+def query_complexity(user_query: str, user_goal: str = "") -> float:
+    """Heuristic complexity in [0, 1]: length, number of parts and analytical cues"""
+    text = f"{user_query} {user_goal}".lower()
+    length = min(len(text.split()) / 60, 1.0)
+    parts = text.count('?') + text.count(';') + text.count(' and ') + text.count(',') / 2
+    cues = len(_COMPLEXITY_CUES.findall(text))
+    return round(min(0.4 * length + 0.3 * min(parts / 4, 1.0) + 0.3 * min(cues / 2, 1.0), 1.0), 3)
+
+
+@dataclass
+class RequestContext:
+    """Per-request routing inputs, set for the duration of a copilot run"""
+    complexity: float
+    slo_s: float
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+_current_request: ContextVar[Optional[RequestContext]] = ContextVar("copilot_routing_request", default=None)
+
+
+@dataclass
+class RoutingDecision:
+    """The tier chosen for one LLM call, the inputs behind it and, once recorded, its outcome"""
+    agent: str
+    tier: str
+    model: str
+    reasons: List[str]
+    prompt_tokens_est: int
+    complexity: float
+    queue_depth: int
+    inflight: int
+    budget_s: float
+    expected_latency_s: float
+    outcome: Dict = field(default_factory=dict)
+
+
+class ModelRouter:
+    """Chooses a model tier per agent call
+
+    Order of rules: start at the agent's preferred tier; move up one tier for
+    complex requests; move up to the cheapest tier whose context fits the
+    prompt; move down one tier when the scheduler queue or in-flight LLM calls
+    reach their limits; then keep moving down while the expected latency
+    exceeds the agent's share of the remaining SLO.
+    """
+
+    def __init__(self, tiers: List[ModelTier] = None, routes: Dict[str, AgentRoute] = None,
+                 slo_s: float = 30.0, downgrade_queue_depth: int = 4, downgrade_inflight: int = 8,
+                 log_path: Optional[str] = None, ewma_alpha: float = 0.2, min_samples: int = 3):
+        self.tiers = list(tiers or DEFAULT_TIERS)
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self.slo_s = slo_s
+        self.downgrade_queue_depth = downgrade_queue_depth
+        self.downgrade_inflight = downgrade_inflight
+        self.ewma_alpha = ewma_alpha
+        self.min_samples = min_samples
+        self.scheduler = None  # Set by CopilotScheduler.attach; supplies queue depth
+        self._index = {tier.name: i for i, tier in enumerate(self.tiers)}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._latency: Dict[tuple, List[float]] = {}  # (agent, model) -> [ewma seconds, samples]
+        self._stats = {'calls': 0, 'upgrades': 0, 'load_downgrades': 0, 'slo_downgrades': 0,
+                       'cost_usd': 0.0, 'by_tier': {tier.name: 0 for tier in self.tiers}}
+        self._log = jsonl_logger("copilot.routing_log", log_path) if log_path else None
+
+    @classmethod
+    def from_config(cls, config: Dict, log_path: Optional[str] = None) -> "ModelRouter":
+        """Router from a dict: {"tiers": [...], "routes": {agent: {...}}, "slo_s": ..., ...}"""
+        tiers = [ModelTier(**tier) for tier in config['tiers']] if 'tiers' in config else None
+        routes = None
+        if 'routes' in config:
+            routes = dict(DEFAULT_ROUTES)
+            routes.update({agent: AgentRoute(**route) for agent, route in config['routes'].items()})
+        options = {key: config[key] for key in ('slo_s', 'downgrade_queue_depth', 'downgrade_inflight')
+                   if key in config}
+        return cls(tiers, routes, log_path=log_path, **options)
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelRouter"]:
+        """Router for COPILOT_ROUTING / COPILOT_ROUTING_CONFIG, or None when neither is set"""
+        config_path = os.getenv("COPILOT_ROUTING_CONFIG")
+        if not config_path and os.getenv("COPILOT_ROUTING", "0") != "1":
+            return None
+        config = {}
+        if config_path:
+            with open(config_path, encoding='utf-8') as f:
+                config = json.load(f)
+        if os.getenv("COPILOT_SLO_S"):
+            config['slo_s'] = float(os.getenv("COPILOT_SLO_S"))
+        return cls.from_config(config, log_path=os.getenv("COPILOT_ROUTING_LOG"))
+
+    def attach(self, scheduler):
+        """Read queue depth from this scheduler when routing"""
+        self.scheduler = scheduler
+
+    @contextmanager
+    def request(self, user_query: str, user_goal: str, slo_s: Optional[float] = None):
+        """Routing context for one copilot request (complexity, SLO clock)"""
+        token = _current_request.set(RequestContext(query_complexity(user_query, user_goal),
+                                                    slo_s or self.slo_s))
+        try:
+            yield
+        finally:
+            _current_request.reset(token)
+
+    def route(self, agent: str, prompt_tokens: int) -> RoutingDecision:
+        """Choose the tier for one call of agent with a prompt of prompt_tokens"""
+        route = self.routes.get(agent, AgentRoute())
+        request = _current_request.get()
+        complexity = request.complexity if request else 0.0
+        reasons = []
+
+        lowest, highest = self._index[route.min_tier], self._index[route.max_tier]
+        level = self._index[route.preferred]
+        if complexity >= route.upgrade_complexity and level < highest:
+            level += 1
+            reasons.append(f"complexity {complexity:.2f} >= {route.upgrade_complexity}")
+        while level < len(self.tiers) - 1 and prompt_tokens > self.tiers[level].max_prompt_tokens:
+            level += 1
+            lowest = max(lowest, level)
+            reasons.append(f"prompt {prompt_tokens} tokens exceeds {self.tiers[level - 1].name} context")
+
+        queue_depth = self.scheduler.queue_depth() if self.scheduler is not None else 0
+        with self._lock:
+            inflight = self._inflight
+        if level > lowest and (queue_depth >= self.downgrade_queue_depth or inflight >= self.downgrade_inflight):
+            level -= 1
+            reasons.append(f"load: queue {queue_depth}, in-flight {inflight}")
+
+        # Budget: the agent's share of the SLO, and never more than what is left of it
+        slo_s = request.slo_s if request else self.slo_s
+        budget = slo_s * route.slo_share
+        if request is not None:
+            budget = min(budget, max(slo_s - request.elapsed(), 0.0))
+        expected = self.expected_latency(agent, self.tiers[level], prompt_tokens)
+        while level > lowest and expected > budget:
+            reasons.append(f"slo: {self.tiers[level].name} ~{expected:.1f}s > {budget:.1f}s budget")
+            level -= 1
+            expected = self.expected_latency(agent, self.tiers[level], prompt_tokens)
+
+        tier = self.tiers[level]
+        with self._lock:
+            self._inflight += 1
+            self._stats['calls'] += 1
+            self._stats['by_tier'][tier.name] += 1
+            self._stats['upgrades'] += level > self._index[route.preferred]
+            self._stats['load_downgrades'] += any(reason.startswith("load") for reason in reasons)
+            self._stats['slo_downgrades'] += any(reason.startswith("slo") for reason in reasons)
+        return RoutingDecision(agent, tier.name, tier.model, reasons, prompt_tokens, complexity,
+                               queue_depth, inflight, round(budget, 3), round(expected, 3))
+
+    def expected_latency(self, agent: str, tier: ModelTier, prompt_tokens: int) -> float:
+        """Observed latency of this agent on this model once there are enough samples, else the tier's profile"""
+        with self._lock:
+            observed = self._latency.get((agent, tier.model))
+        if observed and observed[1] >= self.min_samples:
+            return observed[0]
+        return tier.expected_latency(prompt_tokens)
+
+    def record(self, decision: RoutingDecision, usage: Optional[Dict] = None,
+               error: Optional[BaseException] = None) -> Dict:
+        """Record the outcome of a routed call; returns its trace fields"""
+        tier = self.tiers[self._index[decision.tier]]
+        outcome = {}
+        if usage is not None:
+            outcome = {key: usage[key] for key in ('latency_s', 'prompt_tokens', 'completion_tokens',
+                                                   'cached_tokens') if key in usage}
+            outcome['cost_usd'] = round(tier.cost(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0),
+                                                  usage.get('cached_tokens', 0)), 6)
+            outcome['within_budget'] = usage.get('latency_s', 0.0) <= decision.budget_s
+        if error is not None:
+            outcome['error'] = f"{type(error).__name__}: {error}"
+        decision.outcome = outcome
+
+        with self._lock:
+            self._inflight -= 1
+            if 'latency_s' in outcome:
+                key = (decision.agent, decision.model)
+                observed = self._latency.setdefault(key, [outcome['latency_s'], 0])
+                observed[0] += self.ewma_alpha * (outcome['latency_s'] - observed[0])
+                observed[1] += 1
+                self._stats['cost_usd'] += outcome['cost_usd']
+        if self._log is not None:
+            self._log.info(json.dumps({'ts': time.time(), **asdict(decision)}, default=str))
+        return {'model': decision.model, 'tier': decision.tier, 'route_reasons': decision.reasons}
+
+    def stats(self) -> Dict:
+        """Calls per tier, upgrade/downgrade counts, estimated spend and observed latencies"""
+        with self._lock:
+            return {
+                **self._stats,
+                'by_tier': dict(self._stats['by_tier']),
+                'cost_usd': round(self._stats['cost_usd'], 6),
+                'inflight': self._inflight,
+                'latency_s': {f"{agent}/{model}": round(value[0], 3)
+                              for (agent, model), value in self._latency.items()},
+            }
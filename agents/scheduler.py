@@ -0,0 +1,189 @@
+"""
+Process-wide request scheduler for the copilot system
+Bounded worker pool, priority queue and coalescing of identical in-flight requests
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Callable, Hashable, List, Optional
+
+
+class _Call:
+    """One queued execution and the futures of every caller waiting on it"""
+    __slots__ = ('key', 'fn', 'futures', 'started')
+
+    def __init__(self, key: Optional[Hashable], fn: Callable, future: Future):
+        self.key = key
+        self.fn = fn
+        self.futures: List[Future] = [future]
+        self.started = False
+
+
+class SchedulerFull(RuntimeError):
+    """The scheduler's queue is full; the caller should retry later"""
+
+
+def _check_priority(priority):
+    """Priorities are compared in the heap, so they must be plain numbers"""
+    if isinstance(priority, bool) or not isinstance(priority, (int, float)) or priority != priority:
+        raise ValueError(f"priority must be a number, got {priority!r}")
+
+
+class CopilotScheduler:
+    """Schedules copilot runs from all sessions onto a bounded worker pool
+
+    Lower priority values run first; requests with equal priority run in
+    arrival order. Identical in-flight (query, goal) pairs share one execution,
+    but every caller gets its own Future: cancelling one only withdraws that
+    caller, and the execution is skipped only if all callers cancel before it
+    starts.
+    """
+
+    def __init__(self, copilot, max_workers: int = 4, max_queue: int = 100):
+        self.copilot = copilot
+        self.max_workers = max_workers
+        self._queue: queue.PriorityQueue = queue.PriorityQueue(maxsize=max_queue)
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._stats = {'submitted': 0, 'coalesced': 0, 'completed': 0, 'failed': 0, 'cancelled': 0,
+                       'rejected': 0}
+        self._active = 0
+        self._wait_times = deque(maxlen=500)  # Seconds spent queued, recent requests
+        self._run_times = deque(maxlen=500)
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"copilot-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        # A model router downgrades tiers when this queue backs up
+        if getattr(copilot, 'router', None) is not None:
+            copilot.router.attach(self)
+
+    def submit(self, user_query: str, user_goal: str, priority: int = 0) -> Future:
+        """Queue a copilot run; returns a Future resolving to the result"""
+        key = ('run', user_query.strip(), user_goal.strip())
+        return self.submit_call(key, lambda: self.copilot.run(user_query, user_goal), priority)
+
+    def run(self, user_query: str, user_goal: str, priority: int = 0,
+            timeout: Optional[float] = None) -> Dict:
+        """Queue a copilot run and wait for its result"""
+        return self.submit(user_query, user_goal, priority).result(timeout)
+
+    def submit_call(self, key: Optional[Hashable], fn: Callable, priority: int = 0) -> Future:
+        """Queue any callable; calls with the same key share one execution
+
+        key=None disables coalescing for this call. When the execution starts,
+        each caller's future gets a started_at attribute (time.perf_counter()).
+        Raises SchedulerFull if the queue is full.
+        """
+        _check_priority(priority)
+        future = Future()
+        with self._lock:
+            call = self._inflight.get(key) if key is not None else None
+            if call is not None:
+                if call.started:
+                    future.set_running_or_notify_cancel()
+                    future.started_at = time.perf_counter()
+                call.futures.append(future)
+                self._stats['coalesced'] += 1
+                return future
+            call = _Call(key, fn, future)
+            try:
+                self._queue.put_nowait((priority, next(self._sequence), time.monotonic(), call))
+            except queue.Full:
+                self._stats['rejected'] += 1
+                raise SchedulerFull("Copilot is at capacity, please retry shortly")
+            if key is not None:
+                self._inflight[key] = call
+            self._stats['submitted'] += 1
+        return future
+
+    def _worker(self):
+        """Worker loop: run queued calls in priority order"""
+        while True:
+            _, _, enqueued_at, call = self._queue.get()
+            if call is None:  # Shutdown sentinel
+                break
+            try:
+                self._execute(call, enqueued_at)
+            except Exception as e:
+                # Never let one bad item end the worker thread
+                print(f"Scheduler worker error: {type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, call: _Call, enqueued_at: float):
+        """Run one call and resolve the futures of every caller still waiting"""
+        started_at = time.monotonic()
+        with self._lock:
+            self._wait_times.append(started_at - enqueued_at)
+            call.started = True
+            # Futures cancelled while queued drop out; the rest can no longer be cancelled
+            waiting = [future for future in call.futures if future.set_running_or_notify_cancel()]
+            self._stats['cancelled'] += len(call.futures) - len(waiting)
+            call.futures = waiting
+            if not waiting:
+                self._release(call)
+                return
+            self._active += 1
+        for future in waiting:
+            future.started_at = time.perf_counter()
+
+        result, error, outcome = None, None, 'failed'
+        try:
+            result = call.fn()
+            outcome = 'completed'
+        except BaseException as e:
+            error = e
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._stats[outcome] += 1
+                self._run_times.append(time.monotonic() - started_at)
+                self._release(call)
+                callers = list(call.futures)
+            for future in callers:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    def _release(self, call: _Call):
+        """Stop coalescing onto a call (caller holds the lock)"""
+        if call.key is not None and self._inflight.get(call.key) is call:
+            del self._inflight[call.key]
+
+    def queue_depth(self) -> int:
+        """Requests waiting for a worker"""
+        return self._queue.qsize()
+
+    def metrics(self) -> Dict:
+        """Queue depth, wait-time and throughput counters"""
+        with self._lock:
+            waits = sorted(self._wait_times)
+            runs = list(self._run_times)
+            return {
+                **self._stats,
+                'queue_depth': self._queue.qsize(),
+                'active': self._active,
+                'workers': self.max_workers,
+                'avg_wait_s': sum(waits) / len(waits) if waits else 0.0,
+                'p95_wait_s': waits[round(0.95 * (len(waits) - 1))] if waits else 0.0,
+                'max_wait_s': waits[-1] if waits else 0.0,
+                'avg_run_s': sum(runs) / len(runs) if runs else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers after the queued requests finish"""
+        for _ in self._workers:
+            # Sentinels sort after every real request
+            self._queue.put((float('inf'), next(self._sequence), 0.0, None))
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -0,0 +1,167 @@
+"""
+Semantic deliverable cache - Serves verified deliverables for near-duplicate queries
+"""
+
+import time
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+
+# Per-run fields that must not be served from, or stored into, the cache
+RUN_FIELDS = ('run_id', 'profile_dir')
+
+
+def _copy_result(result: Dict) -> Dict:
+    """Copy of a result's dicts and lists; notes and other values are shared"""
+    if isinstance(result, dict):
+        return {key: _copy_result(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return [_copy_result(value) for value in result]
+    return result
+
+
+def normalize_goal(user_goal: str) -> str:
+    """Goal as a cache key: case and whitespace do not matter"""
+    return " ".join(user_goal.lower().split())
+
+
+class SemanticDeliverableCache:
+    """Cache of verified deliverables keyed by goal and query embedding
+
+    A request only matches entries with the same normalized goal: a client
+    email and an adjuster checklist about the same question are different
+    deliverables. Within a goal, queries are embedded with the retriever's
+    SentenceTransformer and matched by cosine similarity in a small FAISS
+    index. Entries expire after max_age_s, the least recently used are evicted
+    beyond max_entries, and the whole cache is dropped when the retriever's
+    index version changes.
+    """
+
+    def __init__(self, retriever, threshold: float = 0.92,
+                 max_entries: int = 256, max_age_s: float = 24 * 3600):
+        self.retriever = retriever
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age_s = max_age_s
+        self._entries: Dict[str, List[Dict]] = {}  # Normalized goal -> entries
+        self._indexes: Dict[str, object] = {}  # Normalized goal -> FAISS index of its entries
+        self._index_version = None
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'hits': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _embed(self, user_query: str) -> np.ndarray:
+        """Normalized embedding of a query"""
+        embedding = self.retriever.encode_queries([user_query.strip()])
+        norm = np.linalg.norm(embedding, axis=1, keepdims=True)
+        return embedding / np.maximum(norm, 1e-12)
+
+    def lookup(self, user_query: str, user_goal: str) -> Optional[Dict]:
+        """Return a copy of the cached result for a similar request, flagged as cached"""
+        goal = normalize_goal(user_goal)
+        embedding = self._embed(user_query)
+        with self._lock:
+            self._stats['lookups'] += 1
+            self._check_version()
+            self._expire()
+            if goal not in self._entries:
+                return None
+            scores, indices = self._indexes[goal].search(embedding, 1)
+            score, position = float(scores[0][0]), int(indices[0][0])
+            if position < 0 or score < self.threshold:
+                return None
+            entry = self._entries[goal][position]
+            entry['last_used'] = time.time()
+            self._stats['hits'] += 1
+
+        # The caller adds its own run fields, so it gets a result it may modify
+        result = _copy_result(entry['result'])
+        return {
+            **result,
+            'final_output': {**result['final_output'], 'cached': True},
+            'cached': True,
+            'cache_similarity': score,
+            'trace_log': result['trace_log'] + [
+                {'agent': 'semantic_cache', 'event': 'hit', 'message': "Served cached deliverable",
+                 'similarity': round(score, 3)}
+            ]
+        }
+
+    def store(self, user_query: str, user_goal: str, result: Dict):
+        """Cache a result if its deliverable passed verification"""
+        if not result.get('verification_result', {}).get('passed') or result.get('cached'):
+            return
+        goal = normalize_goal(user_goal)
+        embedding = self._embed(user_query)
+        # Stored as a copy: the caller goes on to add run fields to its result
+        result = _copy_result({key: value for key, value in result.items() if key not in RUN_FIELDS})
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            self._entries.setdefault(goal, []).append({
+                'embedding': embedding[0],
+                'result': result,
+                'created_at': now,
+                'last_used': now
+            })
+            self._stats['stores'] += 1
+            self._expire()
+            self._rebuild_index(goal)
+            entries = [entry for goal_entries in self._entries.values() for entry in goal_entries]
+            if len(entries) > self.max_entries:
+                entries.sort(key=lambda entry: entry['last_used'])
+                evicted = {id(entry) for entry in entries[:len(entries) - self.max_entries]}
+                for evicted_goal in list(self._entries):
+                    kept = [entry for entry in self._entries[evicted_goal] if id(entry) not in evicted]
+                    if len(kept) != len(self._entries[evicted_goal]):
+                        self._entries[evicted_goal] = kept
+                        self._rebuild_index(evicted_goal)
+                self._stats['evictions'] += len(evicted)
+
+    def _check_version(self):
+        """Drop every entry if the document index changed"""
+        version = getattr(self.retriever, 'index_version', None)
+        if version != self._index_version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries = {}
+            self._indexes = {}
+            self._index_version = version
+
+    def _expire(self):
+        """Remove entries older than max_age_s"""
+        cutoff = time.time() - self.max_age_s
+        for goal, entries in list(self._entries.items()):
+            kept = [entry for entry in entries if entry['created_at'] >= cutoff]
+            if len(kept) != len(entries):
+                self._stats['evictions'] += len(entries) - len(kept)
+                self._entries[goal] = kept
+                self._rebuild_index(goal)
+
+    def _rebuild_index(self, goal: str):
+        """Rebuild the inner-product index over a goal's entries"""
+        import faiss
+        entries = self._entries.get(goal)
+        if not entries:
+            self._entries.pop(goal, None)
+            self._indexes.pop(goal, None)
+            return
+        embeddings = np.stack([entry['embedding'] for entry in entries]).astype('float32')
+        self._indexes[goal] = faiss.IndexFlatIP(embeddings.shape[1])
+        self._indexes[goal].add(embeddings)
+
+    def clear(self):
+        """Remove all cached deliverables"""
+        with self._lock:
+            self._entries = {}
+            self._indexes = {}
+
+    def stats(self) -> Dict:
+        """Hit rate and cache counters"""
+        with self._lock:
+            lookups = self._stats['lookups']
+            return {
+                **self._stats,
+                'entries': sum(len(entries) for entries in self._entries.values()),
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0
+            }
@@ -0,0 +1,158 @@
+"""
+Stub chat model for offline load testing and evaluation
+Returns deterministic, well-formed agent outputs without calling the API
+"""
+
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from typing import List, Callable, Optional, Set
+from langchain_core.messages import AIMessage
+
+
+class StubChatModel:
+    """Drop-in replacement for ChatOpenAI.invoke with simulated latency
+
+    latency_sampler, if given, returns the seconds to sleep for each call;
+    otherwise latency_s (+/- jitter) is used. Prompt caching is simulated the
+    way providers do it: the prompt prefix is hashed in fixed-size blocks and
+    blocks already seen (process-wide, per model) are reported as cached_tokens
+    once the prompt passes the minimum cacheable length.
+    """
+
+    CACHE_BLOCK_CHARS = 512  # ~128 tokens
+    CACHE_MIN_CHARS = 4096  # ~1024 tokens
+    _prefix_blocks: Set[str] = set()
+    _prefix_lock = threading.Lock()
+
+    def __init__(self, model: str = "stub", latency_s: float = 0.0, jitter: float = 0.0,
+                 latency_sampler: Optional[Callable[[str], float]] = None):
+        self.model_name = model
+        self.latency_s = latency_s
+        self.jitter = jitter
+        self.latency_sampler = latency_sampler
+
+    def invoke(self, messages: List) -> AIMessage:
+        """Return a canned response for the agent identified by the system prompt"""
+        system_prompt = messages[-2].content if len(messages) > 1 else ""  # Agent role prompt
+        prompt = "\n".join(message.content for message in messages)
+        agent = _agent_from_prompt(system_prompt)
+
+        if self.latency_sampler is not None:
+            delay = self.latency_sampler(agent)
+        else:
+            delay = self.latency_s + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        content = _RESPONSES[agent](prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        cached_tokens = self._cached_prefix_chars(prompt) // 4
+        return AIMessage(
+            content=content,
+            response_metadata={
+                'model_name': self.model_name,
+                'token_usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                    'prompt_tokens_details': {'cached_tokens': cached_tokens}
+                }
+            }
+        )
+
+    def _cached_prefix_chars(self, prompt: str) -> int:
+        """Length of the prompt prefix a provider would serve from its cache"""
+        if len(prompt) < self.CACHE_MIN_CHARS:
+            return 0
+        prefix = hashlib.sha1(self.model_name.encode('utf-8'))  # Caches are per model
+        cached = 0
+        hit = True
+        with self._prefix_lock:
+            for end in range(self.CACHE_BLOCK_CHARS, len(prompt) + 1, self.CACHE_BLOCK_CHARS):
+                prefix.update(prompt[end - self.CACHE_BLOCK_CHARS:end].encode('utf-8'))
+                key = prefix.hexdigest()
+                if hit and key in self._prefix_blocks:
+                    cached = end
+                else:
+                    hit = False
+                    self._prefix_blocks.add(key)
+        return cached if cached >= self.CACHE_MIN_CHARS else 0
+
+
+def _agent_from_prompt(system_prompt: str) -> str:
+    """Identify the calling agent from its system prompt"""
+    prompt = system_prompt.lower()
+    if "planning agent" in prompt:
+        return "planner"
+    if "fact-checking" in prompt:
+        return "verifier"
+    if "business writer" in prompt:
+        return "writer"
+    return "generic"
+
+
+def _field(message: str, name: str) -> str:
+    """Extract a 'Name: value' line from a prompt"""
+    match = re.search(rf"^{name}:\s*(.*)$", message, re.MULTILINE)
+    return match.group(1).strip() if match else ""
+
+
+def _plan(message: str) -> str:
+    query = _field(message, "User Query") or "the request"
+    return "\n".join([
+        f"1. Identify the policy provisions relevant to: {query}",
+        f"2. Find the procedures and requirements for {query}",
+        "3. Collect limits, exclusions and deadlines that apply",
+        "4. Summarize findings with citations for the deliverable",
+    ])
+
+
+def _draft(message: str) -> str:
+    citations = re.findall(r"Source: (\[[^\]]+\])", message)
+    cite = citations[0] if citations else "Not found in sources"
+    rest = " ".join(citations[1:3])
+    return "\n".join([
+        "## Executive Summary",
+        f"The requested information is covered by the retrieved documents {cite}.",
+        "",
+        "## Client-Ready Email",
+        "Dear Client,",
+        f"Please find a summary of the relevant provisions below {cite} {rest}.",
+        "",
+        "## Action List",
+        f"- Review the applicable provisions | Owner: Claims Team | Due: 5 business days | Confidence: High {cite}",
+        "",
+        "## Sources and Citations",
+        "\n".join(f"- {citation}" for citation in citations) or "- Not found in sources",
+    ])
+
+
+def _verify(message: str) -> str:
+    return "VERIFICATION: PASS\nISSUES FOUND: 0\nDETAILS:\n- All claims are supported by the research notes"
+
+
+_RESPONSES = {
+    "planner": _plan,
+    "writer": _draft,
+    "verifier": _verify,
+    "generic": lambda message: "OK",
+}
+
+
+def stub_llm_enabled() -> bool:
+    """True when COPILOT_STUB_LLM=1 is set"""
+    return os.getenv("COPILOT_STUB_LLM", "0") == "1"
+
+
+def create_stub_from_env(model: str) -> StubChatModel:
+    """Stub model configured by COPILOT_STUB_LATENCY_MS / COPILOT_STUB_JITTER_MS"""
+    return StubChatModel(
+        model=model,
+        latency_s=float(os.getenv("COPILOT_STUB_LATENCY_MS", "0")) / 1000,
+        jitter=float(os.getenv("COPILOT_STUB_JITTER_MS", "0")) / 1000
+    )
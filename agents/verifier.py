@@ -4,34 +4,30 @@ Verifier Agent - Checks for hallucinations and unsupported claims
 
 from typing import Dict
 from .base_agent import BaseAgent
+from .routing import ModelRouter
+from .prompt_context import build_additional_notes
 from .prompts import VERIFIER_PROMPT
 
 
 class VerifierAgent(BaseAgent):
     """Agent that checks for hallucinations and unsupported claims"""
     
-    def __init__(self, api_key: str = None):
-        super().__init__("Verifier", VERIFIER_PROMPT, api_key)
+    def __init__(self, api_key: str = None, router: ModelRouter = None):
+        super().__init__("Verifier", VERIFIER_PROMPT, api_key, router)
     
     def execute(self, state: Dict) -> Dict:
         """Execute the verifier agent"""
-        trace_log = [self.log("Verifying claims against sources")]
+        trace_log = [self.log("started", "Verifying claims against sources")]
         
-        # Prepare research context for verification
-        research_context = "\n\n".join([
-            f"Source: {note['citation']}\nContent: {note['text']}"
-            for note in state['research_notes']
-        ])
-        
-        user_message = f"""Draft to Verify:
+        # Research notes go in the same prompt prefix the writer used; notes
+        # retrieved for a follow-up come after it, as they did for the writer
+        new_notes = state.get('new_research_notes') or []
+        user_message = f"""{build_additional_notes(new_notes)}Draft to Verify:
 {state['draft_output']['full_text']}
 
-Available Research Notes:
-{research_context}
-
-Verify this draft against the sources."""
+Verify this draft against the research notes above."""
         
-        verification_content = self.invoke(user_message)
+        verification_content, usage = self.invoke_with_usage(user_message, state['research_notes'])
         
         # Determine if verification passed
         verification_passed = "VERIFICATION: PASS" in verification_content
@@ -41,27 +37,37 @@ Verify this draft against the sources."""
             'report': verification_content
         }
         
-        # Prepare final output
-        final_output = {
-            'executive_summary': self._extract_section(state['draft_output']['full_text'], 'Executive Summary'),
-            'email': self._extract_section(state['draft_output']['full_text'], 'Email'),
-            'action_list': self._extract_section(state['draft_output']['full_text'], 'Action List'),
-            'sources': state['research_notes'],
-            'full_deliverable': state['draft_output']['full_text'],
-            'verification_passed': verification_passed,
-            'verification_report': verification_content
-        }
+        final_output = self.build_final_output(state, verification_result)
         
-        trace_log.append(f"Verification: {'PASSED' if verification_passed else 'FAILED'}")
-        trace_log.append(f"Sources verified: {len(state['research_notes'])}")
+        trace_log.append(self.log(
+            "verified", "Verification " + ("PASSED" if verification_passed else "FAILED"),
+            passed=verification_passed, sources=len(final_output['sources']),
+            **usage
+        ))
         
+        # Return only the keys this agent changed
         return {
-            **state,
             "verification_result": verification_result,
             "final_output": final_output,
             "trace_log": trace_log
         }
     
+    def build_final_output(self, state: Dict, verification_result: Dict) -> Dict:
+        """Final deliverable sections for a draft and its verification result"""
+        # Sources and full_deliverable reference the state, not copies
+        sources = state['research_notes']
+        if state.get('new_research_notes'):
+            sources = sources + state['new_research_notes']
+        return {
+            'executive_summary': self._extract_section(state['draft_output']['full_text'], 'Executive Summary'),
+            'email': self._extract_section(state['draft_output']['full_text'], 'Email'),
+            'action_list': self._extract_section(state['draft_output']['full_text'], 'Action List'),
+            'sources': sources,
+            'full_deliverable': state['draft_output']['full_text'],
+            'verification_passed': verification_result['passed'],
+            'verification_report': verification_result['report']
+        }
+    
     def _extract_section(self, text: str, section_name: str) -> str:
         """Helper to extract a section from the draft"""
         lines = text.split('\n')
@@ -4,37 +4,31 @@ Writer Agent - Produces final deliverable using research notes
 
 from typing import Dict
 from .base_agent import BaseAgent
+from .routing import ModelRouter
+from .prompt_context import build_additional_notes
 from .prompts import WRITER_PROMPT
 
 
 class WriterAgent(BaseAgent):
     """Agent that produces the final deliverable using research notes"""
     
-    def __init__(self, api_key: str = None):
-        super().__init__("Writer", WRITER_PROMPT, api_key)
+    def __init__(self, api_key: str = None, router: ModelRouter = None):
+        super().__init__("Writer", WRITER_PROMPT, api_key, router)
     
     def execute(self, state: Dict) -> Dict:
         """Execute the writer agent"""
-        trace_log = [self.log("Creating structured deliverable")]
-        
-        # Prepare research context
-        research_context = "\n\n".join([
-            f"Source: {note['citation']}\nContent: {note['text']}"
-            for note in state['research_notes']
-        ])
+        trace_log = [self.log("started", "Creating structured deliverable")]
         
+        # Research notes go in the shared prompt prefix; only the request varies here
         user_message = f"""User Query: {state['user_query']}
 User Goal: {state['user_goal']}
 
 Execution Plan:
 {state['plan']}
 
-Research Notes:
-{research_context}
-
-Create a complete deliverable with all required sections."""
+Create a complete deliverable with all required sections, using the research notes above."""
         
-        draft_content = self.invoke(user_message)
+        draft_content, usage = self.invoke_with_usage(user_message, state['research_notes'])
         
         # Parse the draft into sections
         draft_output = {
@@ -42,11 +36,51 @@ Create a complete deliverable with all required sections."""
             'citations_used': [note['citation'] for note in state['research_notes']]
         }
         
-        trace_log.append(f"Draft created with {len(draft_content)} characters")
-        trace_log.append(f"Citations included: {len(draft_output['citations_used'])}")
+        trace_log.append(self.log(
+            "draft_created", "Draft created",
+            characters=len(draft_content), citations=len(draft_output['citations_used']),
+            **usage
+        ))
+        
+        # Return only the keys this agent changed
+        return {
+            "draft_output": draft_output,
+            "trace_log": trace_log
+        }
+    
+    def revise(self, state: Dict, instruction: str) -> Dict:
+        """Revise the current draft for a follow-up request
+        
+        The original research notes stay in the cached prompt prefix; only the
+        draft, any newly retrieved notes and the instruction are sent after it.
+        """
+        trace_log = [self.log("started", "Revising deliverable for follow-up")]
+        new_notes = state.get('new_research_notes') or []
+        
+        user_message = f"""User Query: {state['user_query']}
+User Goal: {state['user_goal']}
+
+Current Deliverable:
+{state['draft_output']['full_text']}
+
+{build_additional_notes(new_notes)}Revision Request: {instruction}
+
+Revise the deliverable to address the revision request. Keep all required sections and citations, and use only the research notes."""
+        
+        draft_content, usage = self.invoke_with_usage(user_message, state['research_notes'])
+        
+        draft_output = {
+            'full_text': draft_content,
+            'citations_used': [note['citation'] for note in state['research_notes'] + new_notes]
+        }
+        
+        trace_log.append(self.log(
+            "draft_revised", "Draft revised",
+            characters=len(draft_content), new_citations=len(new_notes),
+            **usage
+        ))
         
         return {
-            **state,
             "draft_output": draft_output,
             "trace_log": trace_log
-        }
\ No newline at end of file
+        }
@@ -8,13 +8,14 @@ load_dotenv()
 import streamlit as st
 import sys
 import os
+import uuid
 from datetime import datetime, timedelta
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from retrieval.retriever import initialize_retriever
-from agents.copilot import create_copilot_system
+# The retriever and agents pull in torch, faiss and langchain; they are imported
+# inside load_system so the page renders before any of that loads.
 
 
 # Page config
@@ -69,24 +70,52 @@ st.markdown("""
 
 @st.cache_resource
 def load_system():
-    """Load and cache the copilot system"""
-    with st.spinner("Initializing retrieval system and loading documents..."):
-        retriever = initialize_retriever()
+    """Load and cache the copilot system
+    
+    The index loads in a background thread; searches wait for it. Document
+    changes are picked up by a hot reload (COPILOT_WATCH_DOCUMENTS=0 disables it).
+    """
+    from retrieval.retriever import initialize_retriever
+    from agents.copilot import create_copilot_system
+    
+    retriever = initialize_retriever(
+        use_reranker=os.getenv("COPILOT_RERANK", "0") == "1",
+        background=True,
+        watch=os.getenv("COPILOT_WATCH_DOCUMENTS", "1") == "1"
+    )
     with st.spinner("Building multi-agent system..."):
-        copilot = create_copilot_system(retriever)
+        copilot = create_copilot_system(
+            retriever,
+            use_semantic_cache=os.getenv("COPILOT_SEMANTIC_CACHE", "0") == "1"
+        )
     return copilot
 
 
+@st.cache_resource
+def load_scheduler():
+    """Process-wide scheduler shared by all sessions"""
+    from agents.scheduler import CopilotScheduler
+    
+    return CopilotScheduler(
+        load_system(),
+        max_workers=int(os.getenv("COPILOT_WORKERS", "4")),
+        max_queue=int(os.getenv("COPILOT_MAX_QUEUE", "100"))
+    )
+
+
 def display_trace_log(trace_log):
     """Display the agent trace log"""
     st.markdown('<div class="section-header">🔍 Agent Trace Log</div>', unsafe_allow_html=True)
     
+    from agents.base_agent import format_trace_entry
+    
     with st.expander("View detailed agent execution trace", expanded=False):
         for entry in trace_log:
-            if "===" in entry:
-                st.markdown(f"**{entry}**")
+            line = format_trace_entry(entry)
+            if "===" in line:
+                st.markdown(f"**{line}**")
             else:
-                st.text(entry)
+                st.text(line)
 
 
 def display_sources(sources):
@@ -119,6 +148,11 @@ def display_verification(verification_result):
         st.markdown('<div class="warning-box">⚠️ <strong>Verification FAILED</strong> - Some issues were found</div>', 
                    unsafe_allow_html=True)
     
+    if verification_result.get('carried_over'):
+        st.caption("Edit-only follow-up: verification carried over from the previous turn")
+    elif verification_result.get('unverified'):
+        st.caption("Follow-up found no new sources and was not verified")
+    
     with st.expander("View verification report"):
         st.text(verification_result['report'])
 
@@ -128,11 +162,6 @@ def main():
     st.markdown('<div class="main-header">🏢 Insurance Multi-Agent Copilot</div>', unsafe_allow_html=True)
     st.markdown("*Turn business requests into structured, decision-ready deliverables with AI agents*")
     
-    # Initialize system
-    copilot = load_system()
-    
-    st.success("✅ System initialized with 9 insurance documents")
-    
     # Sidebar with example queries
     with st.sidebar:
         st.header("📋 Example Queries")
@@ -169,6 +198,47 @@ def main():
         **Citations:** Automatic tracking
         """)
     
+    # Initialize system (after the static page has rendered)
+    copilot = load_system()
+    scheduler = load_scheduler()
+    
+    if copilot.retriever.is_ready:
+        st.success("✅ System initialized with 9 insurance documents")
+    else:
+        st.info("⏳ Loading document index in the background...")
+    
+    with st.sidebar:
+        timings = copilot.retriever.timings
+        if timings:
+            st.caption("Startup: " + ", ".join(f"{name} {value:.2f}s" for name, value in timings.items()))
+        metrics = scheduler.metrics()
+        st.markdown(f"""
+        **Scheduler:** {metrics['active']}/{metrics['workers']} workers busy
+        **Queue depth:** {metrics['queue_depth']}
+        **Wait time:** avg {metrics['avg_wait_s']:.1f}s, p95 {metrics['p95_wait_s']:.1f}s
+        **Requests:** {metrics['completed']} done, {metrics['coalesced']} shared
+        """)
+        if copilot.retriever.embedding_client is not None:
+            embed_stats = copilot.retriever.embedding_client.stats()
+            st.markdown(f"**Embedding service:** {'up' if embed_stats['available'] else 'down (in-process)'}, "
+                        f"p95 {embed_stats['latency_s']['p95'] * 1000:.0f}ms")
+        if copilot.semantic_cache is not None:
+            cache_stats = copilot.semantic_cache.stats()
+            st.markdown(f"**Semantic cache:** {cache_stats['hit_rate']:.0%} hit rate, "
+                        f"{cache_stats['entries']} entries")
+        if copilot.router is not None:
+            routing_stats = copilot.router.stats()
+            st.markdown("**Model routing:** " + ", ".join(
+                f"{tier} {count}" for tier, count in routing_stats['by_tier'].items()
+            ) + f"; {routing_stats['load_downgrades'] + routing_stats['slo_downgrades']} downgrades, "
+                f"${routing_stats['cost_usd']:.4f} est.")
+        if copilot.retriever.is_ready:
+            st.markdown(f"**Index generation:** {copilot.retriever.generation} "
+                        f"({len(copilot.retriever.chunks)} chunks)")
+            if st.button("🔄 Reload documents"):
+                copilot.retriever.reload()
+                st.info("Rebuilding the index in the background; searches keep using the current one")
+    
     # Main input form
     st.markdown('<div class="section-header">📝 Submit Your Request</div>', unsafe_allow_html=True)
     
@@ -197,14 +267,22 @@ def main():
         # Run the multi-agent system
         with st.spinner("🤖 Multi-agent system working..."):
             try:
-                result = copilot.run(user_query, user_goal)
+                result = scheduler.run(user_query, user_goal)
+                
+                # A new request starts a new conversation for follow-ups
+                st.session_state['conversation_id'] = uuid.uuid4().hex
+                copilot.start_conversation(st.session_state['conversation_id'], user_query, user_goal, result)
                 
                 # Store in session state
                 st.session_state['result'] = result
                 st.session_state['query'] = user_query
                 st.session_state['goal'] = user_goal
+                st.session_state['follow_ups'] = []
                 
-                st.success("✅ Deliverable generated successfully!")
+                if result.get('cached'):
+                    st.success("✅ Deliverable served from cache (similar request answered earlier)")
+                else:
+                    st.success("✅ Deliverable generated successfully!")
                 
             except Exception as e:
                 st.error(f"Error: {str(e)}")
@@ -263,6 +341,36 @@ def main():
         with tab5:
             display_sources(final_output['sources'])
         
+        # Follow-ups revise this deliverable instead of re-running the workflow
+        st.markdown("---")
+        st.markdown('<div class="section-header">💬 Follow-up</div>', unsafe_allow_html=True)
+        for turn in st.session_state.get('follow_ups', []):
+            st.caption(f"↳ {turn['message']} ({turn['kind']}, {turn['new_chunks']} new chunks)")
+        follow_up = st.text_input(
+            "Refine the deliverable",
+            placeholder="e.g., Make the email shorter, or: What about commercial auto?",
+            key=f"follow_up_{len(st.session_state.get('follow_ups', []))}"
+        )
+        if st.button("↩️ Send Follow-up") and follow_up:
+            from agents.conversation import ConversationNotFound
+            
+            with st.spinner("🤖 Revising deliverable..."):
+                try:
+                    conversation_id = st.session_state['conversation_id']
+                    result = scheduler.submit_call(
+                        None, lambda: copilot.follow_up(conversation_id, follow_up)
+                    ).result()
+                except ConversationNotFound:
+                    st.warning("This conversation has expired; please generate the deliverable again.")
+                    return
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
+                    st.exception(e)
+                    return
+            st.session_state['result'] = result
+            st.session_state.setdefault('follow_ups', []).append(result['follow_up'])
+            st.rerun()
+        
         # Trace log at the bottom
         st.markdown("---")
         display_trace_log(result['trace_log'])
@@ -0,0 +1,283 @@
+"""
+Synthetic-corpus retrieval benchmark for DocumentRetriever
+Generates insurance-style documents at 10k-1M chunks and measures ingestion,
+embedding, index build, on-disk size, load time, memory, query latency and recall
+
+Run:  python eval/benchmark_retrieval.py --chunks 10000 100000 --backends flat hnsw ivf
+      python eval/benchmark_retrieval.py --chunks 10000 --compare eval/benchmarks/baseline.json
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+import numpy as np
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from retrieval.retriever import DocumentRetriever, INDEX_BACKENDS
+
+
+LINES_OF_BUSINESS = ["auto", "homeowners", "life", "commercial property", "umbrella", "renters"]
+TOPICS = [
+    "coverage limits", "deductibles", "exclusions", "premium factors", "claims reporting",
+    "fraud indicators", "underwriting eligibility", "subrogation", "prompt payment rules",
+    "policy conversion", "risk mitigation", "customer response times", "total loss settlement",
+]
+TERMS = [
+    "policyholder", "insured", "adjuster", "endorsement", "declarations page", "liability",
+    "bodily injury", "property damage", "actual cash value", "replacement cost", "peril",
+    "proof of loss", "reservation of rights", "underwriter", "loss ratio", "rider", "beneficiary",
+    "premium", "deductible", "claimant", "appraisal", "salvage", "first notice of loss",
+]
+PARAGRAPHS_PER_DOCUMENT = 60
+QUERY_TEMPLATES = [
+    "What are the {topic} for {lob} insurance?",
+    "How does the {term} affect {topic} in a {lob} policy?",
+    "Explain {topic} and the role of the {term}",
+]
+
+
+def synthetic_paragraph(rng: random.Random, lob: str) -> str:
+    """One insurance-style paragraph of ~40-70 words"""
+    topic = rng.choice(TOPICS)
+    sentences = [f"{topic.upper()} - {lob.title()} Insurance"]
+    for _ in range(rng.randint(3, 5)):
+        a, b = rng.sample(TERMS, 2)
+        sentences.append(
+            f"The {a} must document {topic} within {rng.randint(5, 60)} days, "
+            f"and the {b} reviews amounts up to ${rng.randint(1, 500) * 1000:,}."
+        )
+    return " ".join(sentences)
+
+
+def generate_corpus(directory: str, target_chunks: int, seed: int = 7) -> int:
+    """Write synthetic documents until roughly target_chunks chunks exist"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    probe = DocumentRetriever(documents_dir=directory)
+    sample = "\n\n".join(synthetic_paragraph(rng, "auto") for _ in range(PARAGRAPHS_PER_DOCUMENT))
+    chunks_per_document = max(1, len(probe.chunk_document("sample.txt", sample)))
+    num_documents = max(1, -(-target_chunks // chunks_per_document))
+
+    for i in range(num_documents):
+        lob = LINES_OF_BUSINESS[i % len(LINES_OF_BUSINESS)]
+        content = "\n\n".join(synthetic_paragraph(rng, lob) for _ in range(PARAGRAPHS_PER_DOCUMENT))
+        with open(os.path.join(directory, f"{lob.replace(' ', '_')}_{i:06d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(content)
+    return num_documents
+
+
+def synthetic_queries(count: int, seed: int = 11):
+    """Benchmark queries drawn from the same vocabulary as the corpus"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUERY_TEMPLATES).format(
+            topic=rng.choice(TOPICS), lob=rng.choice(LINES_OF_BUSINESS), term=rng.choice(TERMS)
+        )
+        for _ in range(count)
+    ]
+
+
+class HashingEncoder:
+    """Fast deterministic bag-of-words encoder for index-scale runs
+
+    Lets the 1M-chunk runs measure the index and chunk store without spending
+    hours in MiniLM; embedding throughput is then not representative.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def encode(self, texts, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                bucket = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=4).digest(), 'little')
+                vectors[row, bucket % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_single(corpus_dir: str, work_dir: str, backend: str, encoder: str,
+               num_queries: int, k: int) -> dict:
+    """Build, reload and query one (corpus, backend) configuration"""
+    import faiss
+    index_path = os.path.join(work_dir, f"index_{backend}.pkl")
+
+    retriever = DocumentRetriever(documents_dir=corpus_dir, index_path=index_path,
+                                  index_backend=backend, dedup=False)
+    if encoder == 'hashing':
+        retriever._model = HashingEncoder()
+    retriever.build_index(force_rebuild=True)
+    num_chunks = len(retriever.chunks)
+    build = dict(retriever.timings)
+    exact = faiss.IndexFlatL2(retriever.embeddings.shape[1])
+    exact.add(np.asarray(retriever.embeddings, dtype='float32'))
+    del retriever
+
+    # Reload from disk as a serving process would
+    rss_before_load = resident_memory_mb()
+    start = time.perf_counter()
+    retriever = DocumentRetriever(documents_dir=corpus_dir, index_path=index_path,
+                                  index_backend=backend, dedup=False)
+    if encoder == 'hashing':
+        retriever._model = HashingEncoder()
+    retriever.build_index()
+    load_s = time.perf_counter() - start
+
+    queries = synthetic_queries(num_queries)
+    retriever.search(queries[0], k=k, mmr=False)  # Warm up (model load, thread pools)
+    latencies = []
+    recalls = []
+    for query in queries:
+        query_start = time.perf_counter()
+        results = retriever.search(query, k=k, mmr=False)  # Recall is measured against exact search
+        latencies.append(time.perf_counter() - query_start)
+
+        found = {(r['document'], r['chunk_id']) for r in results}
+        _, truth = exact.search(retriever.encode_queries([query]), k)
+        expected = {(retriever.chunks[i].document_name, retriever.chunks[i].chunk_id) for i in truth[0] if i >= 0}
+        recalls.append(len(found & expected) / max(1, len(expected)))
+
+    return {
+        'backend': backend,
+        'chunks': num_chunks,
+        'ingest_s': build.get('ingest_s'),
+        'ingest_chunks_per_s': num_chunks / build['ingest_s'] if build.get('ingest_s') else None,
+        'embedding_s': build.get('embedding_s'),
+        'embedding_chunks_per_s': num_chunks / build['embedding_s'] if build.get('embedding_s') else None,
+        'index_build_s': build.get('index_build_s'),
+        'save_s': build.get('save_s'),
+        'disk_mb': os.path.getsize(index_path) / 1e6,
+        'load_s': load_s,
+        'rss_mb': resident_memory_mb(),
+        'index_rss_mb': resident_memory_mb() - rss_before_load,
+        'query_p50_ms': percentile(latencies, 0.50) * 1000,
+        'query_p99_ms': percentile(latencies, 0.99) * 1000,
+        f'recall_at_{k}': sum(recalls) / len(recalls),
+    }
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics that regressed by more than tolerance versus the baseline"""
+    lower_is_better = ['index_build_s', 'load_s', 'disk_mb', 'rss_mb', 'query_p50_ms', 'query_p99_ms']
+    regressions = []
+    baseline_runs = {(r['backend'], r['target_chunks']): r for r in baseline['runs']}
+    for run in current['runs']:
+        previous = baseline_runs.get((run['backend'], run['target_chunks']))
+        if previous is None:
+            continue
+        for metric in lower_is_better:
+            old, new = previous.get(metric), run.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append(f"{run['backend']}@{run['target_chunks']}: {metric} {old:.3f} -> {new:.3f}")
+        for metric in [key for key in run if key.startswith('recall_at_')]:
+            old, new = previous.get(metric), run.get(metric)
+            if old is not None and new is not None and new < old - tolerance / 10:
+                regressions.append(f"{run['backend']}@{run['target_chunks']}: {metric} {old:.3f} -> {new:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval benchmark on a synthetic corpus")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000])
+    parser.add_argument("--backends", nargs="+", default=list(INDEX_BACKENDS), choices=INDEX_BACKENDS)
+    parser.add_argument("--encoder", default="minilm", choices=["minilm", "hashing"],
+                        help="hashing skips MiniLM for fast index-scale runs")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--work-dir", default="/tmp/copilot_retrieval_bench")
+    parser.add_argument("--output", default=None, help="JSON report path")
+    parser.add_argument("--compare", default=None, help="Baseline JSON report to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--single", nargs=3, metavar=("CORPUS", "BACKEND", "TARGET"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process: one configuration, isolated memory
+        corpus_dir, backend, target = args.single
+        result = run_single(corpus_dir, os.path.dirname(corpus_dir), backend, args.encoder, args.queries, args.k)
+        result['target_chunks'] = int(target)
+        print("BENCHMARK_RESULT " + json.dumps(result))
+        return
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'host': {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'encoder': args.encoder,
+        'queries': args.queries,
+        'k': args.k,
+        'runs': [],
+    }
+
+    for target in args.chunks:
+        corpus_dir = os.path.join(args.work_dir, f"corpus_{target}", "documents")
+        if not os.path.isdir(corpus_dir):
+            print(f"Generating synthetic corpus for ~{target:,} chunks...")
+            generate_corpus(corpus_dir, target)
+        for backend in args.backends:
+            print(f"Benchmarking {backend} at ~{target:,} chunks...")
+            output = subprocess.run(
+                [sys.executable, __file__, "--single", corpus_dir, backend, str(target),
+                 "--encoder", args.encoder, "--queries", str(args.queries), "--k", str(args.k)],
+                capture_output=True, text=True, cwd=ROOT
+            )
+            lines = [line for line in output.stdout.splitlines() if line.startswith("BENCHMARK_RESULT ")]
+            if output.returncode != 0 or not lines:
+                print(output.stderr[-2000:])
+                report['runs'].append({'backend': backend, 'target_chunks': target, 'error': output.returncode})
+                continue
+            result = json.loads(lines[-1][len("BENCHMARK_RESULT "):])
+            report['runs'].append(result)
+            print(f"  build {result['index_build_s']:.2f}s, load {result['load_s']:.2f}s, "
+                  f"p50 {result['query_p50_ms']:.2f}ms, p99 {result['query_p99_ms']:.2f}ms, "
+                  f"recall@{args.k} {result[f'recall_at_{args.k}']:.3f}")
+
+    output_path = args.output or os.path.join(
+        ROOT, "eval", "benchmarks", f"retrieval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report saved to {output_path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_reports(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions versus baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\n✅ No regressions versus baseline")
+
+
+if __name__ == "__main__":
+    main()
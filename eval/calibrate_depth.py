@@ -0,0 +1,84 @@
+"""
+Calibrate the adaptive-depth relevance floor against the real encoder
+Searches the evaluation queries and a few questions the corpus does not cover,
+and reports the vector relevance_score of the best hit from an expected
+document versus the best hit for an off-corpus question. The recommended
+min_relevance keeps at least one expected hit for every evaluation query and,
+where the two are separable, drops every off-corpus hit.
+
+Run:  python eval/calibrate_depth.py
+      COPILOT_MIN_RELEVANCE=<recommended> python eval/run_evaluation.py
+"""
+
+import sys
+import os
+import math
+import argparse
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from retrieval.retriever import initialize_retriever
+from run_evaluation import TEST_CASES
+
+
+# Questions with no answer in data/documents
+OFF_CORPUS_QUERIES = [
+    "What is the boiling point of mercury?",
+    "How do I reset my router password?",
+    "Which pet insurance plans cover exotic birds?",
+    "What are the rules for marine cargo insurance on container ships?",
+    "Summarize the plot of Moby Dick",
+]
+
+
+def best_scores(retriever, query: str, k: int, documents=None):
+    """(best relevance_score overall, best from documents) in vector order"""
+    results = retriever.search(query, k=k, rerank=False, mmr=False)
+    scores = [result['relevance_score'] for result in results]
+    expected = [result['relevance_score'] for result in results
+                if documents and result['document'] in documents]
+    return max(scores, default=0.0), max(expected, default=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend AdaptiveDepthPolicy.min_relevance")
+    parser.add_argument("--k", type=int, default=20, help="Hits inspected per query")
+    parser.add_argument("--margin", type=float, default=0.01,
+                        help="Floor sits this far below the weakest expected hit")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    retriever = initialize_retriever()
+
+    print(f"\n{'Query':<45} {'Best':>6} {'Expected':>9}")
+    covered = []
+    for test in TEST_CASES:
+        best, expected = best_scores(retriever, test['query'], args.k, test['expected_docs'])
+        covered.append(expected if expected is not None else best)
+        print(f"{test['name'][:45]:<45} {best:>6.3f} {expected if expected is not None else float('nan'):>9.3f}")
+
+    off_corpus = []
+    for query in OFF_CORPUS_QUERIES:
+        best, _ = best_scores(retriever, query, args.k)
+        off_corpus.append(best)
+        print(f"{query[:45]:<45} {best:>6.3f} {'-':>9}")
+
+    weakest = min(covered)
+    strongest_off = max(off_corpus)
+    ceiling = math.floor((weakest - args.margin) * 100) / 100
+    print(f"\nWeakest expected hit: {weakest:.3f}   strongest off-corpus hit: {strongest_off:.3f}")
+    if strongest_off < ceiling:
+        floor = math.floor((strongest_off + ceiling) / 2 * 100) / 100
+        print(f"Recommended min_relevance: {floor:.2f} (midway between the two)")
+    else:
+        floor = ceiling
+        print(f"Recommended min_relevance: {floor:.2f}; off-corpus questions still retrieve notes at "
+              f"this floor, so the verifier has to catch them")
+    print(f"Use COPILOT_MIN_RELEVANCE={floor:.2f} "
+          f"(cosine similarity {1.5 - 1 / (2 * floor):.2f} for unit vectors)")
+
+
+if __name__ == "__main__":
+    main()
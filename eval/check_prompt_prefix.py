@@ -0,0 +1,74 @@
+"""
+Prompt prefix stability check
+Runs the workflow against the stub LLM (which simulates provider prompt caching)
+and reports how much of the writer and verifier prompts share a cacheable prefix.
+"""
+
+import sys
+import os
+import argparse
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ["COPILOT_STUB_LLM"] = "1"
+
+from retrieval.retriever import initialize_retriever
+from agents.copilot import create_copilot_system
+from agents.prompt_context import build_messages
+from agents.prompts import WRITER_PROMPT, VERIFIER_PROMPT
+from run_evaluation import TEST_CASES
+
+
+def shared_prefix_chars(a: str, b: str) -> int:
+    """Length of the common prefix of two strings"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def usage_by_agent(result: dict) -> dict:
+    """Token usage from the trace records that carry it"""
+    return {
+        entry['agent']: entry for entry in result['trace_log']
+        if isinstance(entry, dict) and 'prompt_tokens' in entry
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check prompt prefix reuse across agents and runs")
+    parser.add_argument("--repeats", type=int, default=2, help="Runs per test case")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    retriever = initialize_retriever()
+    copilot = create_copilot_system(retriever)
+
+    print(f"{'Case':<40} {'Run':>3} {'Agent':<9} {'Prompt':>7} {'Cached':>7} {'Hit %':>6} {'Shared':>7}")
+    totals = {'prompt_tokens': 0, 'cached_tokens': 0}
+    for test in TEST_CASES:
+        for repeat in range(args.repeats):
+            result = copilot.run(test['query'], test['goal'], profile=False)
+
+            # Prefix shared by the writer and verifier prompts of this run
+            notes = result['research_notes']
+            writer = "\n".join(m.content for m in build_messages(WRITER_PROMPT, "", notes))
+            verifier = "\n".join(m.content for m in build_messages(VERIFIER_PROMPT, "", notes))
+            shared = shared_prefix_chars(writer, verifier) // 4
+
+            for agent, usage in usage_by_agent(result).items():
+                prompt_tokens, cached_tokens = usage['prompt_tokens'], usage['cached_tokens']
+                totals['prompt_tokens'] += prompt_tokens
+                totals['cached_tokens'] += cached_tokens
+                hit = cached_tokens / prompt_tokens * 100 if prompt_tokens else 0.0
+                print(f"{test['name'][:40]:<40} {repeat + 1:>3} {agent:<9} {prompt_tokens:>7} "
+                      f"{cached_tokens:>7} {hit:>5.0f}% {shared if agent != 'planner' else '':>7}")
+
+    overall = totals['cached_tokens'] / totals['prompt_tokens'] * 100 if totals['prompt_tokens'] else 0.0
+    print(f"\nCached prompt tokens: {totals['cached_tokens']} of {totals['prompt_tokens']} ({overall:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Closed-loop load test for the copilot HTTP API
+Start the server with COPILOT_STUB_LLM=1 to load-test without OpenAI calls
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import urllib.request
+import urllib.error
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from run_evaluation import TEST_CASES
+
+
+def post(url: str, payload: dict, timeout: float) -> int:
+    """POST JSON and return the HTTP status, or 0 when no response arrived"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, socket.timeout, ConnectionError):
+        return 0  # Refused, reset or timed out; counted under status 0
+
+
+def run_load_test(base_url: str, endpoint: str, concurrency: int,
+                  total_requests: int, timeout: float) -> dict:
+    """Send total_requests from `concurrency` client threads"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            test = TEST_CASES[i % len(TEST_CASES)]
+            if endpoint == 'search':
+                payload = {'query': test['query'], 'k': 3}
+            else:
+                payload = {'query': test['query'], 'goal': test['goal']}
+            start = time.perf_counter()
+            status = post(f"{base_url}/v1/{endpoint}", payload, timeout)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(round(q * (len(latencies) - 1))))]
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'duration_s': duration,
+        'throughput_rps': total_requests / duration if duration else 0.0,
+        'p50_s': pick(0.50),
+        'p95_s': pick(0.95),
+        'p99_s': pick(0.99),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the copilot HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="run", choices=["run", "search"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    report = run_load_test(args.url, args.endpoint, args.concurrency, args.requests, args.timeout)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
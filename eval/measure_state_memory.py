@@ -0,0 +1,103 @@
+"""
+Memory held per completed copilot run
+Compares the current workflow with the workflow of an earlier commit (by
+default the repository's first commit), each run from its own source tree
+against the same stub LLM, so no API key is needed. The earlier tree is
+exported with git archive and measured in a subprocess.
+"""
+
+import sys
+import os
+import gc
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+import tracemalloc
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["COPILOT_STUB_LLM"] = "1"
+
+
+def measure(run, test_cases, runs: int) -> float:
+    """Bytes retained per completed run while keeping every result alive"""
+    kept = []
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(runs):
+        test = test_cases[i % len(test_cases)]
+        kept.append(run(test['query'], test['goal']))
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return retained / runs
+
+
+def measure_tree(tree: str, runs: int) -> float:
+    """Per-run retention of the copilot in a source tree, with the stub LLM patched in"""
+    # Load the stub by path: the tree has its own agents package
+    spec = importlib.util.spec_from_file_location("copilot_stub_llm", os.path.join(ROOT, "agents", "stub_llm.py"))
+    stub_llm = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(stub_llm)
+    import langchain_openai
+    langchain_openai.ChatOpenAI = lambda model="stub", **kwargs: stub_llm.StubChatModel(model)
+
+    sys.path.insert(0, tree)
+    os.chdir(tree)
+    # Imported after the tree is on the path, since run_evaluation imports the copilot
+    from run_evaluation import TEST_CASES
+    from retrieval.retriever import initialize_retriever
+    from agents.copilot import create_copilot_system
+    copilot = create_copilot_system(initialize_retriever())
+
+    def run(user_query: str, user_goal: str):
+        if 'profile' in copilot.run.__code__.co_varnames:
+            return copilot.run(user_query, user_goal, profile=False)
+        return copilot.run(user_query, user_goal)
+
+    run(TEST_CASES[0]['query'], TEST_CASES[0]['goal'])  # Warm up
+    return measure(run, TEST_CASES, runs)
+
+
+def export_tree(ref: str, directory: str):
+    """Write the code and documents of a commit to directory"""
+    archive = subprocess.run(["git", "-C", ROOT, "archive", ref, "agents", "retrieval", "data/documents"],
+                             check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+
+
+def root_commit() -> str:
+    """First commit of the repository"""
+    return subprocess.run(["git", "-C", ROOT, "rev-list", "--max-parents=0", "HEAD"],
+                          check=True, capture_output=True, text=True).stdout.split()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory retained per completed run")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--baseline", default=None, help="Commit to compare with (default: first commit)")
+    parser.add_argument("--tree", help=argparse.SUPPRESS)  # Measure one tree and print the result
+    args = parser.parse_args()
+
+    if args.tree:
+        print(f"RETAINED_BYTES {measure_tree(args.tree, args.runs)}")
+        return
+
+    baseline = args.baseline or root_commit()
+    with tempfile.TemporaryDirectory(prefix="state-memory-") as directory:
+        export_tree(baseline, directory)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--tree", directory,
+                                 "--runs", str(args.runs)], check=True, capture_output=True, text=True).stdout
+        previous = float(output.rsplit("RETAINED_BYTES", 1)[1])
+    current = measure_tree(ROOT, args.runs)
+
+    print(f"Baseline ({baseline[:7]}): {previous / 1024:.1f} KiB per completed run")
+    print(f"Current:          {current / 1024:.1f} KiB per completed run")
+    print(f"Change:           {(current / previous - 1) * 100:+.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup profiling for the app and eval entry points
+Measures import times, index load time, model load time and first-query latency
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Modules imported by the entry points, measured in a fresh interpreter each
+MODULES = [
+    "retrieval.retriever",
+    "agents.copilot",
+    "sentence_transformers",
+    "faiss",
+    "langgraph.graph",
+    "langchain_openai",
+]
+
+
+def measure_import(module: str) -> float:
+    """Import time of a module in a fresh interpreter (seconds)"""
+    code = (
+        "import sys, time; sys.path.insert(0, %r); "
+        "start = time.perf_counter(); import %s; print(time.perf_counter() - start)"
+    ) % (ROOT, module)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if output.returncode != 0:
+        return float("nan")
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def profile_startup(query: str) -> dict:
+    """Profile retriever startup and the first two queries in this process"""
+    report = {"imports_s": {module: measure_import(module) for module in MODULES}}
+    
+    start = time.perf_counter()
+    from retrieval.retriever import initialize_retriever
+    retriever = initialize_retriever(background=True)
+    report["initialize_returned_s"] = time.perf_counter() - start
+    
+    retriever.wait_until_ready()
+    report["index_ready_s"] = time.perf_counter() - start
+    
+    query_start = time.perf_counter()
+    retriever.search(query, k=3)
+    report["first_query_s"] = time.perf_counter() - query_start
+    
+    query_start = time.perf_counter()
+    retriever.search(query, k=3)
+    report["second_query_s"] = time.perf_counter() - query_start
+    
+    report["retriever_timings_s"] = dict(retriever.timings)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile copilot startup")
+    parser.add_argument("--query", default="What are the steps for filing an auto insurance claim?")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    
+    os.chdir(ROOT)
+    report = profile_startup(args.query)
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    
+    print("="*60)
+    print("STARTUP PROFILE")
+    print("="*60)
+    for module, seconds in report["imports_s"].items():
+        print(f"import {module:<28} {seconds:.3f}s")
+    print("-"*60)
+    print(f"initialize_retriever returned      {report['initialize_returned_s']:.3f}s")
+    print(f"Index ready                        {report['index_ready_s']:.3f}s")
+    print(f"First query (incl. model load)     {report['first_query_s']:.3f}s")
+    print(f"Second query                       {report['second_query_s']:.3f}s")
+    for name, seconds in report["retriever_timings_s"].items():
+        print(f"  {name:<32} {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Open-loop load replay for capacity planning
+Drives InsuranceCopilotSystem through CopilotScheduler at a target QPS with the
+stub LLM, sampling each agent's LLM latency from a recorded query log
+(COPILOT_QUERY_LOG) or a lognormal default. Requests arrive on schedule whether
+or not earlier ones have finished, so queueing delay shows up as it would in
+production. Reports throughput, queueing delay and tail latency per worker count.
+
+Example:
+    python eval/replay_load.py --log logs/queries.jsonl --qps 2 --duration 60 --workers 2 4 8
+"""
+
+import sys
+import os
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ["COPILOT_STUB_LLM"] = "1"
+os.environ.pop("COPILOT_QUERY_LOG", None)  # Replayed runs are not production traffic
+
+from retrieval.retriever import initialize_retriever
+from agents.copilot import create_copilot_system
+from agents.scheduler import CopilotScheduler, SchedulerFull
+from agents.stub_llm import StubChatModel
+from observability.query_log import read_query_log, arrival_time
+from run_evaluation import TEST_CASES
+
+
+# Median seconds and lognormal sigma per agent when no query log is given
+DEFAULT_LATENCY = {
+    'planner': (1.5, 0.35),
+    'writer': (6.0, 0.40),
+    'verifier': (2.5, 0.35),
+}
+
+
+def load_log(path: Optional[str]) -> Tuple[List[Tuple[str, str]], Dict[str, List[float]], List[float]]:
+    """Requests, per-agent LLM latency samples and arrival timestamps from a query log"""
+    requests, latencies, timestamps = [], {}, []
+    if path:
+        for record in read_query_log(path):
+            if record.get('error') or record.get('cached'):
+                continue
+            # Follow-ups only make sense after their conversation's first request
+            if record.get('query') and record.get('goal') and not record.get('follow_up'):
+                requests.append((record['query'], record['goal']))
+            for agent, stats in (record.get('agents') or {}).items():
+                latencies.setdefault(agent, []).append(stats['latency_s'])
+            timestamps.append(arrival_time(record))
+    return requests, latencies, sorted(timestamps)
+
+
+def make_latency_sampler(samples: Dict[str, List[float]], time_scale: float, seed: int):
+    """Sampler for StubChatModel: recorded latencies if any, else DEFAULT_LATENCY"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def sample(agent: str) -> float:
+        with lock:
+            if samples.get(agent):
+                return rng.choice(samples[agent]) * time_scale
+            median, sigma = DEFAULT_LATENCY.get(agent, (0.5, 0.3))
+            return rng.lognormvariate(math.log(median), sigma) * time_scale
+    return sample
+
+
+def arrival_gaps(qps: float, duration: float, recorded: List[float], seed: int) -> List[float]:
+    """Inter-arrival gaps: Poisson at qps, or recorded gaps rescaled to qps"""
+    rng = random.Random(seed)
+    recorded_gaps = [b - a for a, b in zip(recorded, recorded[1:]) if b > a]
+    scale = 1.0
+    if recorded_gaps:
+        scale = (1.0 / qps) / (sum(recorded_gaps) / len(recorded_gaps))
+    gaps, elapsed, i = [], 0.0, 0
+    while True:
+        gap = recorded_gaps[i % len(recorded_gaps)] * scale if recorded_gaps else rng.expovariate(qps)
+        elapsed += gap
+        if elapsed > duration:
+            return gaps
+        gaps.append(gap)
+        i += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def replay(copilot, requests: List[Tuple[str, str]], gaps: List[float], workers: int,
+           max_queue: int, coalesce: bool, timeout: float, slo_s: Optional[float] = None) -> Dict:
+    """Submit requests on the arrival schedule and collect per-request timings
+
+    With slo_s, the report also has the fraction of offered requests completed within it.
+    """
+    scheduler = CopilotScheduler(copilot, max_workers=workers, max_queue=max_queue)
+    records = []
+    rejected = 0
+    start = time.perf_counter()
+    next_arrival = start
+
+    for i, gap in enumerate(gaps):
+        next_arrival += gap
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        user_query, user_goal = requests[i % len(requests)]
+
+        def call(user_query=user_query, user_goal=user_goal):
+            return copilot.run(user_query, user_goal, profile=False)
+
+        key = ('run', user_query.strip(), user_goal.strip()) if coalesce else None
+        record = {'arrival': time.perf_counter()}
+        try:
+            future = scheduler.submit_call(key, call)
+        except SchedulerFull:
+            rejected += 1
+            continue
+        record['future'] = future
+        future.add_done_callback(lambda _, record=record: record.setdefault('end', time.perf_counter()))
+        records.append(record)
+
+    failed = 0
+    for record in records:
+        try:
+            record['future'].result(timeout)
+        except Exception:
+            failed += 1
+    scheduler.shutdown()
+
+    done = [record for record in records if 'end' in record and not record['future'].exception()]
+    latencies = [record['end'] - record['arrival'] for record in done]
+    # The scheduler stamps started_at on every caller's future, coalesced or not
+    waits = [max(0.0, getattr(record['future'], 'started_at', record['arrival']) - record['arrival'])
+             for record in done]
+    elapsed = (max(record['end'] for record in done) - start) if done else 0.0
+    report = {
+        'workers': workers,
+        'offered': len(gaps),
+        'completed': len(done),
+        'failed': failed,
+        'rejected': rejected,
+        'offered_qps': len(gaps) / max(sum(gaps), 1e-9),
+        'throughput_qps': len(done) / elapsed if elapsed else 0.0,
+        'queue_p50_s': percentile(waits, 0.50),
+        'queue_p95_s': percentile(waits, 0.95),
+        'queue_max_s': max(waits, default=0.0),
+        'latency_p50_s': percentile(latencies, 0.50),
+        'latency_p95_s': percentile(latencies, 0.95),
+        'latency_p99_s': percentile(latencies, 0.99),
+        'latency_max_s': max(latencies, default=0.0),
+    }
+    if slo_s is not None:
+        report['slo_attainment'] = sum(latency <= slo_s for latency in latencies) / max(len(gaps), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load replay against the stub LLM")
+    parser.add_argument("--log", default=os.getenv("COPILOT_QUERY_LOG"),
+                        help="Query log for requests and LLM latencies (default: TEST_CASES, lognormal latency)")
+    parser.add_argument("--qps", type=float, default=1.0, help="Target arrival rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals per run")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Scheduler worker counts to compare")
+    parser.add_argument("--max-queue", type=int, default=100)
+    parser.add_argument("--arrivals", choices=['poisson', 'recorded'], default='poisson',
+                        help="Poisson arrivals, or the log's inter-arrival gaps rescaled to --qps")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Multiply LLM latencies (e.g. 0.1 for a quick run)")
+    parser.add_argument("--coalesce", action="store_true", help="Share identical in-flight requests")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    logged_requests, samples, timestamps = load_log(args.log)
+    requests = logged_requests or [(test['query'], test['goal']) for test in TEST_CASES]
+    print(f"{len(requests)} request(s); LLM latency from "
+          f"{'recorded samples' if samples else 'lognormal defaults'} x{args.time_scale}")
+
+    os.chdir(ROOT)
+    retriever = initialize_retriever()
+    copilot = create_copilot_system(retriever)
+    sampler = make_latency_sampler(samples, args.time_scale, args.seed)
+    for agent in (copilot.planner, copilot.writer, copilot.verifier):
+        agent.llm = StubChatModel(agent.llm.model_name, latency_sampler=sampler)
+        for tier in (copilot.router.tiers if copilot.router is not None else []):
+            agent.register_llm(StubChatModel(tier.model, latency_sampler=sampler))
+    copilot.run(*requests[0], profile=False)  # Warm up (encoder, thread pools)
+
+    gaps = arrival_gaps(args.qps, args.duration, timestamps if args.arrivals == 'recorded' else [], args.seed)
+    reports = []
+    print(f"\n{'Workers':>7} {'Offered':>8} {'Done':>5} {'Rej':>4} {'Thru/s':>7} "
+          f"{'Queue p50':>10} {'Queue p95':>10} {'Lat p50':>8} {'Lat p95':>8} {'Lat p99':>8}")
+    for workers in args.workers:
+        report = replay(copilot, requests, gaps, workers, args.max_queue, args.coalesce, args.timeout)
+        reports.append(report)
+        print(f"{workers:>7} {report['offered_qps']:>7.2f}/s {report['completed']:>5} {report['rejected']:>4} "
+              f"{report['throughput_qps']:>7.2f} {report['queue_p50_s']:>9.2f}s {report['queue_p95_s']:>9.2f}s "
+              f"{report['latency_p50_s']:>7.2f}s {report['latency_p95_s']:>7.2f}s {report['latency_p99_s']:>7.2f}s")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'runs': reports}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
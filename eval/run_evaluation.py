@@ -125,6 +125,9 @@ def run_evaluation():
             verification_passed = result['verification_result']['passed']
             num_sources = len(result['final_output']['sources'])
             docs_used = set(s['document'] for s in result['final_output']['sources'])
+            # Vector score of the best note, to compare with the depth policy's floor
+            top_relevance = max((s['relevance'] for s in result['final_output']['sources']), default=0.0)
+            expected_found = sorted(set(test['expected_docs'] or []) & docs_used)
             
             # Determine pass/fail
             test_passed = verification_passed and num_sources > 0
@@ -143,6 +146,8 @@ def run_evaluation():
                 'verification': "PASSED" if verification_passed else "FAILED",
                 'sources': num_sources,
                 'documents': docs_used,
+                'expected': f"{len(expected_found)}/{len(test['expected_docs'] or [])}",
+                'top_relevance': top_relevance,
                 'duration': duration
             })
             
@@ -151,6 +156,8 @@ def run_evaluation():
             print(f"Verification: {'PASSED' if verification_passed else 'FAILED'}")
             print(f"Sources Retrieved: {num_sources}")
             print(f"Documents Used: {', '.join(docs_used)}")
+            print(f"Expected Documents Found: {results[-1]['expected']}")
+            print(f"Top Relevance: {top_relevance:.3f}")
             print(f"Duration: {duration:.2f}s")
             
         except Exception as e:
@@ -200,6 +207,8 @@ def save_results(results, passed, failed):
                 f.write(f"- **Verification:** {result['verification']}\n")
                 f.write(f"- **Sources Retrieved:** {result['sources']}\n")
                 f.write(f"- **Documents Used:** {', '.join(result['documents'])}\n")
+                f.write(f"- **Expected Documents Found:** {result['expected']}\n")
+                f.write(f"- **Top Relevance:** {result['top_relevance']:.3f}\n")
                 f.write(f"- **Duration:** {result['duration']:.2f}s\n")
             elif 'error' in result:
                 f.write(f"- **Error:** {result['error']}\n")
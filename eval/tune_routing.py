@@ -0,0 +1,201 @@
+"""
+Offline tuning of the model routing policy
+Replays the evaluation queries through CopilotScheduler at a target QPS with
+the stub LLM, once per candidate policy (SLO, queue depth that triggers a
+downgrade, writer complexity threshold). Stub latency depends on the routed
+model, and comes from a recorded routing log (COPILOT_ROUTING_LOG) when given.
+Each policy's own routing log is read back to score cost and quality coverage.
+
+Example:
+    python eval/tune_routing.py --qps 1 --duration 60 --slo 20 30 --downgrade-queue 2 4 --writer-upgrade 0.3 0.4 0.5
+"""
+
+import sys
+import os
+import json
+import random
+import argparse
+import itertools
+import tempfile
+from dataclasses import replace, asdict
+from typing import Dict, List, Optional
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.environ["COPILOT_STUB_LLM"] = "1"
+os.environ.pop("COPILOT_QUERY_LOG", None)
+os.environ.pop("COPILOT_ROUTING_LOG", None)
+
+from retrieval.retriever import initialize_retriever
+from agents.copilot import create_copilot_system
+from agents.routing import ModelRouter, DEFAULT_TIERS, DEFAULT_ROUTES
+from agents.stub_llm import StubChatModel
+from observability.query_log import read_query_log
+from replay_load import arrival_gaps, replay, make_latency_sampler
+from run_evaluation import TEST_CASES
+
+
+# Stub latency of each model relative to DEFAULT_LATENCY, when nothing is recorded
+MODEL_LATENCY_FACTOR = {'gpt-4o-mini': 1.0, 'gpt-4o': 1.8}
+
+# Requests at or above this complexity should get the writer's top tier
+COMPLEX_REQUEST = 0.4
+
+
+def load_routing_log(path: Optional[str]) -> Dict[str, Dict[str, List[float]]]:
+    """Recorded call latencies per model and agent from a routing log"""
+    samples: Dict[str, Dict[str, List[float]]] = {}
+    if path:
+        for record in read_query_log(path):
+            latency = (record.get('outcome') or {}).get('latency_s')
+            if latency is not None:
+                samples.setdefault(record['model'], {}).setdefault(record['agent'], []).append(latency)
+    return samples
+
+
+def install_stubs(copilot, router: Optional[ModelRouter], recorded: Dict, time_scale: float, seed: int):
+    """Give every agent a latency-simulating stub for each model it can be routed to"""
+    models = {tier.model for tier in (router.tiers if router else DEFAULT_TIERS)}
+    for offset, model in enumerate(sorted(models)):
+        factor = 1.0 if recorded.get(model) else MODEL_LATENCY_FACTOR.get(model, 1.0)
+        sampler = make_latency_sampler(recorded.get(model, {}), time_scale * factor, seed + offset)
+        for agent in (copilot.planner, copilot.writer, copilot.verifier):
+            stub = StubChatModel(model, latency_sampler=sampler)
+            if model == agent.llm.model_name:
+                agent.llm = stub
+            agent.register_llm(stub)
+
+
+def make_router(slo_s: float, downgrade_queue: int, writer_upgrade: Optional[float], time_scale: float,
+                log_path: str) -> ModelRouter:
+    """Candidate router; latencies are scaled to the stub's time scale
+
+    writer_upgrade=None gives the static baseline: every agent pinned to the
+    fast tier, as without routing.
+    """
+    tiers = [replace(tier, base_latency_s=tier.base_latency_s * time_scale,
+                     latency_per_1k_prompt_s=tier.latency_per_1k_prompt_s * time_scale)
+             for tier in DEFAULT_TIERS]
+    if writer_upgrade is None:
+        fast = DEFAULT_TIERS[0].name
+        routes = {agent: replace(route, preferred=fast, min_tier=fast, max_tier=fast)
+                  for agent, route in DEFAULT_ROUTES.items()}
+    else:
+        routes = dict(DEFAULT_ROUTES)
+        routes['writer'] = replace(routes['writer'], upgrade_complexity=writer_upgrade)
+    return ModelRouter(tiers, routes, slo_s=slo_s * time_scale, downgrade_queue_depth=downgrade_queue,
+                       log_path=log_path)
+
+
+def score_decisions(log_path: str, completed: int) -> Dict:
+    """Cost, tier mix, downgrades and quality coverage from a policy's routing log"""
+    decisions = list(read_query_log(log_path)) if os.path.exists(log_path) else []
+    writer = [record for record in decisions if record['agent'] == 'writer']
+    complex_writer = [record for record in writer if record['complexity'] >= COMPLEX_REQUEST]
+    top_tier = DEFAULT_TIERS[-1].name
+    cost = sum((record.get('outcome') or {}).get('cost_usd', 0.0) for record in decisions)
+    return {
+        'calls': len(decisions),
+        'cost_per_request_usd': cost / completed if completed else 0.0,
+        'writer_top_tier': sum(record['tier'] == top_tier for record in writer) / max(len(writer), 1),
+        'quality_coverage': (sum(record['tier'] == top_tier for record in complex_writer) / len(complex_writer)
+                             if complex_writer else 1.0),
+        'load_downgrades': sum(any(reason.startswith("load") for reason in record['reasons'])
+                               for record in decisions),
+        'slo_downgrades': sum(any(reason.startswith("slo") for reason in record['reasons'])
+                              for record in decisions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the model routing policy offline against the stub LLM")
+    parser.add_argument("--log", default=None, help="Routing log with recorded latencies per model")
+    parser.add_argument("--qps", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of arrivals per policy")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--slo", type=float, nargs='+', default=[20.0, 30.0], help="Request SLOs (seconds)")
+    parser.add_argument("--downgrade-queue", type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument("--writer-upgrade", type=float, nargs='+', default=[0.3, 0.4, 0.5])
+    parser.add_argument("--target", type=float, default=0.95, help="Required SLO attainment")
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="Multiply LLM latencies and SLOs (1.0 for real time)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write all results to this file")
+    parser.add_argument("--write-config", help="Write the recommended policy as a COPILOT_ROUTING_CONFIG file")
+    args = parser.parse_args()
+
+    recorded = load_routing_log(args.log)
+    print(f"Stub latency from {'recorded samples' if recorded else 'lognormal defaults'} x{args.time_scale}")
+
+    os.chdir(ROOT)
+    retriever = initialize_retriever()
+    copilot = create_copilot_system(retriever)
+    requests = [(test['query'], test['goal']) for test in TEST_CASES]
+    copilot.run(*requests[0], profile=False)  # Warm up (encoder, thread pools)
+    # Arrivals are compressed by the same time scale as the LLM latencies
+    gaps = arrival_gaps(args.qps / args.time_scale, args.duration * args.time_scale, [], args.seed)
+    log_dir = tempfile.mkdtemp(prefix="routing-tune-")
+
+    policies = [('static', None, None, None)] + [
+        ('routed', slo, queue, upgrade)
+        for slo, queue, upgrade in itertools.product(args.slo, args.downgrade_queue, args.writer_upgrade)
+    ]
+    print(f"\n{'Policy':<8} {'SLO':>5} {'Queue':>5} {'Upgr':>5} {'Done':>5} {'p50':>7} {'p95':>7} "
+          f"{'SLO %':>6} {'$/req':>9} {'Quality':>8} {'Writer top':>10} {'Downgr':>7}")
+    results = []
+    for i, (name, slo, queue, upgrade) in enumerate(policies):
+        log_path = os.path.join(log_dir, f"policy-{i}.jsonl")
+        # The static baseline is routed with the fast tier pinned, so its cost is recorded too
+        router = make_router(slo or max(args.slo), queue or 10 ** 6, upgrade, args.time_scale, log_path)
+        copilot.router = router
+        for agent in (copilot.planner, copilot.writer, copilot.verifier):
+            agent.router = router
+        install_stubs(copilot, router, recorded, args.time_scale, args.seed)
+        random.seed(args.seed)
+
+        report = replay(copilot, requests, gaps, args.workers, max_queue=1000, coalesce=False,
+                        timeout=600.0, slo_s=(slo or max(args.slo)) * args.time_scale)
+        for key in list(report):
+            if key.endswith('_s'):
+                report[key] /= args.time_scale  # Back to real time
+            elif key.endswith('_qps'):
+                report[key] *= args.time_scale
+        scores = score_decisions(log_path, report['completed'])
+        result = {'policy': name, 'slo_s': slo, 'downgrade_queue_depth': queue,
+                  'writer_upgrade_complexity': upgrade, **report, **scores}
+        results.append(result)
+        print(f"{name:<8} {slo or '-':>5} {queue or '-':>5} {upgrade if upgrade is not None else '-':>5} "
+              f"{report['completed']:>5} {report['latency_p50_s']:>6.1f}s {report['latency_p95_s']:>6.1f}s "
+              f"{report['slo_attainment']:>6.0%} {scores['cost_per_request_usd']:>9.5f} "
+              f"{scores['quality_coverage']:>8.0%} {scores['writer_top_tier']:>10.0%} "
+              f"{scores['load_downgrades'] + scores['slo_downgrades']:>7}")
+
+    # Best quality coverage among policies meeting the SLO target, then cheapest
+    eligible = [result for result in results[1:] if result['slo_attainment'] >= args.target]
+    if eligible:
+        best = max(eligible, key=lambda result: (result['quality_coverage'], -result['cost_per_request_usd']))
+        config = {
+            'slo_s': best['slo_s'],
+            'downgrade_queue_depth': best['downgrade_queue_depth'],
+            'routes': {agent: asdict(route) for agent, route in DEFAULT_ROUTES.items()},
+        }
+        config['routes']['writer']['upgrade_complexity'] = best['writer_upgrade_complexity']
+        print(f"\nRecommended: SLO {best['slo_s']}s, downgrade at queue {best['downgrade_queue_depth']}, "
+              f"writer upgrade at complexity {best['writer_upgrade_complexity']} "
+              f"({best['quality_coverage']:.0%} quality coverage, ${best['cost_per_request_usd']:.5f}/request)")
+        if args.write_config:
+            with open(args.write_config, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2)
+            print(f"Policy written to {args.write_config} (use COPILOT_ROUTING_CONFIG={args.write_config})")
+    else:
+        print(f"\nNo policy met {args.target:.0%} SLO attainment; add workers or relax the SLO")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'runs': results}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Per-request profiling hooks for the agents and the retriever
+Off by default; a run is profiled when requested or sampled at a configured rate
+
+Spans wrap the graph nodes, BaseAgent.invoke and DocumentRetriever.search /
+build_index. When no profile session is active a span costs one ContextVar
+lookup. Artifacts are written to <output_dir>/<run_id>/:
+    spans.json      - timeline of spans (name, thread, start, duration)
+    profile.pstats  - merged cProfile stats (mode="cprofile"; snakeviz, gprof2dot)
+    profile.folded  - sampled stacks in folded format (mode="sample"; flamegraph.pl, speedscope)
+    memory_top.txt  - top allocation sites by growth during the run (tracemalloc)
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import cProfile
+import pstats
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar("copilot_profile_session", default=None)
+# One cProfile may be active per process (Python 3.12+ rejects a second); spans that
+# cannot take it fall back to timing only
+_cprofile_lock = threading.Lock()
+
+# Overlapping sessions share tracemalloc: the first one in starts it, the last one out stops it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False  # Whether we started it, rather than the host application
+
+
+def _memory_snapshot() -> Optional[tracemalloc.Snapshot]:
+    """Snapshot if tracemalloc is on; the host application may have stopped it"""
+    return tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+
+
+def _start_memory_trace() -> Optional[tracemalloc.Snapshot]:
+    """Join the shared tracemalloc session and snapshot its starting point"""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+        return _memory_snapshot()
+
+
+def _stop_memory_trace() -> Optional[tracemalloc.Snapshot]:
+    """Snapshot the end point and leave the shared tracemalloc session"""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        snapshot = _memory_snapshot()
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+        return snapshot
+
+
+class ProfileSession:
+    """Collects spans and profiles for one run and writes the artifacts"""
+
+    def __init__(self, run_id: str, output_dir: str = "./profiles", mode: str = "cprofile",
+                 trace_memory: bool = True, sample_interval: float = 0.005):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.run_id = run_id
+        self.directory = os.path.join(output_dir, run_id)
+        self.mode = mode
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval
+        self.spans: List[Dict] = []
+        self._stats: Optional[pstats.Stats] = None
+        self._stacks: Dict[str, int] = {}
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._token = None
+        self._started_at = 0.0
+        self._memory_start = None
+        self._sampler = None
+        self._stop = threading.Event()
+
+    def __enter__(self) -> "ProfileSession":
+        self._started_at = time.perf_counter()
+        if self.trace_memory:
+            self._memory_start = _start_memory_trace()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        self._token = _current_session.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_session.reset(self._token)
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        memory_end = _stop_memory_trace() if self.trace_memory else None
+        self._write(memory_end)
+        return False
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a block; in cprofile mode also profile it if no other span holds the profiler"""
+        thread_id = threading.get_ident()
+        profiler = None
+        if self.mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # Another profiling tool (not a span) is active
+                profiler = None
+                _cprofile_lock.release()
+        with self._lock:
+            self._threads.add(thread_id)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            with self._lock:
+                self.spans.append({
+                    'name': name,
+                    'thread': threading.current_thread().name,
+                    'start_s': start - self._started_at,
+                    'duration_s': duration,
+                })
+                if profiler is not None:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profiler)
+                    else:
+                        self._stats.add(profiler)
+
+    def _sample_loop(self):
+        """Statistical profiler: sample the stacks of threads running spans"""
+        while not self._stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    key = ";".join(reversed(stack))
+                    self._stacks[key] = self._stacks.get(key, 0) + 1
+
+    def _write(self, memory_end):
+        """Write the run's artifacts"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "spans.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                'run_id': self.run_id,
+                'total_s': time.perf_counter() - self._started_at,
+                'spans': sorted(self.spans, key=lambda span: span['start_s'])
+            }, f, indent=2)
+        if self._stats is not None:
+            self._stats.dump_stats(os.path.join(self.directory, "profile.pstats"))
+        if self._stacks:
+            with open(os.path.join(self.directory, "profile.folded"), 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self._stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        if memory_end is not None and self._memory_start is not None:
+            # Leave out the profiler's own allocations
+            exclude = [tracemalloc.Filter(False, pattern)
+                       for pattern in (cProfile.__file__, pstats.__file__, __file__, tracemalloc.__file__)]
+            top = memory_end.filter_traces(exclude).compare_to(
+                self._memory_start.filter_traces(exclude), 'lineno'
+            )[:30]
+            with open(os.path.join(self.directory, "memory_top.txt"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(str(stat) for stat in top) + "\n")
+
+
+@contextmanager
+def profile_block(name: str):
+    """Profile a block as a named span if the current run is being profiled"""
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+    with session.span(name):
+        yield
+
+
+def profile_span(name: str):
+    """Decorator form of profile_block"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = _current_session.get()
+            if session is None:
+                return fn(*args, **kwargs)
+            with session.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    """Decides which runs are profiled and where artifacts go
+
+    sample_rate is the fraction of runs profiled without being asked
+    (COPILOT_PROFILE_SAMPLE_RATE, e.g. 0.01 for 1%).
+    """
+
+    def __init__(self, sample_rate: float = 0.0, output_dir: str = "./profiles",
+                 mode: str = "cprofile", trace_memory: bool = True):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.mode = mode
+        self.trace_memory = trace_memory
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(
+            sample_rate=float(os.getenv("COPILOT_PROFILE_SAMPLE_RATE", "0")),
+            output_dir=os.getenv("COPILOT_PROFILE_DIR", "./profiles"),
+            mode=os.getenv("COPILOT_PROFILE_MODE", "cprofile"),
+            trace_memory=os.getenv("COPILOT_PROFILE_MEMORY", "1") == "1"
+        )
+
+    def session(self, run_id: str, profile: Optional[bool] = None):
+        """ProfileSession if the run is profiled (forced or sampled), else a no-op context"""
+        if profile is None:
+            profile = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not profile or _current_session.get() is not None:
+            return nullcontext()
+        return ProfileSession(run_id, self.output_dir, self.mode, self.trace_memory)
+
+
+def new_run_id() -> str:
+    """Sortable unique id for a run"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
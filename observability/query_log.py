@@ -0,0 +1,140 @@
+"""
+Structured log of copilot requests for capacity planning and load replay
+One JSON line per InsuranceCopilotSystem.run, in size-rotated files
+
+Enable with COPILOT_QUERY_LOG=./logs/queries.jsonl. Each record holds the
+start (ts) and end (end_ts) wall-clock times, the query and goal (unless
+COPILOT_QUERY_LOG_TEXT=0), end-to-end and per-agent timings, chunks and tokens
+retrieved, and LLM token counts.
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import logging
+import logging.handlers
+from typing import Dict, Iterator, Optional
+
+
+def jsonl_logger(name: str, path: str, max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 5) -> logging.Logger:
+    """Logger writing one message per line to a size-rotated file (one per path)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    logger = logging.getLogger(f"{name}.{os.path.abspath(path)}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+class QueryLogger:
+    """Writes one JSONL record per copilot run through a RotatingFileHandler"""
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 include_text: bool = True):
+        self.path = path
+        self.include_text = include_text
+        self._logger = jsonl_logger("copilot.query_log", path, max_bytes, backup_count)
+
+    @classmethod
+    def from_env(cls) -> Optional["QueryLogger"]:
+        """Logger for COPILOT_QUERY_LOG, or None when it is not set"""
+        path = os.getenv("COPILOT_QUERY_LOG")
+        if not path:
+            return None
+        return cls(
+            path,
+            max_bytes=int(float(os.getenv("COPILOT_QUERY_LOG_MAX_MB", "50")) * 1024 * 1024),
+            backup_count=int(os.getenv("COPILOT_QUERY_LOG_BACKUPS", "5")),
+            include_text=os.getenv("COPILOT_QUERY_LOG_TEXT", "1") == "1"
+        )
+
+    def log_run(self, user_query: str, user_goal: str, result: Optional[Dict], total_s: float,
+                error: Optional[BaseException] = None, run_id: Optional[str] = None,
+                started_at: Optional[float] = None):
+        """Record one run (result is None when the run raised)
+
+        started_at is the wall-clock start of the run; 'ts' records it as the
+        request's arrival time and 'end_ts' when the run finished.
+        """
+        end = time.time()
+        record = {
+            'ts': started_at if started_at is not None else end - total_s,
+            'end_ts': end,
+            'run_id': run_id or (result or {}).get('run_id'),
+            **self._request_fields(user_query, user_goal),
+            'total_s': round(total_s, 4),
+        }
+        if result is not None:
+            record.update(summarize_run(result))
+        if error is not None:
+            record['error'] = f"{type(error).__name__}: {error}"
+        self._logger.info(json.dumps(record, default=str))
+
+    def _request_fields(self, user_query: str, user_goal: str) -> Dict:
+        """Query and goal text, or stable hashes of them when text is excluded"""
+        if self.include_text:
+            return {'query': user_query, 'goal': user_goal}
+        digest = lambda text: hashlib.sha1(text.strip().encode('utf-8')).hexdigest()[:16]
+        return {'query_hash': digest(user_query), 'goal_hash': digest(user_goal)}
+
+
+def summarize_run(result: Dict) -> Dict:
+    """Timings, retrieval and token counts of a run, taken from its trace records"""
+    agents: Dict[str, Dict] = {}
+    summary = {
+        'cached': bool(result.get('cached')),
+        'verification_passed': result.get('verification_result', {}).get('passed'),
+        'index_generation': result.get('index_generation'),
+        'follow_up': (result.get('follow_up') or {}).get('kind'),
+        'agents': agents,
+    }
+    totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+    # A cached deliverable's trace describes the original run, not this one
+    trace_log = [] if summary['cached'] else result.get('trace_log', [])
+    for entry in trace_log:
+        if not isinstance(entry, dict):
+            continue
+        if 'latency_s' in entry:
+            agents[entry['agent']] = {
+                key: entry[key] for key in ('latency_s', *totals, 'model', 'tier') if key in entry
+            }
+            for key in totals:
+                totals[key] += entry.get(key, 0)
+        if entry.get('event') == 'retrieved':
+            summary.update({
+                'retrieval_s': entry.get('retrieval_s'),
+                'chunks': entry.get('chunks'),
+                'research_tokens': entry.get('tokens'),
+            })
+    summary.update(totals)
+    return summary
+
+
+def arrival_time(record: Dict) -> float:
+    """Wall-clock start of a logged run; logs without end_ts recorded the end as ts"""
+    if 'end_ts' in record:
+        return record['ts']
+    return record['ts'] - record.get('total_s', 0.0)
+
+
+def read_query_log(path: str) -> Iterator[Dict]:
+    """Records from a query log and its rotated backups, oldest first"""
+    # RotatingFileHandler renames path -> path.1 -> path.2 ..., so higher numbers are older
+    backups = [name for name in glob.glob(f"{glob.escape(path)}.*") if name.rsplit('.', 1)[1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit('.', 1)[1]), reverse=True)
+    for filename in backups + [path]:
+        if not os.path.exists(filename):
+            continue
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,118 @@
+"""
+Adaptive retrieval depth for the research agent
+Chooses how many hits to keep per query from the score distribution, stops
+issuing plan queries once they stop adding new chunks, and enforces a global
+chunk and token budget on the research notes
+"""
+
+import os
+from typing import Dict, List
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4
+
+
+class AdaptiveDepthPolicy:
+    """Per-query cut-off and global budget for retrieved chunks
+
+    Scores are the vector relevance_score, 1 / (1 + squared L2 distance). The
+    encoder returns unit vectors, so a score of 0.40 is a cosine similarity
+    of about 0.25. Hits below min_relevance are dropped, then the kept list is
+    cut at the largest score gap (the elbow) if that gap is at least min_gap.
+    The floor depends on the encoder and corpus, and the 0.40 default has not
+    been calibrated against the shipped encoder; eval/calibrate_depth.py
+    recommends one from the evaluation queries (COPILOT_MIN_RELEVANCE).
+    A plan moves on to a new sub-topic per query, so research stops only after
+    saturation_patience queries in a row add nothing new.
+    """
+
+    def __init__(self, max_k: int = 5, min_relevance: float = 0.40, min_gap: float = 0.03,
+                 max_chunks: int = 8, max_tokens: int = 2000, saturation_patience: int = 2):
+        self.max_k = max_k
+        self.min_relevance = min_relevance
+        self.min_gap = min_gap
+        self.max_chunks = max_chunks
+        self.max_tokens = max_tokens
+        self.saturation_patience = saturation_patience
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveDepthPolicy":
+        return cls(
+            min_relevance=float(os.getenv("COPILOT_MIN_RELEVANCE", "0.40")),
+            saturation_patience=int(os.getenv("COPILOT_SATURATION_PATIENCE", "2"))
+        )
+
+    def cut(self, results: List[Dict]) -> List[Dict]:
+        """Keep the hits above the relevance floor and the score elbow"""
+        relevant = [result for result in results[:self.max_k]
+                    if result['relevance_score'] >= self.min_relevance]
+        if len(relevant) < 2:
+            return relevant
+
+        # Results may be in reranker order, so find the elbow on sorted scores
+        scores = sorted((result['relevance_score'] for result in relevant), reverse=True)
+        gaps = [scores[i] - scores[i + 1] for i in range(len(scores) - 1)]
+        elbow = max(range(len(gaps)), key=gaps.__getitem__)
+        if gaps[elbow] < self.min_gap:
+            return relevant
+        threshold = scores[elbow]
+        return [result for result in relevant if result['relevance_score'] >= threshold]
+
+    def new_budget(self) -> "RetrievalBudget":
+        """Budget tracker for one research pass"""
+        return RetrievalBudget(self)
+
+
+class RetrievalBudget:
+    """Tracks chunks and tokens kept, and what the cut-offs saved, for one pass"""
+
+    def __init__(self, policy: AdaptiveDepthPolicy):
+        self.policy = policy
+        self.chunks = 0
+        self.tokens = 0
+        self.stale_queries = 0
+        self.candidates: Dict[str, int] = {}  # citation -> estimated tokens
+        self.kept = set()
+
+    def exhausted(self) -> bool:
+        """True once the chunk/token budget is spent or coverage has saturated"""
+        return (self.chunks >= self.policy.max_chunks
+                or self.tokens >= self.policy.max_tokens
+                or self.stale_queries >= self.policy.saturation_patience)
+
+    def offer(self, results: List[Dict], seen: set) -> List[Dict]:
+        """Select hits of one query within budget; seen holds citations already kept"""
+        for result in results:
+            self.candidates.setdefault(result['citation'], estimate_tokens(result['text']))
+
+        accepted = []
+        for result in self.policy.cut(results):
+            if result['citation'] in seen:
+                continue
+            tokens = self.candidates[result['citation']]
+            if self.chunks >= self.policy.max_chunks or self.tokens + tokens > self.policy.max_tokens:
+                break
+            accepted.append(result)
+            seen.add(result['citation'])
+            self.kept.add(result['citation'])
+            self.chunks += 1
+            self.tokens += tokens
+
+        # A query that adds nothing new once notes exist means coverage saturated
+        if not accepted and self.chunks:
+            self.stale_queries += 1
+        elif accepted:
+            self.stale_queries = 0
+        return accepted
+
+    def summary(self) -> Dict:
+        """Chunks and tokens kept versus dropped from the retrieved candidates"""
+        dropped = [tokens for citation, tokens in self.candidates.items() if citation not in self.kept]
+        return {
+            'chunks': self.chunks,
+            'tokens': self.tokens,
+            'chunks_saved': len(dropped),
+            'tokens_saved': sum(dropped)
+        }
@@ -0,0 +1,277 @@
+"""
+Columnar chunk store for the retrieval index
+Keeps chunk metadata in NumPy arrays and all chunk text in one buffer
+"""
+
+import sys
+from typing import List, Dict, Iterator, Optional
+import numpy as np
+
+
+class ChunkView:
+    """Lightweight view of one chunk in a ChunkStore"""
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self._store = store
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @property
+    def text(self) -> str:
+        return self._store.text_at(self._row)
+
+    @property
+    def document_name(self) -> str:
+        return self._store.document_names[self._store.doc_ids[self._row]]
+
+    @property
+    def chunk_id(self) -> int:
+        return int(self._store.chunk_ids[self._row])
+
+    @property
+    def start_char(self) -> int:
+        return int(self._store.start_chars[self._row])
+
+    @property
+    def end_char(self) -> int:
+        return int(self._store.end_chars[self._row])
+
+    @property
+    def citation(self) -> str:
+        return f"[{self.document_name}, chunk_{self.chunk_id}]"
+
+    @property
+    def alternate_citations(self) -> List[str]:
+        return self._store.alternate_citations(self._row)
+
+    def __repr__(self) -> str:
+        return f"ChunkView({self.citation})"
+
+
+class ChunkRef:
+    """Reference to a retrieved chunk, used in workflow state instead of a copy
+
+    Text and citation are resolved from the store on access. Supports the
+    dict-style access of the old research note dicts (note['text'], ...).
+    A ref keeps its whole store alive; to_dict materializes a plain note.
+    """
+    __slots__ = ('store', 'row', 'relevance', 'query')
+    FIELDS = ('text', 'citation', 'document', 'chunk_id', 'relevance', 'query')
+
+    def __init__(self, store: "ChunkStore", row: int, relevance: float, query: str = ""):
+        self.store = store
+        self.row = row
+        self.relevance = relevance
+        self.query = query
+
+    @property
+    def text(self) -> str:
+        return self.store.text_at(self.row)
+
+    @property
+    def document(self) -> str:
+        return self.store.document_names[self.store.doc_ids[self.row]]
+
+    @property
+    def chunk_id(self) -> int:
+        return int(self.store.chunk_ids[self.row])
+
+    @property
+    def citation(self) -> str:
+        return f"[{self.document}, chunk_{self.chunk_id}]"
+
+    @property
+    def alternate_citations(self) -> List[str]:
+        return self.store.alternate_citations(self.row)
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def to_dict(self) -> Dict:
+        """Materialize as a plain research note dict"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ChunkRef({self.citation}, relevance={self.relevance:.3f})"
+
+
+class ChunkStore:
+    """Columnar storage for document chunks
+
+    Document names are interned in a table and referenced by id, chunk
+    metadata lives in NumPy arrays and text is one UTF-8 buffer sliced by
+    offsets. ChunkView objects are only created for the rows that are read.
+    Near-duplicate chunks collapsed at build time are kept as alternate
+    (document, chunk_id) citations of their canonical row, in CSR layout.
+    """
+
+    def __init__(self, document_names: List[str], doc_ids: np.ndarray,
+                 chunk_ids: np.ndarray, start_chars: np.ndarray, end_chars: np.ndarray,
+                 text_offsets: np.ndarray, text_buffer: bytes,
+                 alt_offsets: Optional[np.ndarray] = None, alt_doc_ids: Optional[np.ndarray] = None,
+                 alt_chunk_ids: Optional[np.ndarray] = None):
+        self.document_names = document_names
+        self.doc_ids = doc_ids
+        self.chunk_ids = chunk_ids
+        self.start_chars = start_chars
+        self.end_chars = end_chars
+        self.text_offsets = text_offsets  # len(store) + 1 byte offsets into text_buffer
+        self.text_buffer = text_buffer
+        # Alternates of row i are alt_*[alt_offsets[i]:alt_offsets[i + 1]]
+        self.alt_offsets = alt_offsets if alt_offsets is not None else np.zeros(len(doc_ids) + 1, dtype='int64')
+        self.alt_doc_ids = alt_doc_ids if alt_doc_ids is not None else np.empty(0, dtype='int32')
+        self.alt_chunk_ids = alt_chunk_ids if alt_chunk_ids is not None else np.empty(0, dtype='int32')
+        self._doc_lookup = {name: i for i, name in enumerate(document_names)}
+
+    @classmethod
+    def from_chunks(cls, chunks, alternates: Optional[Dict[int, List]] = None) -> "ChunkStore":
+        """Build a store from DocumentChunk-like objects
+
+        alternates maps a position in chunks to the DocumentChunk-like
+        near-duplicates collapsed into it.
+        """
+        document_names: List[str] = []
+        doc_lookup: Dict[str, int] = {}
+        n = len(chunks)
+        doc_ids = np.empty(n, dtype='int32')
+        chunk_ids = np.empty(n, dtype='int32')
+        start_chars = np.empty(n, dtype='int64')
+        end_chars = np.empty(n, dtype='int64')
+        text_offsets = np.zeros(n + 1, dtype='int64')
+        alt_offsets = np.zeros(n + 1, dtype='int64')
+        alt_doc_ids: List[int] = []
+        alt_chunk_ids: List[int] = []
+        encoded = []
+
+        def intern(document_name: str) -> int:
+            doc_id = doc_lookup.get(document_name)
+            if doc_id is None:
+                doc_id = doc_lookup[document_name] = len(document_names)
+                document_names.append(document_name)
+            return doc_id
+
+        for i, chunk in enumerate(chunks):
+            doc_ids[i] = intern(chunk.document_name)
+            chunk_ids[i] = chunk.chunk_id
+            start_chars[i] = chunk.start_char
+            end_chars[i] = chunk.end_char
+            data = chunk.text.encode('utf-8')
+            encoded.append(data)
+            text_offsets[i + 1] = text_offsets[i] + len(data)
+            for duplicate in (alternates or {}).get(i, ()):
+                alt_doc_ids.append(intern(duplicate.document_name))
+                alt_chunk_ids.append(duplicate.chunk_id)
+            alt_offsets[i + 1] = len(alt_doc_ids)
+
+        return cls(document_names, doc_ids, chunk_ids, start_chars, end_chars,
+                   text_offsets, b''.join(encoded), alt_offsets,
+                   np.array(alt_doc_ids, dtype='int32'), np.array(alt_chunk_ids, dtype='int32'))
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getitem__(self, row: int) -> ChunkView:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return ChunkView(self, row)
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        for row in range(len(self)):
+            yield ChunkView(self, row)
+
+    def text_at(self, row: int) -> str:
+        """Decode the text of one chunk"""
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return self.text_buffer[start:end].decode('utf-8')
+
+    def texts(self) -> List[str]:
+        """Decode the text of every chunk (used when embedding)"""
+        return [self.text_at(row) for row in range(len(self))]
+
+    def alternate_citations(self, row: int) -> List[str]:
+        """Citations of the near-duplicates collapsed into a row"""
+        start, end = self.alt_offsets[row], self.alt_offsets[row + 1]
+        return [
+            f"[{self.document_names[doc_id]}, chunk_{chunk_id}]"
+            for doc_id, chunk_id in zip(self.alt_doc_ids[start:end], self.alt_chunk_ids[start:end])
+        ]
+
+    def doc_id(self, document_name: str) -> Optional[int]:
+        """Id of a document name in the interned table"""
+        return self._doc_lookup.get(document_name)
+
+    def rows_for_documents(self, document_names) -> np.ndarray:
+        """Rows whose document, or a near-duplicate collapsed into them, is in document_names"""
+        ids = [self._doc_lookup[name] for name in document_names if name in self._doc_lookup]
+        rows = np.nonzero(np.isin(self.doc_ids, ids))[0]
+        alternates = np.nonzero(np.isin(self.alt_doc_ids, ids))[0]
+        if len(alternates):
+            owners = np.searchsorted(self.alt_offsets, alternates, side='right') - 1
+            rows = np.union1d(rows, owners)
+        return rows
+
+    def find(self, document_name: str, chunk_id: int) -> Optional[int]:
+        """Row of a (document, chunk_id) citation, or None
+
+        A citation of a collapsed near-duplicate resolves to its canonical row.
+        """
+        doc_id = self._doc_lookup.get(document_name)
+        if doc_id is None:
+            return None
+        rows = np.nonzero((self.doc_ids == doc_id) & (self.chunk_ids == chunk_id))[0]
+        if len(rows):
+            return int(rows[0])
+        alternates = np.nonzero((self.alt_doc_ids == doc_id) & (self.alt_chunk_ids == chunk_id))[0]
+        if len(alternates):
+            return int(np.searchsorted(self.alt_offsets, alternates[0], side='right') - 1)
+        return None
+
+    @property
+    def num_alternates(self) -> int:
+        return len(self.alt_doc_ids)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the store"""
+        arrays = (self.doc_ids, self.chunk_ids, self.start_chars, self.end_chars, self.text_offsets,
+                  self.alt_offsets, self.alt_doc_ids, self.alt_chunk_ids)
+        return (sum(array.nbytes for array in arrays)
+                + sys.getsizeof(self.text_buffer)
+                + sum(sys.getsizeof(name) for name in self.document_names))
+
+    def __getstate__(self) -> Dict:
+        state = dict(self.__dict__)
+        del state['_doc_lookup']
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        if 'alt_offsets' not in state:
+            # Pickled before near-duplicate collapsing: no alternates
+            self.alt_offsets = np.zeros(len(self.doc_ids) + 1, dtype='int64')
+            self.alt_doc_ids = np.empty(0, dtype='int32')
+            self.alt_chunk_ids = np.empty(0, dtype='int32')
+        self._doc_lookup = {name: i for i, name in enumerate(self.document_names)}
+
+
+def object_memory_bytes(chunks) -> int:
+    """Approximate memory held by a list of DocumentChunk objects"""
+    seen = set()
+    total = sys.getsizeof(chunks)
+    for chunk in chunks:
+        for obj in (chunk, chunk.__dict__, *chunk.__dict__.values()):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+    return total
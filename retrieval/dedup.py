@@ -0,0 +1,83 @@
+"""
+Near-duplicate detection for chunks and diversity-aware result selection
+SimHash with band bucketing collapses near-identical chunks at build time;
+maximal marginal relevance (MMR) keeps query results from repeating each other
+"""
+
+import hashlib
+from typing import Dict, List, Sequence
+import numpy as np
+
+
+def simhash(text: str, bits: int = 64, shingle: int = 3) -> int:
+    """SimHash fingerprint of the word shingles in a text"""
+    words = text.lower().split()
+    if len(words) < shingle:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)]
+
+    digests = np.frombuffer(b''.join(
+        hashlib.blake2b(item.encode('utf-8'), digest_size=bits // 8).digest() for item in shingles
+    ), dtype='uint8').reshape(len(shingles), bits // 8)
+    # Each shingle votes +1/-1 per bit; the fingerprint keeps the bits with a positive total
+    votes = np.unpackbits(digests, axis=1).astype('int32').sum(axis=0) * 2 - len(shingles)
+    return int(''.join('1' if vote > 0 else '0' for vote in votes), 2)
+
+
+def find_near_duplicates(texts: Sequence[str], max_distance: int = 4, bits: int = 64) -> List[int]:
+    """Canonical row for every text: the first earlier text it is a near-duplicate of
+
+    Texts whose fingerprints differ in at most max_distance bits are
+    near-duplicates. Each text is compared with the canonical texts before it,
+    never with other duplicates, so a chain of small edits (A~B, B~C) does not
+    merge texts that are far apart (A and C). Fingerprints are split into
+    max_distance + 1 bands, so any such pair shares at least one band and only
+    canonical texts in the same band bucket are compared.
+    """
+    fingerprints = [simhash(text, bits) for text in texts]
+    bands = max_distance + 1
+    band_bits = bits // bands
+    mask = (1 << band_bits) - 1
+
+    # Canonical rows by (band, band value)
+    buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+    canonical: List[int] = []
+    for row, fingerprint in enumerate(fingerprints):
+        keys = [fingerprint >> (band * band_bits) & mask for band in range(bands)]
+        match = min((candidate for band, key in enumerate(keys) for candidate in buckets[band].get(key, ())
+                     if bin(fingerprint ^ fingerprints[candidate]).count('1') <= max_distance),
+                    default=None)
+        if match is None:
+            match = row
+            for band, key in enumerate(keys):
+                buckets[band].setdefault(key, []).append(row)
+        canonical.append(match)
+    return canonical
+
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_: float = 0.5) -> List[int]:
+    """Indices of k candidates chosen by maximal marginal relevance
+
+    relevance is min-max normalized so vector and cross-encoder scores can be
+    used alike; similarity is cosine between candidate embeddings.
+    """
+    n = len(relevance)
+    if n <= 1 or k <= 0:
+        return list(range(min(n, k)))
+    relevance = np.asarray(relevance, dtype='float32')
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype='float32')
+    vectors = np.asarray(embeddings, dtype='float32')
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < min(k, n):
+        scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
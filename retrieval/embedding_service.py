@@ -0,0 +1,335 @@
+"""
+Local query-embedding service shared by all copilot processes
+One process holds the SentenceTransformer and micro-batches concurrent encode
+requests arriving over a Unix socket; retrievers use EmbeddingClient and fall
+back to their own in-process model when the service is unavailable
+
+Run:    python retrieval/embedding_service.py --socket /tmp/copilot-embed.sock
+Use:    COPILOT_EMBED_SOCKET=/tmp/copilot-embed.sock streamlit run app/app.py
+
+Wire format (both directions): 4-byte big-endian header length, JSON header,
+then for encode responses the float32 matrix bytes (header carries the shape).
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from collections import deque
+from typing import Dict, List, Optional
+import numpy as np
+
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+
+class EmbeddingServiceUnavailable(RuntimeError):
+    """The embedding service could not serve a request"""
+
+
+def _send(sock: socket.socket, header: Dict, payload: bytes = b''):
+    """Write one framed message"""
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """Read exactly size bytes, or raise ConnectionError on EOF"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(size - len(buffer))
+        if not data:
+            raise ConnectionError("Connection closed")
+        buffer.extend(data)
+    return bytes(buffer)
+
+
+def _recv_header(sock: socket.socket) -> Dict:
+    """Read one framed JSON header"""
+    size = struct.unpack('>I', _recv_exact(sock, 4))[0]
+    return json.loads(_recv_exact(sock, size))
+
+
+def _summary(values) -> Dict[str, float]:
+    """Mean, p95 and max of a window of values"""
+    ordered = sorted(values)
+    if not ordered:
+        return {'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'mean': sum(ordered) / len(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'max': ordered[-1],
+    }
+
+
+class _PendingRequest:
+    """Texts from one connection waiting to be encoded in a batch"""
+    __slots__ = ('texts', 'enqueued_at', 'done', 'embeddings', 'error')
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.embeddings: Optional[np.ndarray] = None
+        self.error: Optional[str] = None
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket server that encodes requests in micro-batches
+
+    Each connection gets a handler thread; requests go to one batching thread
+    that waits up to batch_window_s after the first request for more, up to
+    max_batch texts, and encodes them in a single model call.
+    """
+    daemon_threads = True
+    # Listen backlog: every thread of every client process may connect at once,
+    # and a full backlog fails a Unix-socket connect instead of queueing it
+    request_queue_size = 256
+
+    def __init__(self, socket_path: str, model_name: str = DEFAULT_MODEL,
+                 max_batch: int = 64, batch_window_s: float = 0.005, window: int = 1000):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Stale socket from a previous run
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.batch_window_s = batch_window_s
+        self._pending: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._counts = {'requests': 0, 'texts': 0, 'batches': 0, 'errors': 0}
+        self._batch_sizes = deque(maxlen=window)
+        self._encode_s = deque(maxlen=window)
+        self._wait_s = deque(maxlen=window)
+
+        from sentence_transformers import SentenceTransformer
+        start = time.perf_counter()
+        self.model = SentenceTransformer(model_name)
+        self.model_load_s = time.perf_counter() - start
+        print(f"Loaded {model_name} in {self.model_load_s:.2f}s")
+        threading.Thread(target=self._batch_loop, name="embed-batcher", daemon=True).start()
+
+    def submit(self, texts: List[str]) -> _PendingRequest:
+        """Queue texts for the next batch"""
+        request = _PendingRequest(texts)
+        self._pending.put(request)
+        return request
+
+    def _batch_loop(self):
+        """Collect requests for up to batch_window_s and encode them together"""
+        while True:
+            batch = [self._pending.get()]
+            size = len(batch[0].texts)
+            deadline = time.perf_counter() + self.batch_window_s
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: List[_PendingRequest]):
+        """Encode one batch and hand each request its rows"""
+        texts = [text for request in batch for text in request.texts]
+        start = time.perf_counter()
+        try:
+            embeddings = np.asarray(self.model.encode(texts, show_progress_bar=False,
+                                                      batch_size=max(len(texts), 1)), dtype='float32')
+            error = None
+        except Exception as e:
+            embeddings, error = None, f"{type(e).__name__}: {e}"
+        encode_s = time.perf_counter() - start
+
+        offset = 0
+        for request in batch:
+            if error is None:
+                request.embeddings = embeddings[offset:offset + len(request.texts)]
+            request.error = error
+            offset += len(request.texts)
+            request.done.set()
+
+        with self._lock:
+            self._counts['requests'] += len(batch)
+            self._counts['texts'] += len(texts)
+            self._counts['batches'] += 1
+            self._counts['errors'] += len(batch) if error else 0
+            self._batch_sizes.append(len(texts))
+            self._encode_s.append(encode_s)
+            self._wait_s.extend(start - request.enqueued_at for request in batch)
+
+    def metrics(self) -> Dict:
+        """Request counts, batch sizes, encode latency and queueing delay"""
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'model': self.model_name,
+                **self._counts,
+                'queue_depth': self._pending.qsize(),
+                'batch_size': _summary(self._batch_sizes),
+                'encode_s': _summary(self._encode_s),
+                'wait_s': _summary(self._wait_s),
+            }
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Serves framed requests on one persistent connection: encode or metrics"""
+
+    def handle(self):
+        while True:
+            try:
+                header = _recv_header(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            op = header.get('op')
+            if op == 'metrics':
+                _send(self.request, self.server.metrics())
+            elif op == 'encode':
+                if header.get('model', self.server.model_name) != self.server.model_name:
+                    _send(self.request, {'error': f"Service runs {self.server.model_name}, "
+                                                  f"not {header['model']}"})
+                    continue
+                request = self.server.submit(list(header.get('texts') or []))
+                request.done.wait()
+                if request.error:
+                    _send(self.request, {'error': request.error})
+                else:
+                    embeddings = np.ascontiguousarray(request.embeddings, dtype='<f4')
+                    _send(self.request, {'shape': list(embeddings.shape)}, embeddings.tobytes())
+            else:
+                _send(self.request, {'error': f"Unknown op: {op}"})
+
+
+class EmbeddingClient:
+    """Client for the embedding service, one connection per calling thread
+
+    After a failure the service is skipped for retry_interval_s so callers
+    fall back to in-process encoding without paying a connect timeout each
+    query.
+    """
+
+    def __init__(self, socket_path: str, model_name: str = DEFAULT_MODEL,
+                 timeout: float = 5.0, retry_interval_s: float = 5.0, window: int = 1000):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.timeout = timeout
+        self.retry_interval_s = retry_interval_s
+        self._local = threading.local()
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._counts = {'requests': 0, 'failures': 0, 'fallbacks': 0}
+        self._latency_s = deque(maxlen=window)
+
+    def _connection(self) -> socket.socket:
+        """This thread's connection, opened on first use"""
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, header: Dict):
+        """Send one request and return (response header, connection)"""
+        if time.time() < self._down_until:
+            with self._lock:
+                self._counts['fallbacks'] += 1
+            raise EmbeddingServiceUnavailable("Embedding service marked down")
+        try:
+            sock = self._connection()
+            _send(sock, header)
+            response = _recv_header(sock)
+        except (OSError, ConnectionError, ValueError) as e:
+            self._close()
+            self._mark_down(f"Embedding service unavailable: {e}")
+        if 'error' in response:
+            self._mark_down(response['error'])
+        return response, sock
+
+    def _mark_down(self, reason: str):
+        """Skip the service for retry_interval_s and raise"""
+        with self._lock:
+            self._counts['failures'] += 1
+            self._counts['fallbacks'] += 1
+            self._down_until = time.time() + self.retry_interval_s
+        print(f"{reason}; encoding in-process for {self.retry_interval_s:.0f}s")
+        raise EmbeddingServiceUnavailable(reason)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts through the service as a float32 matrix"""
+        start = time.perf_counter()
+        response, sock = self._request({'op': 'encode', 'model': self.model_name, 'texts': list(texts)})
+        shape = tuple(response['shape'])
+        try:
+            data = _recv_exact(sock, int(np.prod(shape)) * 4)
+        except (OSError, ConnectionError) as e:
+            self._close()
+            self._mark_down(f"Embedding service unavailable: {e}")
+        with self._lock:
+            self._counts['requests'] += 1
+            self._latency_s.append(time.perf_counter() - start)
+        return np.frombuffer(data, dtype='<f4').reshape(shape).astype('float32')
+
+    def server_metrics(self) -> Dict:
+        """The service's own metrics (batching, encode latency)"""
+        return self._request({'op': 'metrics'})[0]
+
+    def stats(self) -> Dict:
+        """Client-side request, failure and fallback counts and round-trip latency"""
+        with self._lock:
+            return {**self._counts, 'latency_s': _summary(self._latency_s),
+                    'available': time.time() >= self._down_until}
+
+    @classmethod
+    def from_env(cls, model_name: str = DEFAULT_MODEL) -> Optional["EmbeddingClient"]:
+        """Client for COPILOT_EMBED_SOCKET, or None when it is not set"""
+        socket_path = os.getenv("COPILOT_EMBED_SOCKET")
+        return cls(socket_path, model_name) if socket_path else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared query-embedding service")
+    parser.add_argument("--socket", default=os.getenv("COPILOT_EMBED_SOCKET", "/tmp/copilot-embed.sock"))
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--max-batch", type=int, default=64, help="Texts per model call")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Micro-batching window")
+    args = parser.parse_args()
+
+    server = EmbeddingServer(args.socket, args.model, max_batch=args.max_batch,
+                             batch_window_s=args.window_ms / 1000)
+    print(f"Embedding service listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cross-encoder reranking stage for retrieved chunks
+Scores (query, chunk) pairs with a small local cross-encoder on CPU
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """Reranks vector-search candidates with a cross-encoder"""
+
+    def __init__(self, model_name: str = 'cross-encoder/ms-marco-MiniLM-L-6-v2',
+                 batch_size: int = 16, time_budget: float = 0.5,
+                 cache_size: int = 4096):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.time_budget = time_budget  # Seconds allowed for scoring per query
+        self.cache_size = cache_size
+        self.model = CrossEncoder(model_name, device='cpu')
+        self._cache: OrderedDict = OrderedDict()  # (query, citation) -> score, least recently used first
+        self._lock = threading.Lock()  # Guards the cache and stats; searches rerank from several threads
+        self.stats = {'queries': 0, 'fallbacks': 0, 'cache_hits': 0, 'scored_pairs': 0}
+
+    def rerank(self, query: str, candidates: List[Dict], k: int,
+               time_budget: Optional[float] = None) -> List[Dict]:
+        """Return the top k candidates ordered by cross-encoder score
+
+        Candidates must be in vector order. If scoring exceeds the latency
+        budget, the scored leading candidates are reranked and the rest follow
+        in vector order.
+        """
+        budget = self.time_budget if time_budget is None else time_budget
+        deadline = time.perf_counter() + budget
+
+        scores: List[Optional[float]] = []
+        pending = []
+        for i, candidate in enumerate(candidates):
+            score = self._cache_get(query, candidate['citation'])
+            scores.append(score)
+            if score is None:
+                pending.append(i)
+        scored_pairs = 0
+
+        # Score uncached pairs in batches until the budget runs out
+        for start in range(0, len(pending), self.batch_size):
+            if time.perf_counter() > deadline:
+                break
+            batch = pending[start:start + self.batch_size]
+            pairs = [(query, candidates[i]['text']) for i in batch]
+            batch_scores = self.model.predict(pairs, batch_size=self.batch_size,
+                                              show_progress_bar=False)
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self._cache_put(query, candidates[i]['citation'], scores[i])
+            scored_pairs += len(batch)
+
+        # Graceful fallback: rerank the scored prefix, keep vector order after it
+        scored = next((i for i, score in enumerate(scores) if score is None), len(candidates))
+        with self._lock:
+            self.stats['queries'] += 1
+            self.stats['cache_hits'] += len(candidates) - len(pending)
+            self.stats['scored_pairs'] += scored_pairs
+            self.stats['fallbacks'] += int(scored < len(candidates))
+
+        ranked = sorted(range(scored), key=lambda i: -scores[i])
+        results = []
+        for i in ranked[:k]:
+            result = dict(candidates[i])
+            result['rerank_score'] = scores[i]
+            results.append(result)
+        return results + candidates[scored:scored + k - len(results)]
+
+    def _cache_get(self, query: str, citation: str) -> Optional[float]:
+        """Look up a cached (query, chunk) score"""
+        key = (query, citation)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _cache_put(self, query: str, citation: str, score: float):
+        """Store a (query, chunk) score, evicting the least recently used"""
+        with self._lock:
+            self._cache[(query, citation)] = score
+            self._cache.move_to_end((query, citation))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        """Drop all cached scores (e.g. after the index changes)"""
+        with self._lock:
+            self._cache.clear()
@@ -1,16 +1,29 @@
 """
 Retrieval System for Insurance Document Corpus
 Uses sentence transformers for embeddings and FAISS for vector search
+
+sentence_transformers (and torch) and faiss are imported lazily so that
+importing this module stays cheap; see eval/profile_startup.py.
 """
 
 import os
-from typing import List, Dict, Tuple
-from dataclasses import dataclass
+import json
+import mmap
+import time
+import hashlib
+import threading
+import contextvars
+from typing import List, Dict, Tuple, Optional, Iterable
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
 import pickle
 
+from retrieval.chunk_store import ChunkStore, object_memory_bytes
+from retrieval.embedding_service import EmbeddingClient, EmbeddingServiceUnavailable
+from retrieval.dedup import find_near_duplicates, mmr_select
+from observability.profiling import profile_span, profile_block
+
 
 @dataclass
 class DocumentChunk:
@@ -22,25 +35,261 @@ class DocumentChunk:
     end_char: int
 
 
+# Line of business for each shipped document, used for shard routing and filters.
+# Documents in a subdirectory of documents_dir use the subdirectory name instead.
+DOCUMENT_CATEGORIES = {
+    'auto_insurance_policy.txt': 'policies',
+    'homeowners_policy.txt': 'policies',
+    'life_insurance_policy.txt': 'policies',
+    'claims_procedures.txt': 'claims',
+    'fraud_detection.txt': 'claims',
+    'underwriting_guidelines.txt': 'underwriting',
+    'risk_assessment.txt': 'underwriting',
+    'regulatory_compliance.txt': 'compliance',
+    'customer_service_standards.txt': 'compliance',
+}
+
+# Keywords used to route a query to categories when categories="auto"
+CATEGORY_KEYWORDS = {
+    'policies': ['coverage', 'policy', 'deductible', 'exclusion', 'premium', 'term life', 'jewelry'],
+    'claims': ['claim', 'fraud', 'red flag', 'settlement', 'adjuster', 'subrogation', 'fnol'],
+    'underwriting': ['underwriting', 'underwriter', 'risk', 'decline', 'eligib', 'wildfire', 'mitigation'],
+    'compliance': ['regulat', 'compliance', 'prompt payment', 'denial', 'response time', 'customer service'],
+}
+
+
+class IndexShard:
+    """FAISS index over a subset of chunks (e.g. one line of business)"""
+    
+    def __init__(self, name: str, chunk_ids: np.ndarray, embeddings: np.ndarray,
+                 backend: str = 'flat'):
+        self.name = name
+        self.chunk_ids = chunk_ids  # Global positions in DocumentRetriever.chunks
+        vectors = np.ascontiguousarray(embeddings[chunk_ids], dtype='float32')
+        self.index = create_faiss_index(backend, vectors.shape[1], len(vectors))
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+    
+    @classmethod
+    def from_index(cls, name: str, chunk_ids: np.ndarray, index) -> "IndexShard":
+        """Wrap an already built (e.g. memory-mapped) FAISS index"""
+        shard = cls.__new__(cls)
+        shard.name = name
+        shard.chunk_ids = chunk_ids
+        shard.index = index
+        return shard
+    
+    def search(self, query_embedding: np.ndarray, k: int,
+               allowed_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, global chunk ids) of the k nearest chunks
+        
+        allowed_ids restricts scoring to those global chunk ids.
+        """
+        import faiss
+        params = None
+        if allowed_ids is not None:
+            local_ids = np.nonzero(np.isin(self.chunk_ids, allowed_ids))[0]
+            if len(local_ids) == 0:
+                return np.empty(0, dtype='float32'), np.empty(0, dtype='int64')
+            params = self._search_params(faiss.IDSelectorBatch(local_ids.astype('int64')))
+            k = min(k, len(local_ids))
+        k = min(k, self.index.ntotal)
+        distances, indices = self.index.search(query_embedding, k, params=params)
+        found = indices[0] >= 0
+        return distances[0][found], self.chunk_ids[indices[0][found]]
+    
+    def _search_params(self, selector):
+        """Search parameters of the type the index expects, with an ID filter"""
+        import faiss
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        return faiss.SearchParameters(sel=selector)
+
+
+# Supported FAISS index types for DocumentRetriever(index_backend=...)
+INDEX_BACKENDS = ('flat', 'hnsw', 'ivf')
+
+
+def create_faiss_index(backend: str, dimension: int, num_vectors: int):
+    """Create an empty FAISS index of the given backend type
+    
+    flat: exact L2 search. hnsw: graph index, no training.
+    ivf: inverted lists with sqrt(n) clusters; falls back to flat for small shards.
+    """
+    import faiss
+    if backend == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, 32)
+        index.hnsw.efSearch = 64
+        return index
+    if backend == 'ivf':
+        nlist = int(np.sqrt(num_vectors))
+        if nlist >= 4 and num_vectors >= 39 * nlist:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            index.nprobe = max(1, nlist // 16)
+            return index
+    elif backend != 'flat':
+        raise ValueError(f"Unknown index backend: {backend} (expected one of {INDEX_BACKENDS})")
+    return faiss.IndexFlatL2(dimension)
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Immutable index state; a reload swaps in a new snapshot in one assignment
+    
+    A search reads one snapshot for its whole duration, so it never mixes the
+    chunk store of one index with the shards of another.
+    """
+    chunks: ChunkStore
+    embeddings: Optional[np.ndarray]
+    document_categories: Dict[str, str]
+    shards: Dict[str, "IndexShard"]
+    index_version: Optional[str]  # Fingerprint of the indexed corpus
+    generation: int = 0  # Incremented on every build, load or reload
+    documents_signature: Optional[Tuple] = None  # Documents the index was built from
+
+
+# ChunkStore arrays written by save_mmap (alt_* hold collapsed near-duplicates)
+CHUNK_ARRAYS = ('doc_ids', 'chunk_ids', 'start_chars', 'end_chars', 'text_offsets',
+                'alt_offsets', 'alt_doc_ids', 'alt_chunk_ids')
+
+
 class DocumentRetriever:
     """Retrieval system with embedding and vector search"""
     
-    def __init__(self, documents_dir: str = "./data/documents"):
+    def __init__(self, documents_dir: str = "./data/documents",
+                 reranker=None, rerank_candidates: int = 20,
+                 shard_by: Optional[str] = None, max_workers: Optional[int] = None,
+                 index_path: str = "./data/faiss_index.pkl", index_backend: str = 'flat',
+                 embedding_client=None, dedup: bool = False, mmr_lambda: Optional[float] = None):
         self.documents_dir = documents_dir
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.chunks: List[DocumentChunk] = []
-        self.index = None
-        self.embeddings = None
+        self.index_path = index_path
+        self.index_backend = index_backend
+        self.model_name = 'all-MiniLM-L6-v2'
+        self._model = None  # Loaded on first encode, see the model property
+        self._model_lock = threading.Lock()
+        # Optional shared embedding service for queries (see retrieval/embedding_service.py)
+        self.embedding_client = embedding_client
+        # chunks, embeddings, document_categories, shards and index_version live here
+        self._snapshot = IndexSnapshot(ChunkStore.from_chunks([]), None, {}, {}, None)
+        # Shards: a single "all" shard, or one per category when shard_by="category"
+        self.shard_by = shard_by
+        self.max_workers = max_workers
+        self._executor = None
+        # Optional cross-encoder stage: over-fetch candidates, return top k
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        # Opt-in: collapse near-duplicate chunks at build time; diversify results with MMR (None = off)
+        self.dedup = dedup
+        self.mmr_lambda = mmr_lambda
+        # Startup profiling: index_load_s, model_load_s, first_query_s
+        self.timings: Dict[str, float] = {}
+        self._ready = threading.Event()
+        self._load_error: Optional[BaseException] = None
+        # Hot reload: one background rebuild at a time, optional directory watcher
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        
+    @classmethod
+    def from_env(cls, **kwargs) -> "DocumentRetriever":
+        """Retriever with COPILOT_EMBED_SOCKET, COPILOT_DEDUP and COPILOT_MMR_LAMBDA applied
+        
+        Keyword arguments are passed to the constructor and take precedence.
+        """
+        mmr_lambda = os.getenv("COPILOT_MMR_LAMBDA")
+        options = {
+            'embedding_client': EmbeddingClient.from_env(),
+            'dedup': os.getenv("COPILOT_DEDUP", "0") == "1",
+            'mmr_lambda': float(mmr_lambda) if mmr_lambda else None,
+        }
+        options.update(kwargs)
+        return cls(**options)
+    
+    # Index state is read from the current snapshot; assignments (used while
+    # building) replace the snapshot field by field
+    chunks = property(lambda self: self._snapshot.chunks,
+                      lambda self, value: self._set_snapshot(chunks=value))
+    embeddings = property(lambda self: self._snapshot.embeddings,
+                          lambda self, value: self._set_snapshot(embeddings=value))
+    document_categories = property(lambda self: self._snapshot.document_categories,
+                                   lambda self, value: self._set_snapshot(document_categories=value))
+    shards = property(lambda self: self._snapshot.shards,
+                      lambda self, value: self._set_snapshot(shards=value))
+    index_version = property(lambda self: self._snapshot.index_version,
+                             lambda self, value: self._set_snapshot(index_version=value))
+    
+    def _set_snapshot(self, **fields):
+        self._snapshot = replace(self._snapshot, **fields)
+    
+    @property
+    def generation(self) -> int:
+        """Generation of the index currently answering searches"""
+        return self._snapshot.generation
+    
+    def snapshot(self) -> IndexSnapshot:
+        """Current index snapshot; pass it to search() to pin one index across calls"""
+        self.wait_until_ready()
+        return self._snapshot
+    
+    @property
+    def model(self):
+        """Embedding model, loaded on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    self.timings['model_load_s'] = time.perf_counter() - start
+                    print(f"Loaded embedding model in {self.timings['model_load_s']:.2f}s")
+        return self._model
+    
+    @property
+    def is_ready(self) -> bool:
+        """True once the index is loaded (or failed to load)"""
+        return self._ready.is_set()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until the index is loaded; re-raises a background load error"""
+        ready = self._ready.wait(timeout)
+        if self._load_error is not None:
+            raise RuntimeError("Index failed to load") from self._load_error
+        return ready
+    
+    def build_index_async(self, force_rebuild: bool = False) -> threading.Thread:
+        """Load or build the index in a background thread"""
+        def load():
+            try:
+                self.build_index(force_rebuild=force_rebuild)
+            except Exception as e:
+                print(f"Background index load failed: {e}")
         
+        thread = threading.Thread(target=load, name="index-loader", daemon=True)
+        thread.start()
+        return thread
+    
     def load_documents(self) -> List[Tuple[str, str]]:
-        """Load all text documents from the directory"""
+        """Load all text documents from the directory and its subdirectories"""
         documents = []
-        for filename in os.listdir(self.documents_dir):
-            if filename.endswith('.txt'):
-                filepath = os.path.join(self.documents_dir, filename)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    documents.append((filename, content))
+        self.document_categories = {}
+        for dirpath, _, filenames in os.walk(self.documents_dir):
+            subdir = os.path.relpath(dirpath, self.documents_dir)
+            for filename in sorted(filenames):
+                if filename.endswith('.txt'):
+                    filepath = os.path.join(dirpath, filename)
+                    doc_name = filename if subdir == '.' else os.path.join(subdir, filename)
+                    with open(filepath, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                        documents.append((doc_name, content))
+                    if subdir == '.':
+                        self.document_categories[doc_name] = DOCUMENT_CATEGORIES.get(filename, 'general')
+                    else:
+                        self.document_categories[doc_name] = subdir.split(os.sep)[0]
         print(f"Loaded {len(documents)} documents")
         return documents
     
@@ -94,88 +343,507 @@ class DocumentRetriever:
         
         return chunks
     
+    @profile_span("retriever.build_index")
     def build_index(self, force_rebuild: bool = False):
         """Build FAISS index from documents"""
-        index_path = "./data/faiss_index.pkl"
+        self._ready.clear()
+        self._load_error = None
+        start = time.perf_counter()
+        try:
+            self._load_or_build_index(force_rebuild)
+        except BaseException as e:
+            self._load_error = e
+            raise
+        finally:
+            self.timings['index_load_s'] = time.perf_counter() - start
+            self._ready.set()
+    
+    def _load_or_build_index(self, force_rebuild: bool):
+        """Load the saved index, or build and save a new one"""
+        index_path = self.index_path
         
-        # Try to load existing index
+        # Taken before reading documents, so edits made during a build show up as changes
+        signature = self._documents_signature()
+        saved_data = None
         if not force_rebuild and os.path.exists(index_path):
             print("Loading existing index...")
             with open(index_path, 'rb') as f:
                 saved_data = pickle.load(f)
-                self.chunks = saved_data['chunks']
-                self.embeddings = saved_data['embeddings']
-                self.index = saved_data['index']
-            print(f"Loaded index with {len(self.chunks)} chunks")
+            if saved_data.get('documents_signature') != signature:
+                # Also true for indexes saved before signatures were recorded
+                print("Documents changed since the index was saved, rebuilding")
+                saved_data = None
+            elif saved_data.get('dedup') != self.dedup:
+                print("Index was saved with different near-duplicate collapsing, rebuilding")
+                saved_data = None
+        
+        if saved_data is not None:
+            self.chunks = saved_data['chunk_store']
+            self.embeddings = saved_data['embeddings']
+            self.document_categories = saved_data.get('document_categories', {})
+            if not self._load_shards(saved_data):
+                self._build_shards()
+            self._set_snapshot(index_version=self._fingerprint(), generation=self.generation + 1,
+                               documents_signature=signature)
+            print(f"Loaded index with {len(self.chunks)} chunks in {len(self.shards)} shard(s)")
             return
         
         print("Building new index...")
         # Load and chunk all documents
+        phase_start = time.perf_counter()
         documents = self.load_documents()
-        self.chunks = []
+        doc_chunks: List[DocumentChunk] = []
         
         for doc_name, content in documents:
-            doc_chunks = self.chunk_document(doc_name, content)
-            self.chunks.extend(doc_chunks)
+            doc_chunks.extend(self.chunk_document(doc_name, content))
         
-        print(f"Created {len(self.chunks)} chunks from {len(documents)} documents")
+        print(f"Created {len(doc_chunks)} chunks from {len(documents)} documents")
+        
+        # Collapse near-duplicates (shared boilerplate, chunk overlap) before embedding
+        alternates = {}
+        if self.dedup:
+            dedup_start = time.perf_counter()
+            doc_chunks, alternates = self._collapse_duplicates(doc_chunks)
+            self.timings['dedup_s'] = time.perf_counter() - dedup_start
+        
+        # Pack chunks into the columnar store
+        self.chunks = ChunkStore.from_chunks(doc_chunks, alternates)
+        self.timings['ingest_s'] = time.perf_counter() - phase_start
+        if doc_chunks:
+            print(f"Chunk memory: {object_memory_bytes(doc_chunks) / len(doc_chunks):.0f} B/chunk as objects, "
+                  f"{self.chunks.memory_bytes() / len(doc_chunks):.0f} B/chunk columnar")
         
         # Generate embeddings
         print("Generating embeddings...")
-        chunk_texts = [chunk.text for chunk in self.chunks]
+        chunk_texts = [chunk.text for chunk in doc_chunks]
+        del doc_chunks
+        self.model  # Keep model loading out of the embedding timing
+        phase_start = time.perf_counter()
         self.embeddings = self.model.encode(chunk_texts, show_progress_bar=True)
+        self.timings['embedding_s'] = time.perf_counter() - phase_start
         
-        # Build FAISS index
+        # Build FAISS index (one per shard)
         print("Building FAISS index...")
-        dimension = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(self.embeddings.astype('float32'))
+        phase_start = time.perf_counter()
+        self._build_shards()
+        self.timings['index_build_s'] = time.perf_counter() - phase_start
         
         # Save index
         print("Saving index...")
-        with open(index_path, 'wb') as f:
+        phase_start = time.perf_counter()
+        # Write then rename, so a concurrent load never reads a partial file
+        with open(index_path + '.tmp', 'wb') as f:
             pickle.dump({
-                'chunks': self.chunks,
+                'chunk_store': self.chunks,
                 'embeddings': self.embeddings,
-                'index': self.index
-            }, f)
+                'document_categories': self.document_categories,
+                'documents_signature': signature,
+                'dedup': self.dedup,
+                **self._serialize_shards()
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(index_path + '.tmp', index_path)
+        self.timings['save_s'] = time.perf_counter() - phase_start
         
+        self._set_snapshot(index_version=self._fingerprint(), generation=self.generation + 1,
+                           documents_signature=signature)
         print("Index built and saved successfully")
     
-    def search(self, query: str, k: int = 5) -> List[Dict]:
-        """Search for relevant chunks with citations"""
+    def _collapse_duplicates(self, doc_chunks: List[DocumentChunk]) -> Tuple[List[DocumentChunk], Dict[int, List[DocumentChunk]]]:
+        """Keep one canonical chunk per near-duplicate group
+        
+        Returns the kept chunks and, by kept position, the chunks collapsed into each.
+        """
+        canonical = find_near_duplicates([chunk.text for chunk in doc_chunks])
+        kept: List[DocumentChunk] = []
+        position: Dict[int, int] = {}
+        alternates: Dict[int, List[DocumentChunk]] = {}
+        for row, chunk in enumerate(doc_chunks):
+            if canonical[row] == row:
+                position[row] = len(kept)
+                kept.append(chunk)
+            else:
+                alternates.setdefault(position[canonical[row]], []).append(chunk)
+        if len(kept) < len(doc_chunks):
+            print(f"Collapsed {len(doc_chunks) - len(kept)} near-duplicate chunks "
+                  f"into {len(alternates)} canonical chunks")
+        return kept, alternates
+    
+    def save_mmap(self, directory: str):
+        """Write the index as flat files that worker processes can memory-map"""
+        import faiss
+        os.makedirs(directory, exist_ok=True)
+        for name in CHUNK_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self.chunks, name))
+        with open(os.path.join(directory, "text.bin"), 'wb') as f:
+            f.write(self.chunks.text_buffer)
+        np.save(os.path.join(directory, "embeddings.npy"), np.asarray(self.embeddings, dtype='float32'))
+        for name, shard in self.shards.items():
+            faiss.write_index(shard.index, os.path.join(directory, f"shard_{name}.faiss"))
+            np.save(os.path.join(directory, f"shard_{name}_ids.npy"), shard.chunk_ids)
+        with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                'document_names': self.chunks.document_names,
+                'document_categories': self.document_categories,
+                'shards': list(self.shards),
+                'shard_by': self.shard_by,
+                'index_version': self.index_version
+            }, f)
+        print(f"Saved memory-mappable index to {directory}")
+    
+    def load_mmap(self, directory: str):
+        """Load an index written by save_mmap without copying it into memory
+        
+        Processes that map the same files share one copy in the page cache.
+        """
+        import faiss
+        with open(os.path.join(directory, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+            for name in CHUNK_ARRAYS if os.path.exists(os.path.join(directory, f"{name}.npy"))
+        }
+        with open(os.path.join(directory, "text.bin"), 'rb') as f:
+            text_buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(f.name) else b''
+        self.chunks = ChunkStore(meta['document_names'], text_buffer=text_buffer, **arrays)
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode='r')
+        self.document_categories = meta['document_categories']
+        self.shard_by = meta['shard_by']
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        self.shards = {
+            name: IndexShard.from_index(
+                name,
+                np.load(os.path.join(directory, f"shard_{name}_ids.npy")),
+                faiss.read_index(os.path.join(directory, f"shard_{name}.faiss"), flags)
+            )
+            for name in meta['shards']
+        }
+        self._set_snapshot(index_version=meta['index_version'], generation=self.generation + 1)
+        self._load_error = None
+        self._ready.set()
+        print(f"Memory-mapped index with {len(self.chunks)} chunks in {len(self.shards)} shard(s)")
+    
+    def _fingerprint(self) -> str:
+        """Hash of the indexed documents and chunk text"""
+        digest = hashlib.sha1()
+        digest.update('\n'.join(self.chunks.document_names).encode('utf-8'))
+        digest.update(self.chunks.text_buffer)
+        return digest.hexdigest()[:16]
+    
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed query texts as float32 vectors
+        
+        Uses the embedding service when configured, else (or if it is down)
+        the in-process model.
+        """
+        if self.embedding_client is not None:
+            try:
+                return self.embedding_client.encode(texts)
+            except EmbeddingServiceUnavailable:
+                pass  # Fall back to the in-process model
+        return np.asarray(self.model.encode(texts, show_progress_bar=False), dtype='float32')
+    
+    def _build_shards(self):
+        """Build one FAISS index per shard from the chunk embeddings"""
+        if self.shard_by == 'category':
+            categories = sorted(set(self._category_of(name) for name in self.chunks.document_names))
+            groups = {category: self._category_rows([category]) for category in categories}
+        else:
+            groups = {'all': np.arange(len(self.chunks), dtype='int64')}
+        
+        self.shards = {
+            name: IndexShard(name, ids.astype('int64'), self.embeddings, self.index_backend)
+            for name, ids in groups.items() if len(ids)
+        }
+    
+    def _serialize_shards(self) -> Dict:
+        """Pickle fields for the shard indexes (flat shards are rebuilt on load)"""
+        if self.index_backend == 'flat':
+            return {}
+        import faiss
+        return {
+            'index_backend': self.index_backend,
+            'shard_by': self.shard_by,
+            'shards': {
+                name: (shard.chunk_ids, faiss.serialize_index(shard.index))
+                for name, shard in self.shards.items()
+            }
+        }
+    
+    def _load_shards(self, saved_data: Dict) -> bool:
+        """Restore saved shard indexes if they match the current configuration"""
+        if 'shards' not in saved_data or saved_data.get('index_backend') != self.index_backend \
+                or saved_data.get('shard_by') != self.shard_by:
+            return False
+        import faiss
+        self.shards = {
+            name: IndexShard.from_index(name, chunk_ids, faiss.deserialize_index(data))
+            for name, (chunk_ids, data) in saved_data['shards'].items()
+        }
+        return True
+    
+    def _category_of(self, document_name: str, snapshot: Optional[IndexSnapshot] = None) -> str:
+        """Category of a document (see DOCUMENT_CATEGORIES)"""
+        return (snapshot or self._snapshot).document_categories.get(document_name, 'general')
+    
+    def _category_rows(self, categories: Iterable[str], snapshot: Optional[IndexSnapshot] = None) -> np.ndarray:
+        """Rows of all chunks whose document is in one of the categories"""
+        snapshot = snapshot or self._snapshot
+        categories = set(categories)
+        return snapshot.chunks.rows_for_documents(
+            name for name in snapshot.chunks.document_names if self._category_of(name, snapshot) in categories
+        )
+    
+    def route_categories(self, query: str) -> Optional[List[str]]:
+        """Guess the categories a query belongs to from keywords (None = all)"""
+        query_lower = query.lower()
+        matched = [
+            category for category, keywords in CATEGORY_KEYWORDS.items()
+            if any(keyword in query_lower for keyword in keywords)
+        ]
+        return matched or None
+    
+    def _select_shards(self, categories: Optional[Iterable[str]], snapshot: IndexSnapshot) -> List[IndexShard]:
+        """Pick the shards to query; shards outside the categories are skipped"""
+        if categories is None or self.shard_by != 'category':
+            return list(snapshot.shards.values())
+        return [snapshot.shards[name] for name in categories if name in snapshot.shards]
+    
+    def _allowed_ids(self, documents: Optional[Iterable[str]],
+                     categories: Optional[Iterable[str]],
+                     snapshot: IndexSnapshot) -> Optional[np.ndarray]:
+        """Global chunk ids that pass the metadata filters (None = no filter)"""
+        if documents is None and (categories is None or self.shard_by == 'category'):
+            return None
+        allowed = None
+        if documents is not None:
+            allowed = snapshot.chunks.rows_for_documents(documents)
+        if categories is not None and self.shard_by != 'category':
+            category_rows = self._category_rows(categories, snapshot)
+            allowed = category_rows if allowed is None else np.intersect1d(allowed, category_rows)
+        return allowed.astype('int64')
+    
+    @staticmethod
+    def _search_shard(shard: IndexShard, query_embedding: np.ndarray, k: int,
+                      allowed_ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Search one shard as its own span"""
+        with profile_block("retriever.shard"):
+            return shard.search(query_embedding, k, allowed_ids)
+    
+    def _search_shards(self, query_embedding: np.ndarray, k: int,
+                       shards: List[IndexShard],
+                       allowed_ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Fan out to shards in parallel and merge into the global top k"""
+        if len(shards) == 1:
+            partials = [shards[0].search(query_embedding, k, allowed_ids)]
+        else:
+            # FAISS releases the GIL during search, so threads run in parallel
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers or len(shards),
+                    thread_name_prefix="faiss-shard"
+                )
+            # Each task runs in a copy of the caller's context so profile spans
+            # and the routing request follow it onto the pool threads
+            contexts = [contextvars.copy_context() for _ in shards]
+            partials = list(self._executor.map(
+                lambda context, shard: context.run(self._search_shard, shard, query_embedding, k, allowed_ids),
+                contexts, shards
+            ))
+        
+        distances = np.concatenate([partial[0] for partial in partials])
+        indices = np.concatenate([partial[1] for partial in partials])
+        order = np.argsort(distances, kind='stable')[:k]
+        return distances[order], indices[order]
+    
+    @profile_span("retriever.search")
+    def search(self, query: str, k: int = 5, rerank: bool = True,
+               documents: Optional[Iterable[str]] = None,
+               categories=None, mmr: Optional[bool] = None,
+               snapshot: Optional[IndexSnapshot] = None) -> List[Dict]:
+        """Search for relevant chunks with citations
+        
+        documents/categories filter chunks before scoring; categories="auto"
+        routes the query to categories by keyword. mmr (default: on unless
+        mmr_lambda is None) picks the top k for diversity as well as relevance.
+        Results carry the index generation that answered; snapshot pins one.
+        """
+        snapshot = snapshot or self.snapshot()
+        first_query = 'first_query_s' not in self.timings
+        start = time.perf_counter()
+        use_reranker = rerank and self.reranker is not None
+        use_mmr = (self.mmr_lambda is not None if mmr is None else mmr) and k > 1
+        fetch_k = max(k, self.rerank_candidates) if use_reranker else k
+        if use_mmr:
+            fetch_k = max(fetch_k, 3 * k)  # Candidate pool to diversify from
+        fetch_k = min(fetch_k, len(snapshot.chunks))
+        
+        if categories == 'auto':
+            categories = self.route_categories(query)
+        shards = self._select_shards(categories, snapshot)
+        allowed_ids = self._allowed_ids(documents, categories, snapshot)
+        if not shards or (allowed_ids is not None and len(allowed_ids) == 0):
+            return []
+        
         # Encode query
-        query_embedding = self.model.encode([query])[0]
+        with profile_block("retriever.encode"):
+            query_embedding = self.encode_queries([query])[0]
         
         # Search in FAISS
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype('float32'), k
-        )
+        with profile_block("retriever.faiss"):
+            distances, indices = self._search_shards(
+                query_embedding.reshape(1, -1).astype('float32'), fetch_k, shards, allowed_ids
+            )
         
-        # Prepare results with citations
+        # Prepare results with citations (views are only built for returned hits)
         results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            chunk = self.chunks[idx]
+        for dist, idx in zip(distances, indices):
+            chunk = snapshot.chunks[idx]
             results.append({
                 'text': chunk.text,
                 'document': chunk.document_name,
                 'chunk_id': chunk.chunk_id,
-                'citation': f"[{chunk.document_name}, chunk_{chunk.chunk_id}]",
+                'citation': chunk.citation,
+                'alternate_citations': chunk.alternate_citations,
+                'row': int(idx),  # Position in snapshot.chunks, for ChunkRef
+                'generation': snapshot.generation,
                 'relevance_score': float(1 / (1 + dist))  # Convert distance to similarity
             })
         
+        if use_reranker:
+            with profile_block("retriever.rerank"):
+                results = self.reranker.rerank(query, results, len(results) if use_mmr else k)
+        if use_mmr:
+            results = self._diversify(results, k, snapshot)
+        if first_query:
+            self.timings['first_query_s'] = time.perf_counter() - start
         return results
     
+    def _diversify(self, results: List[Dict], k: int, snapshot: IndexSnapshot) -> List[Dict]:
+        """Top k results by maximal marginal relevance over chunk embeddings"""
+        if len(results) <= 1:
+            return results[:k]
+        relevance = np.array([result.get('rerank_score', result['relevance_score']) for result in results])
+        embeddings = snapshot.embeddings[[result['row'] for result in results]]
+        return [results[i] for i in mmr_select(relevance, embeddings, k, self.mmr_lambda or 0.5)]
+    
     def get_chunk_by_citation(self, document_name: str, chunk_id: int) -> str:
-        """Retrieve specific chunk by citation reference"""
-        for chunk in self.chunks:
-            if chunk.document_name == document_name and chunk.chunk_id == chunk_id:
-                return chunk.text
-        return None
+        """Retrieve specific chunk by citation reference
+        
+        Citations of collapsed near-duplicates return their canonical chunk.
+        """
+        chunks = self.chunks
+        row = chunks.find(document_name, chunk_id)
+        if row is None:
+            return None
+        return chunks.text_at(row)
+    
+    def reload(self, background: bool = True) -> Optional[threading.Thread]:
+        """Rebuild the index from documents_dir and swap it in atomically
+        
+        Searches keep using the current index while the new one is built. A
+        reload requested while one is running is skipped.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            print("Index reload already in progress")
+            return self._reload_thread
+        
+        def rebuild():
+            try:
+                start = time.perf_counter()
+                # Build into a separate retriever so the live one is never half-updated
+                builder = DocumentRetriever(
+                    documents_dir=self.documents_dir, shard_by=self.shard_by, index_path=self.index_path,
+                    index_backend=self.index_backend, dedup=self.dedup
+                )
+                builder._model = self._model
+                builder._model_lock = self._model_lock
+                builder.build_index(force_rebuild=True)
+                if self._model is None:
+                    self._model = builder._model
+                self._snapshot = replace(builder._snapshot, generation=self.generation + 1)
+                if self.reranker is not None:
+                    self.reranker.clear_cache()  # Scores are keyed by citation
+                self.timings['reload_s'] = time.perf_counter() - start
+                print(f"Swapped in index generation {self.generation} "
+                      f"({len(self.chunks)} chunks) in {self.timings['reload_s']:.2f}s")
+            except Exception as e:
+                print(f"Index reload failed, keeping generation {self.generation}: {e}")
+            finally:
+                self._reload_lock.release()
+        
+        if not background:
+            rebuild()
+            return None
+        self._reload_thread = threading.Thread(target=rebuild, name="index-reload", daemon=True)
+        self._reload_thread.start()
+        return self._reload_thread
+    
+    def _documents_signature(self) -> Tuple:
+        """(path, mtime, size) of every document, to detect corpus changes
+        
+        Paths are relative to documents_dir, so the signature saved with an
+        index does not depend on how the directory was spelled.
+        """
+        signature = []
+        for dirpath, _, filenames in os.walk(self.documents_dir):
+            for filename in sorted(filenames):
+                if filename.endswith('.txt'):
+                    path = os.path.join(dirpath, filename)
+                    stat = os.stat(path)
+                    signature.append((os.path.relpath(path, self.documents_dir), stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(signature))
+    
+    def watch(self, interval_s: float = 5.0) -> threading.Thread:
+        """Poll documents_dir and reload the index when documents change
+        
+        Changes are detected against the documents the current index was built
+        from, so edits made before watch() was called also trigger a reload.
+        """
+        if self._watcher is not None:
+            return self._watcher
+        last = self._snapshot.documents_signature or self._documents_signature()
+        
+        def poll():
+            nonlocal last
+            while not self._stop_watching.wait(interval_s):
+                try:
+                    current = self._documents_signature()
+                except OSError:
+                    continue  # Files moving mid-scan; retry next poll
+                if current != last and not self._reload_lock.locked():
+                    print("Documents changed, reloading index")
+                    last = current
+                    self.reload()
+        
+        self._watcher = threading.Thread(target=poll, name="documents-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+    
+    def stop_watching(self):
+        """Stop the documents_dir watcher"""
+        self._stop_watching.set()
+        self._watcher = None
 
 
-def initialize_retriever(force_rebuild: bool = False) -> DocumentRetriever:
-    """Initialize and return the document retriever"""
-    retriever = DocumentRetriever()
-    retriever.build_index(force_rebuild=force_rebuild)
+def initialize_retriever(force_rebuild: bool = False,
+                         use_reranker: bool = False,
+                         shard_by: Optional[str] = None,
+                         background: bool = False,
+                         watch: bool = False) -> DocumentRetriever:
+    """Initialize and return the document retriever
+    
+    With background=True the index loads in a thread and searches wait for it.
+    With watch=True the index is rebuilt and swapped in when documents change.
+    """
+    reranker = None
+    if use_reranker:
+        from retrieval.reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker()
+    retriever = DocumentRetriever.from_env(reranker=reranker, shard_by=shard_by)
+    if background:
+        retriever.build_index_async(force_rebuild=force_rebuild)
+    else:
+        retriever.build_index(force_rebuild=force_rebuild)
+    if watch:
+        retriever.watch()
     return retriever
\ No newline at end of file
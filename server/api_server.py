@@ -0,0 +1,416 @@
+"""
+Headless HTTP API for the Insurance Multi-Agent Copilot
+Pre-fork worker processes share one memory-mapped index
+
+Run:    python server/api_server.py --workers 4 --port 8000
+Stub:   COPILOT_STUB_LLM=1 python server/api_server.py   (no OpenAI calls)
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import sys
+import os
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+import traceback
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tokenizer thread pools do not survive fork()
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+from retrieval.retriever import DocumentRetriever
+from agents.copilot import create_copilot_system
+from agents.scheduler import CopilotScheduler, SchedulerFull
+
+
+MMAP_DIR = "./data/index_mmap"
+MAX_SEARCH_K = 100
+
+
+class BadRequest(ValueError):
+    """The request body is invalid; answered with 400"""
+
+
+class LatencyMetrics:
+    """Request-level latency metrics per route (per worker process)"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, status: int):
+        """Record one request"""
+        with self._lock:
+            self._latencies.setdefault(route, deque(maxlen=self.window)).append(seconds)
+            counts = self._counts.setdefault(route, {'requests': 0, 'errors': 0})
+            counts['requests'] += 1
+            if status >= 400:
+                counts['errors'] += 1
+
+    def snapshot(self) -> Dict:
+        """Counts and latency percentiles for every route"""
+        with self._lock:
+            report = {}
+            for route, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                report[route] = {
+                    **self._counts[route],
+                    'mean_s': sum(ordered) / len(ordered),
+                    'p50_s': _percentile(ordered, 0.50),
+                    'p95_s': _percentile(ordered, 0.95),
+                    'p99_s': _percentile(ordered, 0.99),
+                }
+            return report
+
+
+def _percentile(ordered, q: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _to_jsonable(obj):
+    """json.dumps fallback for results containing non-JSON values"""
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if hasattr(obj, 'item'):  # NumPy scalars
+        return obj.item()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+class CopilotAPIServer(ThreadingHTTPServer):
+    """HTTP server holding the per-process copilot system"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, retriever, scheduler_workers: int = 4):
+        super().__init__(address, CopilotRequestHandler)
+        self.retriever = retriever
+        self.scheduler_workers = scheduler_workers
+        self.copilot = None
+        self.scheduler = None
+        self.ready = threading.Event()
+        self.metrics = LatencyMetrics()
+
+    def start_worker(self):
+        """Per-process setup after fork: agents, scheduler threads, encoder warm-up"""
+        self.copilot = create_copilot_system(self.retriever)
+        self.scheduler = CopilotScheduler(self.copilot, max_workers=self.scheduler_workers)
+
+        def warm_up():
+            # Each worker loads the encoder itself: torch is not fork-safe once loaded
+            self.retriever.encode_queries(["warm up"])
+            self.ready.set()
+
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+class CopilotRequestHandler(BaseHTTPRequestHandler):
+    """Routes: /healthz /readyz /metrics /v1/run /v1/batch /v1/stream /v1/search"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch({
+            '/healthz': self._health,
+            '/readyz': self._ready,
+            '/metrics': self._metrics,
+        })
+
+    def do_POST(self):
+        self._dispatch({
+            '/v1/run': self._run,
+            '/v1/batch': self._batch,
+            '/v1/stream': self._stream,
+            '/v1/search': self._search,
+        })
+
+    def _dispatch(self, routes: Dict):
+        """Call the route handler, mapping errors to status codes and timing it
+
+        Invalid requests are 400 and scheduler rejections 503; any other
+        error, including one raised inside the copilot, is a 500.
+        """
+        route = self.path.split('?')[0]
+        start = time.perf_counter()
+        status = 500
+        try:
+            handler = routes.get(route)
+            if handler is None:
+                status = self._send_json(404, {'error': f"Unknown route {route}"})
+            elif route.startswith('/v1/') and not self.server.ready.is_set():
+                status = self._send_json(503, {'error': "Worker is warming up"})
+            else:
+                status = handler()
+        except BadRequest as e:
+            status = self._send_json(400, {'error': str(e)})
+        except SchedulerFull as e:
+            status = self._send_json(503, {'error': str(e)})
+        except Exception as e:
+            status = self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+        finally:
+            if route.startswith('/v1/'):
+                self.server.metrics.record(route, time.perf_counter() - start, status)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            raise BadRequest(f"Invalid JSON body: {e}")
+
+    def _send_json(self, status: int, payload) -> int:
+        body = json.dumps(payload, default=_to_jsonable).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    @staticmethod
+    def _require(body: Dict, *fields: str):
+        missing = [field for field in fields if not body.get(field)]
+        if missing:
+            raise BadRequest(f"Missing required field(s): {', '.join(missing)}")
+
+    @staticmethod
+    def _priority(body: Dict, default: int) -> int:
+        """Scheduler priority from a request body; must be an integer"""
+        priority = body.get('priority', default)
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            raise BadRequest(f"priority must be an integer, got {priority!r}")
+        return priority
+
+    @staticmethod
+    def _positive_int(body: Dict, field: str, default: int, maximum: int) -> int:
+        """Optional integer field in 1..maximum from a request body"""
+        value = body.get(field, default)
+        if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= maximum:
+            raise BadRequest(f"{field} must be an integer from 1 to {maximum}, got {value!r}")
+        return value
+
+    @staticmethod
+    def _string_list(body: Dict, field: str) -> Optional[List[str]]:
+        """Optional list-of-strings field from a request body"""
+        value = body.get(field)
+        if value is None:
+            return None
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise BadRequest(f"{field} must be a list of strings")
+        return value
+
+    def _health(self) -> int:
+        return self._send_json(200, {'status': 'ok', 'pid': os.getpid()})
+
+    def _ready(self) -> int:
+        ready = self.server.ready.is_set() and self.server.retriever.is_ready
+        return self._send_json(200 if ready else 503, {'ready': ready, 'pid': os.getpid()})
+
+    def _metrics(self) -> int:
+        client = self.server.retriever.embedding_client
+        return self._send_json(200, {
+            'pid': os.getpid(),
+            'routes': self.server.metrics.snapshot(),
+            'scheduler': self.server.scheduler.metrics() if self.server.scheduler else {},
+            'retriever_timings_s': self.server.retriever.timings,
+            'embedding_client': client.stats() if client else {},
+            'routing': self.server.copilot.router.stats() if self.server.copilot and self.server.copilot.router else {},
+        })
+
+    def _run(self) -> int:
+        body = self._read_json()
+        self._require(body, 'query', 'goal')
+        result = self.server.scheduler.run(body['query'], body['goal'], priority=self._priority(body, 0))
+        return self._send_json(200, result)
+
+    def _batch(self) -> int:
+        body = self._read_json()
+        requests = body.get('requests') or []
+        if not isinstance(requests, list) or not all(isinstance(request, dict) for request in requests):
+            raise BadRequest("requests must be a list of objects")
+        # Validate every request before queueing any of them
+        priorities = []
+        for request in requests:
+            self._require(request, 'query', 'goal')
+            priorities.append(self._priority(request, 1))
+        futures = [
+            self.server.scheduler.submit(request['query'], request['goal'], priority)
+            for request, priority in zip(requests, priorities)
+        ]
+        results = []
+        for future in futures:
+            try:
+                results.append({'result': future.result()})
+            except Exception as e:
+                results.append({'error': f"{type(e).__name__}: {e}"})
+        return self._send_json(200, {'results': results})
+
+    def _stream(self) -> int:
+        """Newline-delimited JSON: one event per finished agent node
+
+        The run is queued on the scheduler like /v1/run (without coalescing,
+        since each stream needs its own events) and observed like copilot.run.
+        """
+        body = self._read_json()
+        self._require(body, 'query', 'goal')
+        events = queue.Queue()
+
+        def call():
+            try:
+                return self.server.copilot.run_streaming(body['query'], body['goal'],
+                                                         lambda node, update: events.put((node, update)))
+            finally:
+                events.put(None)
+
+        # Raises SchedulerFull (503) before the response has started
+        future = self.server.scheduler.submit_call(None, call, priority=self._priority(body, 0))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_event(event: Dict):
+            data = json.dumps(event, default=_to_jsonable).encode('utf-8') + b'\n'
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+
+        start = time.perf_counter()
+        for node, update in iter(events.get, None):
+            write_event({'node': node, 'elapsed_s': time.perf_counter() - start, 'update': update})
+        try:
+            result = future.result()
+            write_event({'node': 'done', 'elapsed_s': time.perf_counter() - start, 'run_id': result['run_id']})
+        except Exception as e:
+            write_event({'node': 'error', 'error': f"{type(e).__name__}: {e}"})
+        self.wfile.write(b"0\r\n\r\n")
+        return 200
+
+    def _search(self) -> int:
+        body = self._read_json()
+        self._require(body, 'query')
+        results = self.server.retriever.search(
+            body['query'],
+            k=self._positive_int(body, 'k', 5, MAX_SEARCH_K),
+            documents=self._string_list(body, 'documents'),
+            # "auto" routes by keywords; anything else must be a list of category names
+            categories='auto' if body.get('categories') == 'auto' else self._string_list(body, 'categories')
+        )
+        return self._send_json(200, {'results': results})
+
+    def log_message(self, format, *args):
+        pass  # Request logs go through /metrics instead of stderr
+
+
+def prepare_index(force_rebuild: bool, shard_by: str = None):
+    """Build or load the pickled index and export it for memory-mapping
+
+    Uses the environment's retriever settings (COPILOT_DEDUP, ...), like
+    initialize_retriever, so the app and the server share one pickled index.
+    """
+    retriever = DocumentRetriever.from_env(shard_by=shard_by)
+    retriever.build_index(force_rebuild=force_rebuild)
+    meta_path = os.path.join(MMAP_DIR, "meta.json")
+    current = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+            current = (meta.get('index_version'), meta.get('shard_by'))
+    if current != (retriever.index_version, shard_by):
+        retriever.save_mmap(MMAP_DIR)
+
+
+def prepare_index_in_child(force_rebuild: bool, shard_by: str = None):
+    """Run prepare_index in a child process, so the parent never loads the encoder
+
+    Building the index loads torch, whose thread pools do not survive fork().
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            prepare_index(force_rebuild, shard_by)
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit("Preparing the index failed")
+
+
+def serve(args):
+    """Prepare the shared index, bind the socket, then fork workers"""
+    prepare_index_in_child(args.rebuild, args.shard_by)
+
+    # Workers map the exported index and load the encoder after fork (see start_worker)
+    retriever = DocumentRetriever.from_env()
+    retriever.load_mmap(MMAP_DIR)
+
+    server = CopilotAPIServer((args.host, args.port), retriever, scheduler_workers=args.threads)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} worker process(es)")
+
+    if args.workers <= 1:
+        server.start_worker()
+        server.serve_forever()
+        return
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+            server.start_worker()
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        try:
+            os.waitpid(child, 0)
+        except ChildProcessError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copilot HTTP API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("COPILOT_API_WORKERS", "2")),
+                        help="Worker processes sharing the listening socket")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="Scheduler threads per worker process")
+    parser.add_argument("--shard-by", default=None, choices=[None, "category"])
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from documents")
+    args = parser.parse_args()
+    serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from retrieval.adaptive_depth import AdaptiveDepthPolicy
+
+
+def hit(name: str, score: float, text: str = "x" * 400):
+    return {'citation': f"[{name}, chunk_0]", 'relevance_score': score, 'text': text}
+
+
+def citations(results):
+    return [result['citation'] for result in results]
+
+
+def test_floor_drops_weak_hits():
+    policy = AdaptiveDepthPolicy(min_relevance=0.4)
+    assert policy.cut([hit("a", 0.3), hit("b", 0.2)]) == []
+    assert citations(policy.cut([hit("a", 0.5), hit("b", 0.3)])) == ["[a, chunk_0]"]
+
+
+def test_cut_at_largest_gap():
+    policy = AdaptiveDepthPolicy(min_relevance=0.4, min_gap=0.03)
+    results = [hit("a", 0.80), hit("b", 0.78), hit("c", 0.55), hit("d", 0.53)]
+    assert citations(policy.cut(results)) == ["[a, chunk_0]", "[b, chunk_0]"]
+
+
+def test_no_cut_when_scores_are_flat():
+    policy = AdaptiveDepthPolicy(min_relevance=0.4, min_gap=0.03)
+    results = [hit("a", 0.60), hit("b", 0.59), hit("c", 0.58)]
+    assert len(policy.cut(results)) == 3
+
+
+def test_cut_ignores_reranker_order():
+    policy = AdaptiveDepthPolicy(min_relevance=0.4, min_gap=0.03)
+    results = [hit("b", 0.78), hit("c", 0.55), hit("a", 0.80)]
+    assert citations(policy.cut(results)) == ["[b, chunk_0]", "[a, chunk_0]"]
+
+
+def test_max_k():
+    policy = AdaptiveDepthPolicy(max_k=2, min_relevance=0.0, min_gap=1.0)
+    assert len(policy.cut([hit(str(i), 0.5) for i in range(5)])) == 2
+
+
+def test_budget_caps_chunks_and_tokens():
+    policy = AdaptiveDepthPolicy(min_relevance=0.0, min_gap=1.0, max_chunks=8, max_tokens=250)
+    budget = policy.new_budget()
+    accepted = budget.offer([hit(str(i), 0.5) for i in range(5)], set())  # 100 tokens each
+    assert len(accepted) == 2
+    assert budget.exhausted() is False
+    assert budget.summary() == {'chunks': 2, 'tokens': 200, 'chunks_saved': 3, 'tokens_saved': 300}
+
+
+def test_saturation_patience():
+    policy = AdaptiveDepthPolicy(min_relevance=0.0, saturation_patience=2)
+    budget = policy.new_budget()
+    seen = set()
+    budget.offer([hit("a", 0.5)], seen)
+    budget.offer([hit("a", 0.5)], seen)
+    assert not budget.exhausted()  # One stale query is not saturation
+    budget.offer([hit("b", 0.5)], seen)
+    assert not budget.exhausted()  # New chunks reset the count
+    budget.offer([hit("a", 0.5)], seen)
+    budget.offer([hit("b", 0.5)], seen)
+    assert budget.exhausted()
+
+
+def test_empty_queries_before_any_notes_are_not_stale():
+    budget = AdaptiveDepthPolicy(min_relevance=0.4, saturation_patience=1).new_budget()
+    budget.offer([hit("a", 0.1)], set())
+    assert not budget.exhausted()
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("COPILOT_MIN_RELEVANCE", "0.55")
+    monkeypatch.setenv("COPILOT_SATURATION_PATIENCE", "3")
+    policy = AdaptiveDepthPolicy.from_env()
+    assert (policy.min_relevance, policy.saturation_patience) == (0.55, 3)
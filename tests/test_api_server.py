@@ -0,0 +1,93 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from agents.scheduler import CopilotScheduler, SchedulerFull
+from server.api_server import CopilotAPIServer
+
+
+class FakeRetriever:
+    embedding_client = None
+    timings = {}
+    is_ready = True
+
+    def search(self, query, k=5, documents=None, categories=None):
+        return [{'query': query, 'rank': rank} for rank in range(k)]
+
+
+class FakeCopilot:
+    router = None
+
+    def run(self, user_query, user_goal):
+        raise ValueError("bad state inside an agent")
+
+    def run_streaming(self, user_query, user_goal, on_update, profile=None):
+        on_update("planner", {'plan': "1. Look it up"})
+        return {'run_id': "run-1"}
+
+
+class FullScheduler:
+    def run(self, *args, **kwargs):
+        raise SchedulerFull("Copilot is at capacity, please retry shortly")
+
+
+@pytest.fixture
+def server():
+    server = CopilotAPIServer(("127.0.0.1", 0), FakeRetriever())
+    server.copilot = FakeCopilot()
+    scheduler = server.scheduler = CopilotScheduler(server.copilot, max_workers=1)
+    server.ready.set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    scheduler.shutdown()
+
+
+def post(server, route: str, body):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}{route}",
+                                     data=json.dumps(body).encode('utf-8'), method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+
+@pytest.mark.parametrize("k", [0, -1, "5", True, 1.5, 101])
+def test_search_rejects_bad_k(server, k):
+    status, _ = post(server, "/v1/search", {'query': "deductible", 'k': k})
+    assert status == 400
+
+
+def test_search(server):
+    status, body = post(server, "/v1/search", {'query': "deductible", 'k': 3})
+    assert status == 200
+    assert len(json.loads(body)['results']) == 3
+
+
+def test_missing_fields_are_bad_requests(server):
+    assert post(server, "/v1/run", {'query': "deductible"})[0] == 400
+
+
+def test_errors_inside_the_copilot_are_server_errors(server):
+    status, body = post(server, "/v1/run", {'query': "q", 'goal': "g"})
+    assert status == 500
+    assert "bad state inside an agent" in json.loads(body)['error']
+
+
+def test_scheduler_rejection_is_unavailable(server):
+    server.scheduler = FullScheduler()
+    assert post(server, "/v1/run", {'query': "q", 'goal': "g"})[0] == 503
+
+
+def test_stream_runs_through_the_scheduler(server):
+    status, body = post(server, "/v1/stream", {'query': "q", 'goal': "g"})
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [event['node'] for event in events] == ["planner", "done"]
+    assert events[-1]['run_id'] == "run-1"
+    assert server.scheduler.metrics()['completed'] == 1
@@ -0,0 +1,89 @@
+import json
+import pickle
+
+import pytest
+
+from agents.copilot import plain_result
+from retrieval.chunk_store import ChunkRef, ChunkStore
+from retrieval.retriever import DocumentChunk
+
+
+def chunk(document: str, chunk_id: int, text: str) -> DocumentChunk:
+    return DocumentChunk(text=text, document_name=document, chunk_id=chunk_id,
+                         start_char=chunk_id * 100, end_char=chunk_id * 100 + len(text))
+
+
+@pytest.fixture
+def store():
+    return ChunkStore.from_chunks([
+        chunk("auto.txt", 0, "Collision coverage pays for damage to your car."),
+        chunk("auto.txt", 1, "Premiums depend on driving record — and location."),
+        chunk("home.txt", 0, "Dwelling coverage protects the structure."),
+    ])
+
+
+def test_views(store):
+    assert len(store) == 3
+    view = store[1]
+    assert view.text == "Premiums depend on driving record — and location."
+    assert view.citation == "[auto.txt, chunk_1]"
+    assert (view.start_char, view.end_char) == (100, 100 + len(view.text))
+    assert store[-1].document_name == "home.txt"
+    assert [view.chunk_id for view in store] == [0, 1, 0]
+    with pytest.raises(IndexError):
+        store[3]
+
+
+def test_lookup(store):
+    assert store.find("home.txt", 0) == 2
+    assert store.find("home.txt", 5) is None
+    assert store.find("life.txt", 0) is None
+    assert list(store.rows_for_documents(["auto.txt"])) == [0, 1]
+
+
+def test_chunk_ref_reads_like_a_note(store):
+    ref = ChunkRef(store, 2, 0.75, "dwelling")
+    assert ref['text'] == "Dwelling coverage protects the structure."
+    assert ref['citation'] == "[home.txt, chunk_0]"
+    assert ref.get('relevance') == 0.75
+    assert ref.get('missing', 'default') == 'default'
+    with pytest.raises(KeyError):
+        ref['missing']
+    assert ref.to_dict() == {
+        'text': "Dwelling coverage protects the structure.",
+        'citation': "[home.txt, chunk_0]",
+        'document': "home.txt",
+        'chunk_id': 0,
+        'relevance': 0.75,
+        'query': "dwelling",
+    }
+
+
+def test_plain_result_is_serializable(store):
+    notes = [ChunkRef(store, 0, 0.9, "collision"), ChunkRef(store, 2, 0.5, "dwelling")]
+    result = {'research_notes': notes, 'final_output': {'sources': notes, 'email': "Dear client"}}
+    plain = plain_result(result)
+    assert plain['research_notes'] == [note.to_dict() for note in notes]
+    assert plain['final_output']['sources'] is plain['research_notes']
+    assert plain['final_output']['email'] == "Dear client"
+    assert result['research_notes'] is notes  # The result itself keeps its refs
+    json.dumps(plain)
+
+
+def test_pickle_round_trip(store):
+    loaded = pickle.loads(pickle.dumps(store))
+    assert [view.citation for view in loaded] == [view.citation for view in store]
+    assert loaded.texts() == store.texts()
+    assert loaded.find("home.txt", 0) == 2
+
+
+def test_pickle_from_before_alternates(store):
+    # Stores pickled before near-duplicate collapsing have no alternate arrays
+    state = store.__getstate__()
+    for name in ('alt_offsets', 'alt_doc_ids', 'alt_chunk_ids'):
+        del state[name]
+    old = ChunkStore.__new__(ChunkStore)
+    old.__setstate__(state)
+    assert old.num_alternates == 0
+    assert old.alternate_citations(1) == []
+    assert list(old.rows_for_documents(["home.txt"])) == [2]
@@ -0,0 +1,96 @@
+import pytest
+
+from agents.conversation import EDIT, RESEARCH, ConversationState, classify_follow_up
+
+
+DELIVERABLE = """## Executive Summary
+Homeowners policies cover wind and hail damage after the deductible [homeowners_policy.md:1].
+
+## Email
+Dear client, your claim for roof damage is covered subject to your deductible.
+
+## Action List
+1. Schedule an inspection of the roof"""
+
+NOTE = {
+    'text': "Wind and hail damage to the dwelling is covered after the deductible.",
+    'citation': "homeowners_policy.md:1",
+    'document': "homeowners_policy.md",
+    'chunk_id': 1,
+    'relevance': 0.8,
+    'query': "roof damage coverage",
+}
+
+
+def start_result():
+    return {
+        'plan': "1. Check coverage",
+        'research_notes': [NOTE],
+        'final_output': {'full_deliverable': DELIVERABLE, 'sources': [NOTE]},
+        'verification_result': {'passed': True, 'report': "VERIFICATION: PASS"},
+        'index_generation': 0,
+    }
+
+
+@pytest.fixture
+def conversation():
+    return ConversationState.from_result("Is my roof damage from the storm covered?",
+                                         "Write an email to the client", start_result())
+
+
+@pytest.mark.parametrize("message", [
+    "now make the email shorter",
+    "make the email shorter",
+    "turn it into a checklist",
+    "rewrite it for an adjuster",
+    "make it more empathetic",
+    "Make the tone friendlier, please",
+])
+def test_edits(conversation, message):
+    assert classify_follow_up(message, conversation) == (EDIT, [])
+
+
+@pytest.mark.parametrize("message, novel", [
+    ("what about for commercial auto?", ["auto", "commercial"]),
+    ("Does this apply to flood damage?", ["apply", "flood"]),
+])
+def test_research(conversation, message, novel):
+    assert classify_follow_up(message, conversation) == (RESEARCH, novel)
+
+
+def test_topics_of_earlier_turns_are_known(conversation):
+    later = conversation.after_follow_up("what about flood?", {
+        'research_notes': [NOTE],
+        'draft_output': {'full_text': DELIVERABLE},
+        'verification_result': {'passed': True, 'report': ""},
+        'index_generation': 0,
+    })
+    assert classify_follow_up("make the flood part shorter", later) == (EDIT, [])
+
+
+@pytest.fixture
+def copilot(monkeypatch):
+    monkeypatch.setenv("COPILOT_STUB_LLM", "1")
+    monkeypatch.delenv("COPILOT_QUERY_LOG", raising=False)
+    from agents.copilot import InsuranceCopilotSystem
+    copilot = InsuranceCopilotSystem(retriever=object())
+    copilot.start_conversation("c", "Is my roof damage from the storm covered?",
+                               "Write an email to the client", start_result())
+    return copilot
+
+
+def test_edit_follow_up_carries_verification_over(copilot):
+    result = copilot.follow_up("c", "now make the email shorter", profile=False)
+    assert result['follow_up']['kind'] == EDIT
+    assert result['verification_result']['carried_over']
+    assert result['verification_result']['passed']
+
+
+def test_research_without_new_evidence_is_unverified(copilot):
+    copilot.researcher.retrieve_delta = lambda queries, known_notes: {
+        'new_research_notes': [], 'index_generation': 0, 'trace_log': []
+    }
+    result = copilot.follow_up("c", "what about commercial auto?", profile=False)
+    assert result['follow_up'] == {'message': "what about commercial auto?", 'kind': EDIT, 'new_chunks': 0}
+    assert result['verification_result']['unverified']
+    assert not result['verification_result']['passed']
@@ -0,0 +1,102 @@
+import pickle
+import random
+
+import numpy as np
+
+from retrieval.chunk_store import ChunkStore
+from retrieval.dedup import find_near_duplicates, mmr_select, simhash
+from retrieval.retriever import DocumentChunk, DocumentRetriever
+
+
+BASE = ("The policyholder must report any loss to the company within thirty days and provide "
+        "proof of loss, receipts and photographs of the damaged property before payment is made")
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def random_text(rng: random.Random, words: int = 40) -> str:
+    vocabulary = [f"word{i}" for i in range(500)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def test_simhash_is_case_and_whitespace_insensitive():
+    assert simhash(BASE) == simhash("  " + BASE.upper().replace(" ", "\n"))
+
+
+def test_simhash_distance_tracks_similarity():
+    rng = random.Random(0)
+    edited = BASE.replace("thirty", "sixty")
+    assert distance(simhash(BASE), simhash(edited)) < distance(simhash(BASE), simhash(random_text(rng)))
+
+
+def test_find_near_duplicates():
+    rng = random.Random(1)
+    texts = [BASE, random_text(rng), BASE + " ", random_text(rng), BASE.lower()]
+    assert find_near_duplicates(texts) == [0, 1, 0, 3, 0]
+
+
+def test_duplicates_point_at_canonical_rows():
+    rng = random.Random(2)
+    texts = [random_text(rng, 30) for _ in range(20)]
+    # Chains of one-word edits
+    for _ in range(40):
+        words = rng.choice(texts).split()
+        words[rng.randrange(len(words))] = f"edit{rng.randrange(1000)}"
+        texts.append(" ".join(words))
+    canonical = find_near_duplicates(texts, max_distance=8)
+    # Never a duplicate of a duplicate
+    assert all(canonical[canonical[row]] == canonical[row] for row in range(len(texts)))
+    assert all(canonical[row] <= row for row in range(len(texts)))
+
+
+def test_collapse_keeps_alternates():
+    chunks = [
+        DocumentChunk(BASE, "auto.txt", 0, 0, len(BASE)),
+        DocumentChunk("Collision coverage pays for damage to your own car.", "auto.txt", 1, 0, 10),
+        DocumentChunk(BASE, "home.txt", 3, 0, len(BASE)),
+    ]
+    kept, alternates = DocumentRetriever()._collapse_duplicates(chunks)
+    assert [(chunk.document_name, chunk.chunk_id) for chunk in kept] == [("auto.txt", 0), ("auto.txt", 1)]
+    assert [(chunk.document_name, chunk.chunk_id) for chunk in alternates[0]] == [("home.txt", 3)]
+
+
+def store_with_alternates() -> ChunkStore:
+    chunks = [
+        DocumentChunk(BASE, "auto.txt", 0, 0, len(BASE)),
+        DocumentChunk("Collision coverage pays for damage to your own car.", "auto.txt", 1, 0, 10),
+    ]
+    return ChunkStore.from_chunks(chunks, {0: [DocumentChunk(BASE, "home.txt", 3, 0, len(BASE)),
+                                               DocumentChunk(BASE, "life.txt", 7, 0, len(BASE))]})
+
+
+def test_alternates_in_the_store():
+    store = store_with_alternates()
+    assert store.num_alternates == 2
+    assert store[0].alternate_citations == ["[home.txt, chunk_3]", "[life.txt, chunk_7]"]
+    assert store.alternate_citations(1) == []
+    # A collapsed citation resolves to its canonical row, and filters match it
+    assert store.find("life.txt", 7) == 0
+    assert list(store.rows_for_documents(["home.txt"])) == [0]
+    assert list(store.rows_for_documents(["home.txt", "auto.txt"])) == [0, 1]
+
+
+def test_alternates_survive_pickling():
+    store = pickle.loads(pickle.dumps(store_with_alternates()))
+    assert store[0].alternate_citations == ["[home.txt, chunk_3]", "[life.txt, chunk_7]"]
+    assert store.find("home.txt", 3) == 0
+
+
+def test_mmr_prefers_diverse_results():
+    relevance = np.array([0.9, 0.89, 0.5])
+    embeddings = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+    assert mmr_select(relevance, embeddings, k=2, lambda_=0.5) == [0, 2]
+    # lambda_=1 is plain relevance order
+    assert mmr_select(relevance, embeddings, k=3, lambda_=1.0) == [0, 1, 2]
+
+
+def test_mmr_edge_cases():
+    assert mmr_select(np.array([0.3]), np.ones((1, 2)), k=5) == [0]
+    assert mmr_select(np.array([0.3, 0.2]), np.ones((2, 2)), k=0) == []
+    assert sorted(mmr_select(np.full(3, 0.5), np.eye(3), k=3)) == [0, 1, 2]
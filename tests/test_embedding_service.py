@@ -0,0 +1,118 @@
+import sys
+import tempfile
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from retrieval.embedding_service import EmbeddingClient, EmbeddingServer, EmbeddingServiceUnavailable
+
+
+class FakeSentenceTransformer:
+    """Embeds a text as [len(text), index of its first character]; records batch sizes"""
+    calls = []
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def encode(self, texts, show_progress_bar=False, batch_size=32):
+        FakeSentenceTransformer.calls.append(len(texts))
+        if any(text == "fail" for text in texts):
+            raise RuntimeError("encoder failed")
+        return np.array([[len(text), ord(text[0]) if text else 0] for text in texts], dtype='float32')
+
+
+@pytest.fixture
+def make_server(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    FakeSentenceTransformer.calls = []
+    servers = []
+
+    def make(**options):
+        # Unix socket paths are limited to ~100 characters, so avoid pytest's long tmp_path
+        path = f"{tempfile.mkdtemp(prefix='embed-')}/embed.sock"
+        server = EmbeddingServer(path, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def expected(texts):
+    return np.array([[len(text), ord(text[0])] for text in texts], dtype='float32')
+
+
+def test_encode(make_server):
+    server = make_server()
+    client = EmbeddingClient(server.socket_path)
+    texts = ["hail damage", "flood"]
+    assert np.array_equal(client.encode(texts), expected(texts))
+    assert client.stats()['requests'] == 1
+
+
+def test_concurrent_requests_are_batched(make_server):
+    server = make_server(batch_window_s=0.2)
+    client = EmbeddingClient(server.socket_path)
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def encode(i):
+        texts = [f"{chr(97 + i)} query {'x' * i}"]
+        barrier.wait(5)
+        results[i] = (texts, client.encode(texts))
+
+    threads = [threading.Thread(target=encode, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every caller gets its own rows back
+    for texts, embeddings in results.values():
+        assert np.array_equal(embeddings, expected(texts))
+    metrics = client.server_metrics()
+    assert metrics['requests'] == 8 and metrics['texts'] == 8
+    assert metrics['batches'] < 8
+    assert sum(FakeSentenceTransformer.calls) == 8
+
+
+def test_batches_respect_max_batch(make_server):
+    server = make_server(max_batch=4, batch_window_s=0.2)
+    requests = [server.submit([f"text {i}"]) for i in range(10)]
+    for request in requests:
+        assert request.done.wait(5)
+    assert max(FakeSentenceTransformer.calls) <= 4
+    assert sum(FakeSentenceTransformer.calls) == 10
+
+
+def test_encode_errors_reach_the_batch(make_server):
+    server = make_server(batch_window_s=0.1)
+    failing, other = server.submit(["fail"]), server.submit(["fine"])
+    for request in (failing, other):
+        assert request.done.wait(5)
+        assert request.error == "RuntimeError: encoder failed"
+    assert server.metrics()['errors'] == 2
+
+
+def test_wrong_model_marks_the_service_down(make_server):
+    server = make_server()
+    client = EmbeddingClient(server.socket_path, model_name="other-model", retry_interval_s=60)
+    with pytest.raises(EmbeddingServiceUnavailable):
+        client.encode(["hail"])
+    with pytest.raises(EmbeddingServiceUnavailable, match="marked down"):
+        client.encode(["hail"])
+    stats = client.stats()
+    assert stats['failures'] == 1 and stats['fallbacks'] == 2 and not stats['available']
+
+
+def test_missing_service_is_unavailable():
+    client = EmbeddingClient(f"{tempfile.mkdtemp(prefix='embed-')}/missing.sock")
+    with pytest.raises(EmbeddingServiceUnavailable):
+        client.encode(["hail"])
@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+
+from observability.profiling import ProfileSession, profile_block
+
+
+def busy(n: int = 20000) -> int:
+    return sum(i * i for i in range(n))
+
+
+def test_concurrent_cprofile_spans(tmp_path):
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def worker(session):
+        try:
+            with session.span("worker"):
+                barrier.wait(timeout=5)  # Both spans are open at once
+                busy()
+                barrier.wait(timeout=5)
+        except Exception as e:
+            errors.append(e)
+
+    with ProfileSession("run", output_dir=str(tmp_path), trace_memory=False) as session:
+        threads = [threading.Thread(target=worker, args=(session,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    assert [span['name'] for span in session.spans] == ["worker", "worker"]
+    # Exactly one of the overlapping spans held the profiler
+    assert os.path.exists(tmp_path / "run" / "profile.pstats")
+
+
+def test_nested_span_records_timing(tmp_path):
+    with ProfileSession("run", output_dir=str(tmp_path), trace_memory=False) as session:
+        with profile_block("outer"):
+            with profile_block("inner"):
+                busy()
+
+    with open(tmp_path / "run" / "spans.json", encoding="utf-8") as f:
+        names = [span['name'] for span in json.load(f)['spans']]
+    assert names == ["outer", "inner"]
+
+
+def test_profiler_is_released_after_span(tmp_path):
+    for run_id in ("first", "second"):
+        with ProfileSession(run_id, output_dir=str(tmp_path), trace_memory=False) as session:
+            with session.span("step"):
+                busy()
+        assert os.path.exists(tmp_path / run_id / "profile.pstats")
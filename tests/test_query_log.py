@@ -0,0 +1,32 @@
+import json
+import time
+
+from observability.query_log import QueryLogger, arrival_time, read_query_log
+
+
+def test_run_is_logged_at_its_start(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+    logger = QueryLogger(path)
+    started_at = time.time() - 5.0
+    logger.log_run("q", "g", {'trace_log': []}, 5.0, run_id="run-1", started_at=started_at)
+    logger.log_run("q", "g", None, 1.0, error=ValueError("boom"), run_id="run-2")
+
+    first, second = read_query_log(path)
+    assert first['ts'] == started_at
+    assert first['end_ts'] - first['ts'] >= 5.0
+    assert arrival_time(first) == started_at
+    assert second['error'] == "ValueError: boom"
+    assert abs((second['end_ts'] - second['ts']) - 1.0) < 1e-6
+
+
+def test_arrival_time_of_logs_that_recorded_the_end(tmp_path):
+    # Older records have only ts, written when the run finished
+    assert arrival_time({'ts': 100.0, 'total_s': 4.0}) == 96.0
+
+
+def test_text_can_be_hashed(tmp_path):
+    path = str(tmp_path / "hashed.jsonl")
+    QueryLogger(path, include_text=False).log_run("secret query", "goal", None, 0.1)
+    with open(path, encoding="utf-8") as f:
+        record = json.loads(f.readline())
+    assert 'query' not in record and len(record['query_hash']) == 16
@@ -0,0 +1,67 @@
+import importlib
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how often the query words occur in the text"""
+    delay = 0.0
+
+    def __init__(self, model_name, device=None):
+        self.model_name = model_name
+
+    def predict(self, pairs, batch_size=16, show_progress_bar=False):
+        time.sleep(self.delay)
+        return [float(sum(text.count(word) for word in query.split())) for query, text in pairs]
+
+
+@pytest.fixture
+def reranker_module(monkeypatch):
+    module = types.ModuleType("sentence_transformers")
+    module.CrossEncoder = FakeCrossEncoder
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    monkeypatch.delitem(sys.modules, "retrieval.reranker", raising=False)
+    yield importlib.import_module("retrieval.reranker")
+    sys.modules.pop("retrieval.reranker", None)
+
+
+def candidates(n: int):
+    # Vector order puts the best texts last
+    return [{'citation': f"[doc.txt, chunk_{i}]", 'text': "hail " * i} for i in range(n)]
+
+
+def test_rerank_orders_by_score(reranker_module):
+    reranker = reranker_module.CrossEncoderReranker()
+    results = reranker.rerank("hail", candidates(5), k=3)
+    assert [result['citation'] for result in results] == [f"[doc.txt, chunk_{i}]" for i in (4, 3, 2)]
+    assert reranker.stats == {'queries': 1, 'fallbacks': 0, 'cache_hits': 0, 'scored_pairs': 5}
+    reranker.rerank("hail", candidates(5), k=3)
+    assert reranker.stats['cache_hits'] == 5
+
+
+def test_timeout_reranks_the_scored_prefix(reranker_module):
+    reranker = reranker_module.CrossEncoderReranker(batch_size=2)
+    FakeCrossEncoder.delay = 0.05
+    try:
+        results = reranker.rerank("hail", candidates(6), k=4, time_budget=0.01)
+    finally:
+        FakeCrossEncoder.delay = 0.0
+    # Only the first batch was scored; the rest follow in vector order
+    assert [result['citation'] for result in results] == [f"[doc.txt, chunk_{i}]" for i in (1, 0, 2, 3)]
+    assert reranker.stats['fallbacks'] == 1
+
+
+def test_stats_are_consistent_across_threads(reranker_module):
+    reranker = reranker_module.CrossEncoderReranker(cache_size=0)
+    threads = [threading.Thread(target=lambda: [reranker.rerank("hail", candidates(4), k=2) for _ in range(50)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert reranker.stats['queries'] == 400
+    assert reranker.stats['scored_pairs'] + reranker.stats['cache_hits'] == 1600
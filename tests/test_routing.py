@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from agents.routing import AgentRoute, ModelRouter, ModelTier, query_complexity
+
+
+SIMPLE = ("What is a deductible?", "Email")
+COMPLEX = ("Compare the flood and earthquake exclusions, explain why each applies, and analyze "
+           "the impact on premiums for both homeowners and renters; what are the trade-offs?",
+           "Write a step-by-step analysis for the underwriting team")
+
+
+class FakeScheduler:
+    def __init__(self, depth: int):
+        self.depth = depth
+
+    def queue_depth(self) -> int:
+        return self.depth
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(slo_s=30.0)
+
+
+def route(router, agent: str, request, prompt_tokens: int = 1000):
+    with router.request(*request):
+        decision = router.route(agent, prompt_tokens)
+    router.record(decision, {'latency_s': 1.0, 'prompt_tokens': prompt_tokens, 'completion_tokens': 100})
+    return decision
+
+
+def test_complexity():
+    assert query_complexity(*SIMPLE) < 0.2
+    assert query_complexity(*COMPLEX) >= 0.7
+    assert 0.0 <= query_complexity("", "") <= 1.0
+
+
+def test_simple_requests_stay_on_the_preferred_tier(router):
+    assert route(router, 'writer', SIMPLE).tier == "fast"
+
+
+def test_complex_requests_upgrade(router):
+    decision = route(router, 'writer', COMPLEX)
+    assert decision.tier == "quality"
+    assert decision.reasons[0].startswith("complexity")
+    assert router.stats()['upgrades'] == 1
+
+
+def test_max_tier_caps_upgrades():
+    router = ModelRouter(routes={'writer': AgentRoute(preferred="fast", max_tier="fast")})
+    assert route(router, 'writer', COMPLEX).tier == "fast"
+
+
+def test_load_downgrades(router):
+    router.attach(FakeScheduler(depth=10))
+    decision = route(router, 'writer', COMPLEX)
+    assert decision.tier == "fast"
+    assert any(reason.startswith("load") for reason in decision.reasons)
+    assert router.stats()['load_downgrades'] == 1
+
+
+def test_slo_downgrades():
+    router = ModelRouter(slo_s=4.0)
+    decision = route(router, 'writer', COMPLEX)  # Quality expects ~3.85s > 55% of 4s
+    assert decision.tier == "fast"
+    assert any(reason.startswith("slo") for reason in decision.reasons)
+
+
+def test_prompt_too_large_for_a_tier_moves_up():
+    tiers = [ModelTier("small", "small-model", 0.1, 0.1, 1.0, max_prompt_tokens=2000),
+             ModelTier("large", "large-model", 1.0, 1.0, 2.0)]
+    router = ModelRouter(tiers, routes={'writer': AgentRoute("small", "small", "large", slo_share=1.0)})
+    assert route(router, 'writer', SIMPLE, prompt_tokens=5000).tier == "large"
+    assert route(router, 'writer', SIMPLE, prompt_tokens=500).tier == "small"
+
+
+def test_record_tracks_cost_inflight_and_latency(router):
+    decision = router.route('planner', 1000)
+    assert router.stats()['inflight'] == 1
+    fields = router.record(decision, {'latency_s': 2.0, 'prompt_tokens': 1000, 'completion_tokens': 500})
+    stats = router.stats()
+    assert fields == {'model': "gpt-4o-mini", 'tier': "fast", 'route_reasons': []}
+    assert stats['inflight'] == 0
+    assert stats['cost_usd'] == pytest.approx((1000 * 0.15 + 500 * 0.60) / 1e6)
+    assert stats['latency_s'] == {'planner/gpt-4o-mini': 2.0}
+
+
+def test_failed_calls_release_inflight(router):
+    decision = router.route('verifier', 100)
+    router.record(decision, error=TimeoutError("slow"))
+    assert decision.outcome == {'error': "TimeoutError: slow"}
+    assert router.stats()['inflight'] == 0
+
+
+def test_observed_latency_replaces_the_profile(router):
+    for _ in range(router.min_samples):
+        router.record(router.route('writer', 100), {'latency_s': 9.0, 'prompt_tokens': 100})
+    assert router.expected_latency('writer', router.tiers[0], 100) == pytest.approx(9.0)
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv("COPILOT_ROUTING", raising=False)
+    monkeypatch.delenv("COPILOT_ROUTING_CONFIG", raising=False)
+    assert ModelRouter.from_env() is None
+
+    config = tmp_path / "routing.json"
+    config.write_text(json.dumps({'routes': {'writer': {'preferred': "quality", 'min_tier': "fast",
+                                                        'max_tier': "quality"}}, 'slo_s': 12}))
+    monkeypatch.setenv("COPILOT_ROUTING_CONFIG", str(config))
+    router = ModelRouter.from_env()
+    assert router.slo_s == 12
+    assert router.routes['writer'].preferred == "quality"
+    assert router.routes['planner'].preferred == "fast"  # Unlisted agents keep the defaults
@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from agents.scheduler import CopilotScheduler, SchedulerFull
+
+
+class FakeCopilot:
+    router = None
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def run(self, user_query, user_goal):
+        with self.lock:
+            self.calls += 1
+        return {'query': user_query, 'goal': user_goal}
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = CopilotScheduler(FakeCopilot(), max_workers=1, max_queue=4)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def block_worker(scheduler):
+    """Occupy the single worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit_call(None, hold)
+    assert started.wait(5)
+    return release
+
+
+def test_run(scheduler):
+    assert scheduler.run("q", "g", timeout=5) == {'query': "q", 'goal': "g"}
+
+
+def test_identical_requests_share_one_execution(scheduler):
+    release = block_worker(scheduler)
+    first = scheduler.submit("What is covered?", "Email")
+    second = scheduler.submit(" What is covered? ", "Email ")
+    release.set()
+    assert first is not second
+    assert first.result(5) == second.result(5)
+    assert scheduler.copilot.calls == 1
+    assert scheduler.metrics()['coalesced'] == 1
+
+
+def test_cancelling_one_caller_keeps_the_execution(scheduler):
+    release = block_worker(scheduler)
+    first = scheduler.submit("q", "g")
+    second = scheduler.submit("q", "g")
+    assert first.cancel()
+    release.set()
+    assert second.result(5) == {'query': "q", 'goal': "g"}
+    assert first.cancelled()
+    assert scheduler.copilot.calls == 1
+    assert scheduler.metrics()['cancelled'] == 1
+
+
+def test_execution_is_skipped_when_every_caller_cancels(scheduler):
+    release = block_worker(scheduler)
+    futures = [scheduler.submit("q", "g") for _ in range(2)]
+    assert all(future.cancel() for future in futures)
+    release.set()
+    scheduler.run("other", "g", timeout=5)  # Runs after the cancelled call
+    assert scheduler.copilot.calls == 1
+    assert scheduler.metrics()['cancelled'] == 2
+
+
+def test_caller_joining_a_started_call_cannot_cancel(scheduler):
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    first = scheduler.submit_call("key", slow)
+    assert started.wait(5)
+    second = scheduler.submit_call("key", slow)
+    assert not second.cancel()
+    release.set()
+    assert first.result(5) == second.result(5) == "done"
+
+
+def test_priority_order(scheduler):
+    release = block_worker(scheduler)
+    order = []
+    futures = [scheduler.submit_call(None, lambda name=name: order.append(name), priority)
+               for name, priority in (("low", 5), ("high", 0), ("mid", 1))]
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ["high", "mid", "low"]
+
+
+def test_full_queue_is_rejected(scheduler):
+    release = block_worker(scheduler)
+    for i in range(4):
+        scheduler.submit_call(None, lambda: None)
+    with pytest.raises(SchedulerFull):
+        scheduler.submit_call(None, lambda: None)
+    release.set()
+    assert scheduler.metrics()['rejected'] == 1
+
+
+@pytest.mark.parametrize("priority", [True, "1", None, float('nan')])
+def test_invalid_priority(scheduler, priority):
+    with pytest.raises(ValueError):
+        scheduler.submit("q", "g", priority)
+
+
+def test_failures_reach_every_caller_and_keep_the_worker(scheduler):
+    def fail():
+        raise KeyError("boom")
+
+    release = block_worker(scheduler)
+    futures = [scheduler.submit_call("fail", fail) for _ in range(2)]
+    release.set()
+    for future in futures:
+        with pytest.raises(KeyError):
+            future.result(5)
+    assert scheduler.run("q", "g", timeout=5)['query'] == "q"
+    assert scheduler.metrics()['failed'] == 1
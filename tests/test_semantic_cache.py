@@ -0,0 +1,95 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from agents.semantic_cache import SemanticDeliverableCache, normalize_goal
+
+
+class FakeRetriever:
+    """Bag-of-words query embeddings and a settable index version"""
+    index_version = "v1"
+
+    def encode_queries(self, queries):
+        embeddings = np.zeros((len(queries), 64), dtype='float32')
+        for row, query in enumerate(queries):
+            for word in re.findall(r"[a-z]+", query.lower()):
+                embeddings[row, zlib.crc32(word.encode('utf-8')) % 64] += 1.0
+        return embeddings
+
+
+def result(text: str = "Hail damage is covered", passed: bool = True):
+    return {
+        'final_output': {'full_deliverable': text, 'sources': []},
+        'verification_result': {'passed': passed, 'report': ""},
+        'research_notes': [],
+        'trace_log': [{'agent': 'writer', 'event': 'draft_created'}],
+        'run_id': "run-1",
+    }
+
+
+@pytest.fixture
+def cache():
+    return SemanticDeliverableCache(FakeRetriever(), threshold=0.9)
+
+
+def test_hit_for_the_same_goal(cache):
+    cache.store("Is hail damage to my roof covered?", "Email the client", result())
+    hit = cache.lookup("is hail damage to my roof covered", "  email the CLIENT ")
+    assert hit['cached'] and hit['final_output']['cached']
+    assert hit['final_output']['full_deliverable'] == "Hail damage is covered"
+    assert hit['trace_log'][-1]['event'] == 'hit'
+    assert 'run_id' not in hit
+    assert cache.stats()['hits'] == 1
+
+
+def test_other_goal_or_query_misses(cache):
+    cache.store("Is hail damage to my roof covered?", "Email the client", result())
+    assert cache.lookup("Is hail damage to my roof covered?", "Adjuster checklist") is None
+    assert cache.lookup("How are auto premiums calculated?", "Email the client") is None
+
+
+def test_unverified_and_cached_results_are_not_stored(cache):
+    cache.store("q", "g", result(passed=False))
+    cache.store("q", "g", {**result(), 'cached': True})
+    assert cache.stats()['entries'] == 0
+
+
+def test_hits_are_copies(cache):
+    cache.store("Is hail damage covered?", "Email", result())
+    first = cache.lookup("Is hail damage covered?", "Email")
+    first['final_output']['full_deliverable'] = "changed"
+    first['trace_log'].append({'agent': 'caller'})
+    second = cache.lookup("Is hail damage covered?", "Email")
+    assert second['final_output']['full_deliverable'] == "Hail damage is covered"
+    assert len(second['trace_log']) == 2
+
+
+def test_index_change_invalidates(cache):
+    cache.store("Is hail damage covered?", "Email", result())
+    cache.retriever.index_version = "v2"
+    assert cache.lookup("Is hail damage covered?", "Email") is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_least_recently_used_are_evicted(cache):
+    cache.max_entries = 2
+    cache.store("hail damage roof", "Email", result("hail"))
+    cache.store("flood damage basement", "Email", result("flood"))
+    assert cache.lookup("hail damage roof", "Email") is not None  # Flood is now the oldest used
+    cache.store("theft of a bicycle", "Checklist", result("theft"))
+    assert cache.stats()['entries'] == 2
+    assert cache.lookup("flood damage basement", "Email") is None
+    assert cache.lookup("hail damage roof", "Email") is not None
+    assert cache.lookup("theft of a bicycle", "Checklist") is not None
+
+
+def test_expiry(cache):
+    cache.max_age_s = -1
+    cache.store("Is hail damage covered?", "Email", result())
+    assert cache.lookup("Is hail damage covered?", "Email") is None
+
+
+def test_normalize_goal():
+    assert normalize_goal("  Email\tthe CLIENT ") == "email the client"